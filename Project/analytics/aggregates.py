@@ -0,0 +1,299 @@
+# Project/analytics/aggregates.py
+"""
+Aggregation engine behind analytics.py: one grouped pass over interactions
+per key builds a small per-recipe and a per-user counts matrix, and every
+interaction insight is derived from those instead of re-filtering and
+re-grouping the interactions table.
+
+ - by_recipe (index recipe_id): view / like / cook counts, total
+   interactions of any type, rating_sum / rating_count over cook
+   interactions, first_view (row position of the recipe's first view)
+ - by_user (index user_id): one count column per interaction type, total,
+   first_seen (row position of the user's first interaction)
+
+The first_* positions reproduce value_counts() tie order (equal counts
+keep first-appearance order).
+
+Ingredients are counted and grouped on the integer ingredient_key (see
+etl/ingredients.py) and labelled with their canonical ingredient_name
+afterwards; tables without the key fall back to the name.
+
+Matrices built over consecutive slices of interactions merge with
+merge_matrices (counts and sums add, first_* take the minimum), which is
+what the incremental state in analytics_state.py folds new rows with and
+how fold_recipe_matrix aggregates a table chunk by chunk. The
+prep time vs likes correlation is derived from integer co-moment sums
+(like_moments), so it is exact and the same however the likes were counted.
+
+Usage:
+    by_recipe = recipe_matrix(interactions)
+    by_user = user_matrix(interactions)
+    insights = compute_insights(recipes, ingredients, steps, by_recipe, by_user)
+"""
+
+from __future__ import annotations
+
+import math
+from contextlib import contextmanager
+
+import metrics
+from lazy import lazy
+
+np = lazy("numpy")
+pd = lazy("pandas")
+
+# first_* value of a key with no such rows
+NONE = 2**63 - 1  # np.iinfo(np.int64).max
+FIRST_COLUMNS = ("first_view", "first_seen")
+
+def grouped_counts(keys: pd.Series, types: pd.Series, ratings: pd.Series = None):
+    """One pass over (key, type) codes.
+
+    Returns (key values, type values, counts[key, type], first[key, type],
+    rating_sum[key, type], rating_count[key, type]); type column 0 holds
+    rows with a missing type. Rows with a missing key are dropped.
+    """
+    key_codes, key_values = pd.factorize(keys)
+    type_codes, type_values = pd.factorize(types)
+    shape = (len(key_values), len(type_values) + 1)
+    keep = key_codes >= 0
+    cell = key_codes * shape[1] + type_codes + 1
+    pos = np.arange(len(cell))[keep]
+    cell = cell[keep]
+
+    size = shape[0] * shape[1]
+    counts = np.bincount(cell, minlength=size).reshape(shape)
+    first = np.full(size, NONE, dtype=np.int64)
+    np.minimum.at(first, cell, pos)
+    first = first.reshape(shape)
+    rating_sum = rating_count = None
+    if ratings is not None:
+        rating = ratings.to_numpy(dtype=float, na_value=np.nan)[keep]
+        rated = ~np.isnan(rating)
+        # groupby sum (compensated, row order) / count == groupby mean, bit for bit
+        sums = pd.Series(rating[rated]).groupby(cell[rated]).sum()
+        rating_sum = np.zeros(size)
+        rating_sum[sums.index.to_numpy()] = sums.to_numpy()
+        rating_sum = rating_sum.reshape(shape)
+        rating_count = np.bincount(cell[rated], minlength=size).reshape(shape)
+    return pd.Index(key_values), list(type_values), counts, first, rating_sum, rating_count
+
+def recipe_matrix(interactions: pd.DataFrame) -> pd.DataFrame:
+    """Per-recipe engagement counts, one grouped pass over interactions."""
+    keys, types, counts, first, rating_sum, rating_count = grouped_counts(
+        interactions["recipe_id"], interactions["type"], interactions["rating"])
+
+    def col(matrix, t, fill):
+        return matrix[:, types.index(t) + 1] if t in types else np.full(len(keys), fill, dtype=matrix.dtype)
+
+    return pd.DataFrame({
+        "view": col(counts, "view", 0),
+        "like": col(counts, "like", 0),
+        "cook": col(counts, "cook", 0),
+        "total": counts.sum(axis=1),
+        "rating_sum": col(rating_sum, "cook", 0.0),
+        "rating_count": col(rating_count, "cook", 0),
+        "first_view": col(first, "view", NONE),
+    }, index=keys.rename("recipe_id"))
+
+def user_matrix(interactions: pd.DataFrame) -> pd.DataFrame:
+    """Per-user counts by interaction type, one grouped pass over interactions."""
+    keys, types, counts, first, _, _ = grouped_counts(interactions["user_id"], interactions["type"])
+    by_user = pd.DataFrame(counts[:, 1:], index=keys.rename("user_id"), columns=types)
+    by_user["total"] = counts.sum(axis=1)
+    by_user["first_seen"] = first.min(axis=1)
+    return by_user
+
+def offset_first(matrix: pd.DataFrame, offset: int) -> pd.DataFrame:
+    """Shift first_* row positions of a matrix built on rows starting at offset."""
+    matrix = matrix.copy()
+    for col in FIRST_COLUMNS:
+        if col in matrix:
+            matrix[col] = matrix[col].where(matrix[col] == NONE, matrix[col] + offset)
+    return matrix
+
+def merge_matrices(*matrices: pd.DataFrame) -> pd.DataFrame:
+    """Combine per-recipe (or per-user) matrices of disjoint interaction rows."""
+    combined = pd.concat(matrices)
+    grouped = combined.groupby(level=0, sort=False)
+    firsts = [c for c in combined.columns if c in FIRST_COLUMNS]
+    sums = [c for c in combined.columns if c not in FIRST_COLUMNS]
+    merged = grouped[sums].sum()
+    for col in sums:
+        if col != "rating_sum":
+            merged[col] = merged[col].astype(np.int64)
+    for col in firsts:
+        merged[col] = grouped[col].min().astype(np.int64)
+    return merged
+
+def fold_recipe_matrix(chunks) -> pd.DataFrame:
+    """recipe_matrix of consecutive interaction chunks, one chunk in memory at a time."""
+    by_recipe, offset = None, 0
+    for chunk in chunks:
+        part = offset_first(recipe_matrix(chunk), offset)
+        by_recipe = part if by_recipe is None else merge_matrices(by_recipe, part)
+        offset += len(chunk)
+    if by_recipe is None:
+        empty = pd.Series([], dtype=str)
+        by_recipe = recipe_matrix(pd.DataFrame({"recipe_id": empty, "type": empty, "rating": empty.astype(float)}))
+    return by_recipe
+
+def like_moments(recipes: pd.DataFrame, likes: pd.Series) -> dict:
+    """Co-moment sums of (prep_time_minutes, likes) over recipe rows with a prep time.
+
+    Python ints, so the sums are exact and mergeable (see update_moments).
+    """
+    x = recipes["prep_time_minutes"]
+    has_x = x.notna().to_numpy()
+    x = x[has_x].to_numpy(dtype=np.int64).astype(object)
+    y = recipes["recipe_id"][has_x].map(likes).fillna(0).to_numpy(dtype=np.int64).astype(object)
+    return {"n": len(x), "sx": int(x.sum()), "sy": int(y.sum()), "sxx": int((x * x).sum()),
+            "sxy": int((x * y).sum()), "syy": int((y * y).sum())}
+
+def update_moments(moments: dict, recipes: pd.DataFrame, old_likes: pd.Series, new_likes: pd.Series) -> dict:
+    """Fold a change of per-recipe like counts into co-moment sums of the same recipes."""
+    old = old_likes.reindex(new_likes.index, fill_value=0)
+    changed = new_likes.index[(new_likes != old).to_numpy()]
+    touched = recipes[recipes["recipe_id"].isin(changed)]
+    before = like_moments(touched, old_likes)
+    after = like_moments(touched, new_likes)
+    out = dict(moments)
+    for k in ("sy", "sxy", "syy"):
+        out[k] += after[k] - before[k]
+    return out
+
+def moments_corr(m: dict) -> float:
+    # Pearson r from co-moments; NaN when either side is constant (as Series.corr)
+    n = m["n"]
+    cov = n * m["sxy"] - m["sx"] * m["sy"]
+    var_x = n * m["sxx"] - m["sx"] ** 2
+    var_y = n * m["syy"] - m["sy"] ** 2
+    if n < 2 or var_x <= 0 or var_y <= 0:
+        return float("nan")
+    return max(-1.0, min(1.0, cov / math.sqrt(var_x) / math.sqrt(var_y)))
+
+def same_report(a, b, rel_tol: float = 1e-9) -> bool:
+    """Reports are equal; floats may differ by summation order (rating sums)."""
+    if isinstance(a, dict) and isinstance(b, dict):
+        return list(a) == list(b) and all(same_report(a[k], b[k], rel_tol) for k in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(same_report(x, y, rel_tol) for x, y in zip(a, b))
+    if isinstance(a, float) or isinstance(b, float):
+        if a != a and b != b:
+            return True
+        return isinstance(a, (int, float)) and isinstance(b, (int, float)) and math.isclose(a, b, rel_tol=rel_tol)
+    return a == b
+
+def top_counts(counts: pd.Series, first: pd.Series, n: int) -> pd.Series:
+    # value_counts().head(n): descending counts, ties in first-appearance order
+    seen = (counts > 0).to_numpy()
+    counts = counts[seen]
+    ordered = counts.iloc[np.argsort(first.to_numpy()[seen], kind="stable")]
+    return ordered.sort_values(ascending=False, kind="stable").head(n)
+
+def ingredient_names(ingredients: pd.DataFrame) -> pd.Series:
+    # ingredient_key -> canonical ingredient_name (one name per key, see etl/ingredients.py)
+    keyed = ingredients[ingredients["ingredient_key"].notna()]
+    return keyed.drop_duplicates("ingredient_key").set_index("ingredient_key")["ingredient_name"]
+
+def ingredient_counts(ingredients: pd.DataFrame, n: int) -> pd.Series:
+    """ingredient_name value_counts().head(n), counted on the integer ingredient_key when there is one."""
+    if "ingredient_key" not in ingredients:
+        return ingredients["ingredient_name"].value_counts().head(n)
+    counts = ingredients["ingredient_key"].value_counts().head(n)
+    names = ingredient_names(ingredients).reindex(counts.index)
+    return pd.Series(counts.to_numpy(), index=pd.Index(names.to_numpy(), name="ingredient_name"), name="count")
+
+def ingredient_sums(ingredients: pd.DataFrame, values: pd.Series) -> pd.Series:
+    """groupby("ingredient_name")[values].sum() (sorted by name), grouped on ingredient_key when there is one."""
+    if "ingredient_key" not in ingredients:
+        return values.groupby(ingredients["ingredient_name"]).sum()
+    sums = values.groupby(ingredients["ingredient_key"]).sum()
+    names = ingredient_names(ingredients).reindex(sums.index)
+    return pd.Series(sums.to_numpy(), index=pd.Index(names.to_numpy(), name="ingredient_name"),
+                     name=values.name).sort_index()
+
+def type_columns(by_user: pd.DataFrame):
+    return [c for c in by_user.columns if c not in ("total", "first_seen")]
+
+@contextmanager
+def _insight(insights: dict, name: str, rows_in: int, stage: str):
+    # one metrics stage per insight: rows in = rows of the input it reads, rows out = report entries
+    with metrics.stage(f"{stage}.{name}", rows_in=rows_in) as m:
+        yield
+        m["rows_out"] = metrics.count(insights.get(name))
+
+def compute_insights(recipes, ingredients, steps, by_recipe, by_user, moments: dict = None,
+                     stage: str = "analytics") -> dict:
+    """The analytics report; moments defaults to like_moments(recipes, by_recipe["like"]).
+
+    Each insight is measured as the metrics stage "<stage>.<insight>".
+    """
+    insights = {}
+
+    # 1. Most common ingredients
+    with _insight(insights, "most_common_ingredients", len(ingredients), stage):
+        insights["most_common_ingredients"] = ingredient_counts(ingredients, 10).to_dict()
+
+    # 2. Average preparation time
+    with _insight(insights, "average_prep_time_minutes", len(recipes), stage):
+        insights["average_prep_time_minutes"] = recipes["prep_time_minutes"].mean()
+
+    # 3. Difficulty distribution
+    with _insight(insights, "difficulty_distribution", len(recipes), stage):
+        insights["difficulty_distribution"] = recipes["difficulty"].value_counts().to_dict()
+
+    # 4. Correlation between prep time & likes (recipes without likes count 0)
+    with _insight(insights, "correlation_prep_time_likes", len(recipes), stage):
+        if moments is None:
+            moments = like_moments(recipes, by_recipe["like"])
+        insights["correlation_prep_time_likes"] = moments_corr(moments)
+
+    # 5. Most frequently viewed recipes
+    with _insight(insights, "most_viewed_recipes", len(by_recipe), stage):
+        insights["most_viewed_recipes"] = top_counts(by_recipe["view"], by_recipe["first_view"], 10).to_dict()
+
+    # 6. Ingredients associated with high engagement (NaN for recipes nobody touched)
+    with _insight(insights, "high_engagement_ingredients", len(ingredients), stage):
+        engagement = ingredients["recipe_id"].map(by_recipe["total"]).rename("engagement")
+        insights["high_engagement_ingredients"] = (
+            ingredient_sums(ingredients, engagement)
+            .sort_values(ascending=False)
+            .head(10)
+            .to_dict()
+        )
+
+    # 7. Average number of steps per recipe
+    with _insight(insights, "avg_steps_per_recipe", len(steps), stage):
+        insights["avg_steps_per_recipe"] = steps.groupby("recipe_id").size().mean()
+
+    # 8. Most time-consuming recipes
+    with _insight(insights, "most_time_consuming_recipes", len(recipes), stage):
+        total_time = recipes["prep_time_minutes"] + recipes["cook_time_minutes"]
+        top_time = recipes.assign(total_time=total_time).sort_values(by="total_time", ascending=False).head(10)
+        insights["most_time_consuming_recipes"] = top_time[["recipe_id", "name", "total_time"]].to_dict(
+            orient="records")
+
+    # 9. Most active users
+    with _insight(insights, "most_active_users", len(by_user), stage):
+        insights["most_active_users"] = top_counts(by_user["total"], by_user["first_seen"], 5).to_dict()
+
+    # 10. Highest rated recipes (mean cook rating, NaN when no cook was rated)
+    with _insight(insights, "highest_rated_recipes", len(by_recipe), stage):
+        cooked = by_recipe[by_recipe["cook"] > 0].sort_index()
+        mean_rating = cooked["rating_sum"].where(cooked["rating_count"] > 0) / cooked["rating_count"]
+        insights["highest_rated_recipes"] = mean_rating.sort_values(ascending=False).head(10).to_dict()
+
+    # 11. User interaction stats (users x types seen, typed interactions only)
+    with _insight(insights, "user_interaction_counts", len(by_user), stage):
+        types = sorted(type_columns(by_user))
+        typed = by_user[types]
+        typed = typed[typed.sum(axis=1) > 0]
+        typed = typed.loc[:, typed.sum(axis=0) > 0].sort_index()
+        # plain dict build from .tolist(); to_dict(orient="index") boxes every cell
+        columns = typed.columns.tolist()
+        insights["user_interaction_counts"] = {
+            user: dict(zip(columns, row)) for user, row in zip(typed.index.tolist(), typed.to_numpy().tolist())
+        }
+
+    return insights
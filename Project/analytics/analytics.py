@@ -1,142 +1,164 @@
+import argparse
 from pathlib import Path
-import pandas as pd
+import sys
 import json
 import logging
 
+# shared table loader lives next to the ETL scripts
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "etl"))
+import metrics  # noqa: E402
+from table_store import from_frame, load_table  # noqa: E402
+from aggregates import compute_insights, recipe_matrix, same_report, user_matrix  # noqa: E402
+from analytics_state import CHUNK_ROWS, INTERACTION_COLUMNS, AnalyticsState  # noqa: E402
+from rollups import window_report  # noqa: E402
+from sketches import InteractionSketches, SpaceSaving, compare_top  # noqa: E402
+from table_store import chunk_rows_for, iter_table  # noqa: E402
+
 # Setup Logging
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
 # Use absolute path relative to analytics.py
 BASE = Path(__file__).resolve().parent.parent / "output_csv"
 
-logging.info(f"Loading CSV files from {BASE}...")
-
-# Corrected file names
-recipes = pd.read_csv(BASE / "recipe.csv")       # <- plural
-ingredients = pd.read_csv(BASE / "ingredients.csv")
-steps = pd.read_csv(BASE / "steps.csv")
-interactions = pd.read_csv(BASE / "interactions.csv")
-
-logging.info("CSV files loaded successfully.")
-
-# The rest of your analytics code remains the same
-
-
-insights = {}
-
-# -----------------------------------
-# 1. Most common ingredients
-# -----------------------------------
-logging.info("Computing most common ingredients...")
-ing_count = ingredients["ingredient_name"].value_counts().head(10)
-insights["most_common_ingredients"] = ing_count.to_dict()
-
-# -----------------------------------
-# 2. Average preparation time
-# -----------------------------------
-insights["average_prep_time_minutes"] = recipes["prep_time_minutes"].mean()
-
-# -----------------------------------
-# 3. Difficulty distribution
-# -----------------------------------
-difficulty_dist = recipes["difficulty"].value_counts()
-insights["difficulty_distribution"] = difficulty_dist.to_dict()
-
-# -----------------------------------
-# 4. Correlation between prep time & likes
-# -----------------------------------
-likes = interactions[interactions["type"] == "like"]
-likes_count = likes.groupby("recipe_id").size().reset_index(name="like_count")
-
-merged = pd.merge(
-    recipes[["recipe_id", "prep_time_minutes"]],
-    likes_count,
-    on="recipe_id",
-    how="left"
-)
-
-merged["like_count"] = merged["like_count"].fillna(0)
-insights["correlation_prep_time_likes"] = merged["prep_time_minutes"].corr(merged["like_count"])
-
-# -----------------------------------
-# 5. Most frequently viewed recipes
-# -----------------------------------
-views = interactions[interactions["type"] == "view"]
-view_count = views["recipe_id"].value_counts().head(10)
-insights["most_viewed_recipes"] = view_count.to_dict()
-
-# -----------------------------------
-# 6. Ingredients associated with high engagement
-# -----------------------------------
-engagement = interactions.groupby("recipe_id").size().reset_index(name="engagement")
-merged_ing = pd.merge(ingredients, engagement, on="recipe_id", how="left")
-
-ing_engage = (
-    merged_ing.groupby("ingredient_name")["engagement"]
-    .sum()
-    .sort_values(ascending=False)
-    .head(10)
-)
-
-insights["high_engagement_ingredients"] = ing_engage.to_dict()
-
-# -----------------------------------
-# 7. Average number of steps per recipe
-# -----------------------------------
-step_count = steps.groupby("recipe_id").size().mean()
-insights["avg_steps_per_recipe"] = step_count
-
-# -----------------------------------
-# 8. Most time-consuming recipes
-# -----------------------------------
-recipes["total_time"] = (
-    recipes["prep_time_minutes"] + recipes["cook_time_minutes"]
-)
-
-top_time = recipes.sort_values(by="total_time", ascending=False).head(10)
-insights["most_time_consuming_recipes"] = top_time[
-    ["recipe_id", "name", "total_time"]
-].to_dict(orient="records")
-
-# -----------------------------------
-# 9. Most active users
-# -----------------------------------
-user_engage = interactions["user_id"].value_counts().head(5)
-insights["most_active_users"] = user_engage.to_dict()
-
-# -----------------------------------
-# 10. Highest rated recipes
-# -----------------------------------
-cook = interactions[interactions["type"] == "cook"]
-
-if not cook.empty:
-    cook_rating = (
-        cook.groupby("recipe_id")["rating"]
-        .mean()
-        .sort_values(ascending=False)
-        .head(10)
-    )
-    insights["highest_rated_recipes"] = cook_rating.to_dict()
-else:
-    insights["highest_rated_recipes"] = {}
-
-# -----------------------------------
-# 11. User interaction stats
-# -----------------------------------
-user_interaction_counts = (
-    interactions.groupby(['user_id', 'type'])
-    .size()
-    .unstack(fill_value=0)
-)
-
-insights["user_interaction_counts"] = user_interaction_counts.to_dict(orient="index")
-
-# -----------------------------------
-# Save Report
-# -----------------------------------
-logging.info("Saving analytics_report.json...")
-
-with open("analytics_report.json", "w") as f:
-    json.dump(insights, f, indent=4)
-
-logging.info("Analytics complete! See analytics_report.json")
+# only the columns the insights use
+COLUMNS = {
+    "recipe": ["recipe_id", "name", "prep_time_minutes", "cook_time_minutes", "difficulty"],
+    "ingredients": ["recipe_id", "ingredient_name", "ingredient_key"],
+    "steps": ["recipe_id"],
+}
+
+def load_inputs(frames=None, out_dir=BASE):
+    """(recipes, ingredients, steps): from `frames` (transform outputs still in memory) or out_dir."""
+    loaded = []
+    for name, columns in COLUMNS.items():
+        if frames and name in frames:
+            loaded.append(from_frame(frames[name], name, columns))
+        else:
+            loaded.append(load_table(name, columns, out_dir=out_dir))
+    return tuple(loaded)
+
+def sketch_check(rows, out_dir=BASE):
+    """Sketches fed in ten chunks (so merges are exercised) vs value_counts / nunique on the first rows."""
+    sample = next(iter_table("interactions", ["user_id", "recipe_id", "type", "timestamp"],
+                             chunk_rows=rows, out_dir=out_dir), None)
+    if sample is None:
+        return None
+    sketches = InteractionSketches()
+    for part in range(10):
+        sketches.update(sample.iloc[part * len(sample) // 10:(part + 1) * len(sample) // 10])
+    days = sample["timestamp"].astype(object).str[:10]
+    exact_days = sample.groupby(days)[["user_id", "recipe_id"]].nunique()
+    estimates = sketches.distinct_per_day()
+    hll_error = max((abs(estimates[d]["users"] - exact_days.loc[d, "user_id"]) / exact_days.loc[d, "user_id"]
+                     for d in exact_days.index), default=0.0)
+    views = sample["recipe_id"][(sample["type"] == "view").to_numpy()]
+    return {
+        "rows": len(sample),
+        "most_viewed_recipes": compare_top(sketches.views, views.value_counts(), 10),
+        "most_active_users": compare_top(sketches.users, sample["user_id"].value_counts(), 5),
+        "distinct_users_per_day_max_relative_error": hll_error,
+        "distinct_per_day_relative_std_error": sketches.bounds()["distinct_per_day_relative_std_error"],
+    }
+
+def run(recipes, ingredients, steps, full=False, verify=False, sketch=False, chunk_rows=CHUNK_ROWS,
+        workers=1, window_days=None, out_dir=BASE):
+    """Refresh the analytics state from the interactions in out_dir and return the report."""
+    # Interactions are folded into the persisted per-recipe / per-user matrices
+    # (analytics/state/); only rows added since the last run are read, chunk_rows
+    # at a time, so memory is one chunk plus the matrices however long the table gets
+    state = AnalyticsState.load().refresh(recipes, full=full, out_dir=out_dir, chunk_rows=chunk_rows,
+                                          sketch=sketch, workers=workers)
+
+    logging.info("Computing insights...")
+    insights = state.insights(recipes, ingredients, steps)
+
+    if verify:
+        # full in-memory recompute: one grouped pass per key over the whole table
+        logging.info("Verifying against a full recompute...")
+        with metrics.stage("analytics.verify") as m:
+            interactions = load_table("interactions", ["user_id", "recipe_id", "type", "rating"], out_dir=out_dir)
+            expected = compute_insights(recipes, ingredients, steps, recipe_matrix(interactions),
+                                        user_matrix(interactions), stage="analytics.verify")
+            m["rows_in"] = len(interactions)
+        if not same_report(insights, expected):
+            logging.error("Incremental analytics state disagrees with a full recompute; rerun with --full")
+            raise SystemExit(1)
+        logging.info("Incremental and full recompute agree.")
+
+    if sketch:
+        # ingredients are rewritten every run, so their sketch is rebuilt by streaming the table
+        ingredient_sketch = SpaceSaving()
+        with metrics.stage("analytics.ingredient_sketch", rows_in=0) as m:
+            for chunk in iter_table("ingredients", ["ingredient_name"], chunk_rows=chunk_rows, out_dir=out_dir):
+                ingredient_sketch.update(chunk["ingredient_name"])
+                m["rows_in"] += len(chunk)
+        insights["most_common_ingredients"] = ingredient_sketch.top(10).to_dict()
+        insights["most_viewed_recipes"] = state.sketches.views.top(10).to_dict()
+        insights["most_active_users"] = state.sketches.users.top(5).to_dict()
+        insights["distinct_per_day"] = state.sketches.distinct_per_day()
+        insights["sketch_error_bounds"] = {**state.sketches.bounds(),
+                                           "most_common_ingredients": ingredient_sketch.bounds()}
+
+    if window_days:
+        with metrics.stage("analytics.window", rows_in=len(state.recipe_hourly) + len(state.user_daily)):
+            insights["window"] = window_report(state.recipe_hourly, state.user_daily, window_days)
+    return insights
+
+def save_report(insights, path="analytics_report.json"):
+    logging.info("Saving %s...", path)
+    with open(path, "w") as f:
+        json.dump(insights, f, indent=4)
+    logging.info("Analytics complete! See %s", path)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Compute analytics_report.json from the pipeline tables")
+    ap.add_argument("--full", action="store_true",
+                    help="rebuild the aggregate state from every interaction instead of only new ones")
+    ap.add_argument("--verify", action="store_true",
+                    help="also recompute everything from the full interactions table and check both agree")
+    ap.add_argument("--sketch", action="store_true",
+                    help="top recipes/users/ingredients from Space-Saving sketches, plus HyperLogLog "
+                         "distinct users/recipes per day and the sketches' error bounds")
+    ap.add_argument("--sketch-check", type=int, metavar="ROWS",
+                    help="compare the sketches with exact counts on the first ROWS interactions and exit")
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS,
+                    help="interactions are aggregated this many rows at a time (default: %(default)s)")
+    ap.add_argument("--max-memory", type=float, metavar="MB",
+                    help="pick --chunk-rows so one chunk and its working copies fit in MB")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="fold new interactions in this many processes (default: %(default)s)")
+    ap.add_argument("--window-days", type=int, metavar="N",
+                    help="add a \"window\" section for the last N days (top recipes/users, daily counts, "
+                         "7-day trailing views) answered from the hourly/daily rollups")
+    ap.add_argument("--profile", action="store_true",
+                    help="also write a cProfile / tracemalloc profile (Project/metrics/analytics.prof)")
+    args = ap.parse_args(argv)
+
+    logging.info(f"Loading tables from {BASE}...")
+    recipes, ingredients, steps = load_inputs()
+    logging.info("Tables loaded successfully.")
+
+    chunk_rows = args.chunk_rows
+    if args.max_memory:
+        chunk_rows = chunk_rows_for("interactions", args.max_memory, INTERACTION_COLUMNS, out_dir=BASE)
+        logging.info("Aggregating interactions %d rows at a time (--max-memory %g MB)", chunk_rows, args.max_memory)
+
+    if args.sketch_check:
+        check = sketch_check(args.sketch_check)
+        if check is None:
+            sys.exit("No interactions to check sketches against")
+        logging.info("Sketch check:\n%s", json.dumps(check, indent=4))
+        sys.exit(0 if check["most_viewed_recipes"]["within_bounds"] and check["most_active_users"]["within_bounds"]
+                 else 1)
+
+    with metrics.run("analytics", profile=args.profile), metrics.stage("analytics"):
+        insights = run(recipes, ingredients, steps, full=args.full, verify=args.verify, sketch=args.sketch,
+                       chunk_rows=chunk_rows, workers=args.workers, window_days=args.window_days)
+
+        # -----------------------------------
+        # Save Report
+        # -----------------------------------
+        save_report(insights)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+# Project/analytics/analytics_state.py
+"""
+Persisted, mergeable aggregate state for analytics.py, so a cron run only
+reads the interactions added since the previous run.
+
+Project/analytics/state/ holds:
+ - by_recipe.parquet|csv: aggregates.recipe_matrix partials (counts by
+   recipe and type, rating sum / count, first view position)
+ - by_user.parquet|csv: aggregates.user_matrix partials (counts by user
+   and type, first interaction position)
+ - state.json: rows folded so far, the interaction_id of the last one,
+   the prep time vs likes co-moment sums and a hash of the recipe columns
+   they were computed on
+ - sketches.json (once enabled with sketch=True): sketches.InteractionSketches
+   folded over the same rows
+ - recipe_hourly.parquet|csv, user_daily.parquet|csv: rollups.py counts by
+   (hour, recipe_id, type) and (day, user_id, type) for windowed queries
+
+Export and transform keep existing interactions in place and append new
+ones, so new rows are the ones past state.json "rows". A run re-reads the
+last folded row to check that, and rebuilds from scratch when it moved,
+when the table shrank, or when transform updated or deleted interactions
+since the state was folded: state.json keeps the count of such transform
+runs (output_csv/changes/rewrites.json) it was folded against, so a rewrite
+is noticed however many transform runs happened in between.
+
+With workers > 1 the new rows are split into contiguous ranges folded in a
+process pool; each part keeps global row positions, so merging the parts in
+row order gives the sequential state (rating sums up to float rounding). Non-additive metrics are only
+derived after the merge: mean ratings from the summed rating_sum /
+rating_count, the correlation from co-moments of the merged like counts.
+
+Usage:
+    state = AnalyticsState.load()
+    state.refresh(recipes)            # fold new interactions, save
+    insights = state.insights(recipes, ingredients, steps)
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import aggregates
+import metrics
+import rollups
+import table_store as tables
+from lazy import lazy
+from sketches import InteractionSketches
+
+pd = lazy("pandas")
+
+STATE_DIR = Path(__file__).resolve().parent / "state"
+INTERACTION_COLUMNS = ["interaction_id", "user_id", "recipe_id", "type", "rating", "timestamp"]
+CHUNK_ROWS = 1_000_000
+
+def _matrix_path(state_dir: Path, name: str) -> Path:
+    return state_dir / f"{name}.{'parquet' if tables.has_parquet() else 'csv'}"
+
+def _write_matrix(df: pd.DataFrame, path: Path):
+    tmp = path.with_name(path.name + ".tmp")
+    if path.suffix == ".parquet":
+        df.to_parquet(tmp, compression="zstd")
+    else:
+        df.to_csv(tmp)
+    os.replace(tmp, path)
+
+def _read_matrix(path: Path, key: str) -> pd.DataFrame:
+    if path.suffix == ".parquet":
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_csv(path, dtype={key: str}, keep_default_na=False).set_index(key)
+    df.index = df.index.astype(str).rename(key)
+    return df
+
+def _write_rollup(df: pd.DataFrame, path: Path):
+    tmp = path.with_name(path.name + ".tmp")
+    if path.suffix == ".parquet":
+        df.to_parquet(tmp, compression="zstd", index=False)
+    else:
+        df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+def _read_rollup(path: Path, keys) -> pd.DataFrame:
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path)
+    time_col, key, _ = keys
+    df = pd.read_csv(path, dtype={key: str, "type": str}, keep_default_na=False)
+    df[time_col] = pd.to_datetime(df[time_col], utc=True, format="ISO8601")
+    return df
+
+def recipes_hash(recipes: pd.DataFrame) -> str:
+    # the co-moments depend on these two columns only
+    cols = recipes[["recipe_id", "prep_time_minutes"]].astype(str)
+    return format(int(pd.util.hash_pandas_object(cols, index=False).sum()), "x")
+
+class AnalyticsState:
+    """Aggregates of the first `rows` interactions, foldable with the rest."""
+
+    def __init__(self, by_recipe=None, by_user=None, meta=None, state_dir: Path = STATE_DIR):
+        self.state_dir = Path(state_dir)
+        self.reset()
+        if meta is not None:
+            self.by_recipe, self.by_user, self.meta = by_recipe, by_user, meta
+
+    def reset(self, sketches: InteractionSketches = None):
+        empty = pd.DataFrame({col: pd.Series([], dtype=float if col == "rating" else str)
+                              for col in INTERACTION_COLUMNS})
+        self.by_recipe = aggregates.recipe_matrix(empty)
+        self.by_user = aggregates.user_matrix(empty)
+        self.meta = {"rows": 0, "last_id": None}
+        self.sketches = sketches
+        self.recipe_hourly = rollups.empty_rollup(rollups.RECIPE_KEYS)
+        self.user_daily = rollups.empty_rollup(rollups.USER_KEYS)
+        # chunk rollups not merged into the two above yet (see flush_rollups)
+        self._pending = []
+
+    @classmethod
+    def load(cls, state_dir: Path = STATE_DIR):
+        """The saved state, or an empty one when missing or unreadable."""
+        state_dir = Path(state_dir)
+        try:
+            with open(state_dir / "state.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            by_recipe = _read_matrix(_matrix_path(state_dir, "by_recipe"), "recipe_id")
+            by_user = _read_matrix(_matrix_path(state_dir, "by_user"), "user_id")
+            recipe_hourly = _read_rollup(_matrix_path(state_dir, "recipe_hourly"), rollups.RECIPE_KEYS)
+            user_daily = _read_rollup(_matrix_path(state_dir, "user_daily"), rollups.USER_KEYS)
+            sketches = None
+            if meta.get("sketches"):
+                with open(state_dir / "sketches.json", "r", encoding="utf-8") as f:
+                    sketches = InteractionSketches.from_dict(json.load(f))
+        except FileNotFoundError:
+            return cls(state_dir=state_dir)
+        except Exception as e:
+            logging.warning("Ignoring unreadable analytics state %s: %s", state_dir, e)
+            return cls(state_dir=state_dir)
+        state = cls(by_recipe, by_user, meta, state_dir)
+        state.sketches = sketches
+        state.recipe_hourly, state.user_daily = recipe_hourly, user_daily
+        return state
+
+    def save(self):
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        _write_matrix(self.by_recipe, _matrix_path(self.state_dir, "by_recipe"))
+        _write_matrix(self.by_user, _matrix_path(self.state_dir, "by_user"))
+        self.flush_rollups()
+        _write_rollup(self.recipe_hourly, _matrix_path(self.state_dir, "recipe_hourly"))
+        _write_rollup(self.user_daily, _matrix_path(self.state_dir, "user_daily"))
+        self.meta["sketches"] = self.sketches is not None
+        if self.sketches is not None:
+            tmp = self.state_dir / "sketches.json.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.sketches.to_dict(), f)
+            os.replace(tmp, self.state_dir / "sketches.json")
+        # matrices first, rows second: a crash in between only refolds rows
+        tmp = self.state_dir / "state.json.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(tmp, self.state_dir / "state.json")
+
+    def fold(self, interactions: pd.DataFrame):
+        """Add interactions that follow the rows folded so far."""
+        if interactions.empty:
+            return
+        offset = self.meta["rows"]
+        self.by_recipe = aggregates.merge_matrices(
+            self.by_recipe, aggregates.offset_first(aggregates.recipe_matrix(interactions), offset))
+        self.by_user = aggregates.merge_matrices(
+            self.by_user, aggregates.offset_first(aggregates.user_matrix(interactions), offset))
+        if self.sketches is not None:
+            self.sketches.update(interactions)
+        self._pending.append(rollups.rollup(interactions))
+        self.meta["rows"] = offset + len(interactions)
+        self.meta["last_id"] = str(interactions["interaction_id"].iloc[-1])
+
+    def _rewrites(self, out_dir: Path) -> int:
+        # transform runs that updated or deleted interactions so far (etl/transform_etl.py)
+        try:
+            with open(Path(out_dir) / "changes" / "rewrites.json", "r", encoding="utf-8") as f:
+                return json.load(f).get("interactions", 0)
+        except FileNotFoundError:
+            return 0
+
+    def _rewritten(self, out_dir: Path) -> bool:
+        # transform edited or deleted interactions since the state was folded
+        return self._rewrites(out_dir) != self.meta.get("rewrites", 0)
+
+    def flush_rollups(self):
+        """Merge the rollups of chunks folded since the last flush (one groupby per rollup)."""
+        if not self._pending:
+            return
+        self.recipe_hourly = rollups.merge_rollups([self.recipe_hourly] + [r for r, _ in self._pending],
+                                                   rollups.RECIPE_KEYS)
+        self.user_daily = rollups.merge_rollups([self.user_daily] + [u for _, u in self._pending],
+                                                rollups.USER_KEYS)
+        self._pending = []
+
+    def _intact(self, out_dir: Path) -> bool:
+        """The last folded row is still where it was."""
+        rows = self.meta["rows"]
+        if not rows:
+            return True
+        last = next(tables.iter_table("interactions", ["interaction_id"], chunk_rows=1, out_dir=out_dir,
+                                      start_row=rows - 1, stop_row=rows), None)
+        return last is not None and not last.empty and str(last["interaction_id"].iloc[0]) == self.meta["last_id"]
+
+    def fold_range(self, out_dir: Path, start: int, stop: int = None, chunk_rows: int = CHUNK_ROWS):
+        """Fold interaction rows start <= i < stop (start must equal the rows folded so far)."""
+        for chunk in tables.iter_table("interactions", INTERACTION_COLUMNS, chunk_rows=chunk_rows, out_dir=out_dir,
+                                       start_row=start, stop_row=stop):
+            self.fold(chunk)
+
+    def merge(self, part: "AnalyticsState"):
+        """Append a part folded over the rows that follow this state's."""
+        if part.meta["rows"] == self.meta["rows"]:
+            return
+        self.by_recipe = aggregates.merge_matrices(self.by_recipe, part.by_recipe)
+        self.by_user = aggregates.merge_matrices(self.by_user, part.by_user)
+        if self.sketches is not None:
+            self.sketches.merge(part.sketches)
+        part.flush_rollups()
+        self._pending.append((part.recipe_hourly, part.user_daily))
+        self.meta["rows"], self.meta["last_id"] = part.meta["rows"], part.meta["last_id"]
+
+    def _fold_parallel(self, out_dir: Path, chunk_rows: int, workers: int):
+        # contiguous row ranges, one per worker; parts merge back in row order
+        start, stop = self.meta["rows"], tables.count_rows("interactions", out_dir)
+        bounds = [start + (stop - start) * i // workers for i in range(workers + 1)]
+        ranges = [(lo, hi) for lo, hi in zip(bounds, bounds[1:]) if hi > lo]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = pool.map(_fold_part, [out_dir] * len(ranges), [lo for lo, _ in ranges],
+                             [hi for _, hi in ranges], [chunk_rows] * len(ranges),
+                             [self.sketches is not None] * len(ranges))
+            for part in parts:
+                self.merge(part)
+
+    def refresh(self, recipes: pd.DataFrame, full: bool = False, out_dir: Path = tables.OUT_DIR,
+                chunk_rows: int = CHUNK_ROWS, sketch: bool = False, workers: int = 1):
+        """Fold new interactions (all of them when full or the old ones changed) and save.
+
+        sketch=True starts keeping InteractionSketches; once kept they are
+        folded on every refresh. workers > 1 splits the new rows into that
+        many ranges folded in a process pool.
+        """
+        sketch = sketch or self.sketches is not None
+        if sketch and self.sketches is None and not self.meta["rows"]:
+            self.sketches = InteractionSketches()
+        rebuild = True
+        if full:
+            logging.info("Rebuilding analytics state from every interaction (--full)")
+        elif sketch and self.sketches is None:
+            logging.info("Sketches requested; rebuilding analytics state")
+        elif self._rewritten(out_dir):
+            logging.info("Interactions were updated or deleted; rebuilding analytics state")
+        elif not self._intact(out_dir):
+            logging.info("Interactions table was rewritten; rebuilding analytics state")
+        else:
+            rebuild = False
+        if rebuild:
+            self.reset(InteractionSketches() if sketch else None)
+
+        old_likes = self.by_recipe["like"]
+        start = self.meta["rows"]
+        with metrics.stage("analytics.fold") as m:
+            if workers > 1:
+                self._fold_parallel(out_dir, chunk_rows, workers)
+            else:
+                self.fold_range(out_dir, start, chunk_rows=chunk_rows)
+            m["rows_in"], m["rows_out"] = self.meta["rows"] - start, len(self.by_recipe) + len(self.by_user)
+        logging.info("Folded %d new interactions into the analytics state (%d total)",
+                     self.meta["rows"] - start, self.meta["rows"])
+
+        digest = recipes_hash(recipes)
+        if "moments" in self.meta and self.meta.get("recipes_hash") == digest:
+            self.meta["moments"] = aggregates.update_moments(self.meta["moments"], recipes, old_likes,
+                                                             self.by_recipe["like"])
+        else:
+            self.meta["moments"] = aggregates.like_moments(recipes, self.by_recipe["like"])
+        self.meta["recipes_hash"] = digest
+        self.meta["rewrites"] = self._rewrites(out_dir)
+        self.save()
+        return self
+
+    def insights(self, recipes: pd.DataFrame, ingredients: pd.DataFrame, steps: pd.DataFrame) -> dict:
+        return aggregates.compute_insights(recipes, ingredients, steps, self.by_recipe, self.by_user,
+                                           self.meta["moments"])
+
+def _fold_part(out_dir: Path, start: int, stop: int, chunk_rows: int, sketch: bool) -> AnalyticsState:
+    # process pool worker: aggregates of rows [start, stop) with global row positions
+    part = AnalyticsState()
+    part.reset(InteractionSketches() if sketch else None)
+    part.meta["rows"] = start
+    part.fold_range(out_dir, start, stop, chunk_rows)
+    part.flush_rollups()
+    return part
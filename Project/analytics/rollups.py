@@ -0,0 +1,110 @@
+# Project/analytics/rollups.py
+"""
+Time-bucketed rollups of the interactions, kept in the analytics state
+next to the all-time matrices:
+ - recipe_hourly: (hour, recipe_id, type) -> count
+ - user_daily: (day, user_id, type) -> count
+
+hour / day are UTC datetimes floored from the ISO-8601 timestamp column
+transform writes; rows without a parseable timestamp are left out.
+
+Rollups of consecutive interaction chunks merge by summing counts per key
+(merge_rollups), so new partitions fold in without rescanning history.
+Windowed queries (top recipes or users of the last N days, daily counts,
+trailing averages) only filter and group the rollups. Windows are whole
+UTC days ending at the latest day in the rollup.
+
+Usage:
+    recipe_hourly, user_daily = rollup(interactions)
+    top_recipes(recipe_hourly, days=7)
+    trailing_mean(daily_counts(recipe_hourly, days=30, type="view"), window=7)
+"""
+
+from __future__ import annotations
+
+from lazy import lazy
+
+pd = lazy("pandas")
+
+RECIPE_KEYS = ["hour", "recipe_id", "type"]
+USER_KEYS = ["day", "user_id", "type"]
+
+def empty_rollup(keys) -> pd.DataFrame:
+    columns = {k: pd.Series([], dtype="datetime64[ns, UTC]" if k in ("hour", "day") else str) for k in keys}
+    return pd.DataFrame({**columns, "count": pd.Series([], dtype="int64")})
+
+def _count(frame: pd.DataFrame, keys) -> pd.DataFrame:
+    if frame.empty:
+        return empty_rollup(keys)
+    return frame.groupby(keys, sort=False, observed=True).size().rename("count").reset_index()
+
+def rollup(interactions: pd.DataFrame):
+    """(recipe_hourly, user_daily) counts of one chunk of interactions."""
+    ts = pd.to_datetime(interactions["timestamp"].astype(object).replace("", None), utc=True,
+                        format="ISO8601", errors="coerce")
+    timed = ts.notna() & interactions["type"].notna()
+    ts, rows = ts[timed], interactions[timed]
+    by_recipe = pd.DataFrame({"hour": ts.dt.floor("h"), "recipe_id": rows["recipe_id"], "type": rows["type"]})
+    by_user = pd.DataFrame({"day": ts.dt.floor("D"), "user_id": rows["user_id"], "type": rows["type"]})
+    return (_count(by_recipe.dropna(subset=["recipe_id"]), RECIPE_KEYS),
+            _count(by_user.dropna(subset=["user_id"]), USER_KEYS))
+
+def merge_rollups(parts, keys) -> pd.DataFrame:
+    parts = [p for p in parts if not p.empty]
+    if not parts:
+        return empty_rollup(keys)
+    if len(parts) == 1:
+        return parts[0]
+    combined = pd.concat(parts, ignore_index=True)
+    merged = combined.groupby(keys, sort=False, observed=True)["count"].sum().reset_index()
+    merged["count"] = merged["count"].astype("int64")
+    return merged
+
+def window(rollup: pd.DataFrame, days: int, end=None) -> pd.DataFrame:
+    """Rows of the last `days` whole UTC days up to end (default: the latest day present)."""
+    time_col = "hour" if "hour" in rollup else "day"
+    if rollup.empty:
+        return rollup
+    end = (rollup[time_col].max() if end is None else pd.Timestamp(end, tz="UTC")).floor("D")
+    start = end - pd.Timedelta(days=days - 1)
+    return rollup[(rollup[time_col] >= start) & (rollup[time_col] < end + pd.Timedelta(days=1))]
+
+def top_recipes(recipe_hourly: pd.DataFrame, days: int, type: str = "view", n: int = 10, end=None) -> pd.Series:
+    rows = window(recipe_hourly, days, end)
+    rows = rows[rows["type"] == type]
+    return rows.groupby("recipe_id")["count"].sum().sort_values(ascending=False, kind="stable").head(n)
+
+def top_users(user_daily: pd.DataFrame, days: int, n: int = 5, end=None) -> pd.Series:
+    rows = window(user_daily, days, end)
+    return rows.groupby("user_id")["count"].sum().sort_values(ascending=False, kind="stable").head(n)
+
+def daily_counts(recipe_hourly: pd.DataFrame, days: int, type: str = None, end=None) -> pd.Series:
+    """Interactions per UTC day (of one type if given), zero for days without any."""
+    rows = window(recipe_hourly, days, end)
+    if type is not None:
+        rows = rows[rows["type"] == type]
+    if rows.empty:
+        return pd.Series([], dtype="int64", name="count")
+    counts = rows.groupby(rows["hour"].dt.floor("D"))["count"].sum()
+    last = (recipe_hourly["hour"].max() if end is None else pd.Timestamp(end, tz="UTC")).floor("D")
+    full = pd.date_range(last - pd.Timedelta(days=days - 1), last, freq="D", tz="UTC")
+    return counts.reindex(full, fill_value=0).rename_axis("day")
+
+def trailing_mean(daily: pd.Series, window: int = 7) -> pd.Series:
+    return daily.rolling(window, min_periods=1).mean()
+
+def window_report(recipe_hourly: pd.DataFrame, user_daily: pd.DataFrame, days: int) -> dict:
+    """The analytics report's "window" section for the last `days` days."""
+    def by_day(s):
+        return {d.strftime("%Y-%m-%d"): v for d, v in zip(s.index, s.tolist())}
+
+    # 6 extra days so the first day of the window has a full 7-day trailing mean
+    views = daily_counts(recipe_hourly, days + 6, "view")
+    return {
+        "days": days,
+        "end": recipe_hourly["hour"].max().strftime("%Y-%m-%d") if len(recipe_hourly) else None,
+        "most_viewed_recipes": top_recipes(recipe_hourly, days).to_dict(),
+        "most_active_users": top_users(user_daily, days).to_dict(),
+        "interactions_per_day": by_day(daily_counts(recipe_hourly, days)),
+        "views_trailing_7_day_mean": by_day(trailing_mean(views, 7).tail(days)),
+    }
@@ -0,0 +1,216 @@
+# Project/analytics/sketches.py
+"""
+Fixed-size, mergeable sketches for analytics.py --sketch, so heavy hitters
+and distinct counts over huge interaction streams need neither an exact
+hash table over every key nor the whole column in memory.
+
+ - SpaceSaving(k): top-K heavy hitters. Keeps at most k counters; each
+   count overestimates the true count by at most its error, and every error
+   is at most n / k. Chunks are counted exactly and merged in (mergeable
+   Space-Saving: a key missing from a truncated summary is assumed to have
+   that summary's smallest count, both as count and as error).
+ - HyperLogLog(p): distinct keys with 2**p one-byte registers, relative
+   standard error 1.04 / sqrt(2**p). Merging takes the register maximum.
+ - InteractionSketches: views per recipe and interactions per user
+   (SpaceSaving), distinct users / recipes per day (HyperLogLog).
+
+Every sketch merges with another of the same size (partitions, runs),
+round-trips through to_dict / from_dict (JSON) and reports its error bounds.
+"""
+
+from __future__ import annotations
+
+import base64
+
+from lazy import lazy
+
+np = lazy("numpy")
+pd = lazy("pandas")
+
+DEFAULT_K = 1_000
+DEFAULT_P = 12
+
+class SpaceSaving:
+    """Top-k counts with per-key overestimation bounds."""
+
+    def __init__(self, k: int = DEFAULT_K):
+        self.k = k
+        self.n = 0
+        self.counts = pd.Series([], dtype=np.int64)
+        self.errors = pd.Series([], dtype=np.int64)
+        # False while counts are exact (nothing was ever evicted)
+        self.truncated = False
+
+    def floor(self) -> int:
+        # upper bound on the count of any key not kept
+        return int(self.counts.min()) if self.truncated and len(self.counts) else 0
+
+    def update(self, keys: pd.Series):
+        """Count one chunk of keys (missing keys are skipped)."""
+        exact = SpaceSaving(self.k)
+        exact.counts = keys.dropna().value_counts().astype(np.int64)
+        exact.errors = pd.Series(0, index=exact.counts.index, dtype=np.int64)
+        exact.n = int(exact.counts.sum())
+        self.merge(exact)
+
+    def merge(self, other: "SpaceSaving"):
+        index = self.counts.index.append(other.counts.index).unique()
+        mine, theirs = self.floor(), other.floor()
+        self.counts = (self.counts.reindex(index, fill_value=mine)
+                       + other.counts.reindex(index, fill_value=theirs)).astype(np.int64)
+        self.errors = (self.errors.reindex(index, fill_value=mine)
+                       + other.errors.reindex(index, fill_value=theirs)).astype(np.int64)
+        self.n += other.n
+        self.truncated = self.truncated or other.truncated
+        if len(self.counts) > self.k:
+            keep = self.counts.sort_values(ascending=False, kind="stable").index[:self.k]
+            self.counts, self.errors = self.counts[keep], self.errors[keep]
+            self.truncated = True
+        return self
+
+    def top(self, n: int) -> pd.Series:
+        return self.counts.sort_values(ascending=False, kind="stable").head(n)
+
+    def bounds(self) -> dict:
+        return {"n": self.n, "k": self.k, "exact": not self.truncated,
+                "max_overestimate": int(self.errors.max()) if len(self.errors) else 0,
+                "guaranteed_max_overestimate": self.n / self.k}
+
+    def to_dict(self) -> dict:
+        return {"k": self.k, "n": self.n, "truncated": self.truncated,
+                "items": [[str(key), int(c), int(e)] for key, c, e in
+                          zip(self.counts.index, self.counts.to_numpy(), self.errors.to_numpy())]}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "SpaceSaving":
+        sketch = cls(d["k"])
+        sketch.n, sketch.truncated = d["n"], d["truncated"]
+        keys = [item[0] for item in d["items"]]
+        sketch.counts = pd.Series([item[1] for item in d["items"]], index=keys, dtype=np.int64)
+        sketch.errors = pd.Series([item[2] for item in d["items"]], index=keys, dtype=np.int64)
+        return sketch
+
+def hash_keys(keys: pd.Series) -> np.ndarray:
+    return pd.util.hash_array(keys.to_numpy(dtype=object))
+
+def _leading_zeros(x: np.ndarray) -> np.ndarray:
+    # count leading zero bits of uint64 values, 64 for 0
+    x = x.copy()
+    n = np.zeros(len(x), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        top_clear = (x >> np.uint64(64 - shift)) == 0
+        n += shift * top_clear
+        x = np.where(top_clear, x << np.uint64(shift), x)
+    n += (x == 0)
+    return n
+
+def register_ranks(hashes: np.ndarray, p: int):
+    """(register index, rank) of each 64-bit hash."""
+    index = (hashes >> np.uint64(64 - p)).astype(np.int64)
+    rank = np.minimum(_leading_zeros(hashes << np.uint64(p)), 64 - p) + 1
+    return index, rank.astype(np.uint8)
+
+class HyperLogLog:
+    """Distinct count estimate in 2**p registers."""
+
+    def __init__(self, p: int = DEFAULT_P):
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype=np.uint8)
+
+    def update(self, keys: pd.Series):
+        index, rank = register_ranks(hash_keys(keys.dropna()), self.p)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog"):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self) -> float:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.ldexp(1.0, -self.registers.astype(np.int64)).sum()
+        zeros = int((self.registers == 0).sum())
+        if raw <= 2.5 * m and zeros:
+            # small range: linear counting
+            return float(m * np.log(m / zeros))
+        return float(raw)
+
+    def relative_error(self) -> float:
+        return 1.04 / np.sqrt(len(self.registers))
+
+    def to_dict(self) -> dict:
+        return {"p": self.p, "registers": base64.b64encode(self.registers.tobytes()).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "HyperLogLog":
+        sketch = cls(d["p"])
+        sketch.registers = np.frombuffer(base64.b64decode(d["registers"]), dtype=np.uint8).copy()
+        return sketch
+
+class InteractionSketches:
+    """Heavy hitters and per-day distinct counts over the interactions stream."""
+
+    def __init__(self, k: int = DEFAULT_K, p: int = DEFAULT_P):
+        self.k, self.p = k, p
+        self.views = SpaceSaving(k)
+        self.users = SpaceSaving(k)
+        # day (YYYY-MM-DD) -> HyperLogLog of user_id / recipe_id
+        self.daily_users = {}
+        self.daily_recipes = {}
+
+    def update(self, interactions: pd.DataFrame):
+        self.views.update(interactions["recipe_id"][(interactions["type"] == "view").to_numpy()])
+        self.users.update(interactions["user_id"])
+        day = interactions["timestamp"].astype(object).str[:10]
+        codes, days = pd.factorize(day)
+        for key, daily in (("user_id", self.daily_users), ("recipe_id", self.daily_recipes)):
+            keys = interactions[key]
+            present = (codes >= 0) & keys.notna().to_numpy()
+            index, rank = register_ranks(hash_keys(keys[present]), self.p)
+            registers = np.zeros((len(days), 1 << self.p), dtype=np.uint8)
+            np.maximum.at(registers, (codes[present], index), rank)
+            for i, d in enumerate(days):
+                hll = daily.setdefault(str(d), HyperLogLog(self.p))
+                np.maximum(hll.registers, registers[i], out=hll.registers)
+
+    def merge(self, other: "InteractionSketches"):
+        self.views.merge(other.views)
+        self.users.merge(other.users)
+        for mine, theirs in ((self.daily_users, other.daily_users), (self.daily_recipes, other.daily_recipes)):
+            for d, hll in theirs.items():
+                mine.setdefault(d, HyperLogLog(self.p)).merge(hll)
+        return self
+
+    def distinct_per_day(self) -> dict:
+        return {d: {"users": round(self.daily_users[d].estimate()),
+                    "recipes": round(self.daily_recipes[d].estimate())}
+                for d in sorted(self.daily_users)}
+
+    def bounds(self) -> dict:
+        return {"most_viewed_recipes": self.views.bounds(),
+                "most_active_users": self.users.bounds(),
+                "distinct_per_day_relative_std_error": HyperLogLog(self.p).relative_error()}
+
+    def to_dict(self) -> dict:
+        return {"k": self.k, "p": self.p, "views": self.views.to_dict(), "users": self.users.to_dict(),
+                "daily_users": {d: h.to_dict() for d, h in self.daily_users.items()},
+                "daily_recipes": {d: h.to_dict() for d, h in self.daily_recipes.items()}}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "InteractionSketches":
+        sketches = cls(d["k"], d["p"])
+        sketches.views = SpaceSaving.from_dict(d["views"])
+        sketches.users = SpaceSaving.from_dict(d["users"])
+        sketches.daily_users = {day: HyperLogLog.from_dict(h) for day, h in d["daily_users"].items()}
+        sketches.daily_recipes = {day: HyperLogLog.from_dict(h) for day, h in d["daily_recipes"].items()}
+        return sketches
+
+def compare_top(sketch: SpaceSaving, exact: pd.Series, n: int) -> dict:
+    """How the sketch's top n matches the exact counts (exact = value_counts())."""
+    top = sketch.top(n)
+    exact_top = exact.head(n)
+    overestimate = top - exact.reindex(top.index, fill_value=0)
+    return {"recall": len(top.index.intersection(exact_top.index)) / max(len(exact_top), 1),
+            "observed_max_overestimate": int(overestimate.max()) if len(top) else 0,
+            "within_bounds": bool(((overestimate >= 0) & (overestimate <= sketch.errors[top.index])).all()),
+            **sketch.bounds()}
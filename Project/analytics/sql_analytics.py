@@ -0,0 +1,162 @@
+# Project/analytics/sql_analytics.py
+"""
+The analytics report as SQL queries over the embedded database that
+etl/sql_store.py loads (Project/output_csv/pipeline.db), plus an ad-hoc
+query CLI.
+
+Usage:
+    python sql_analytics.py report [-o analytics_report.json]
+    python sql_analytics.py query "SELECT type, COUNT(*) FROM interactions GROUP BY type"
+
+The report equals analytics.py's: value_counts() tie order is first
+appearance, i.e. ORDER BY count DESC, MIN(rowid). The three insights that
+analytics.py orders with a pandas sort_values (engagement per ingredient,
+total time, mean rating) are aggregated in SQL and the small grouped result
+is sorted by the same pandas call, so ties come out in the same order.
+"""
+
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+
+# the database loader lives next to the ETL scripts
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "etl"))
+from sql_store import DB_PATH, connect  # noqa: E402
+from aggregates import moments_corr  # noqa: E402
+from lazy import lazy  # noqa: E402
+
+pd = lazy("pandas")
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+def value_counts(conn, table: str, column: str, where: str = "", limit: int = None) -> dict:
+    # Series.value_counts(): NULLs dropped, count desc, ties in first-appearance order
+    sql = (f"SELECT {column}, COUNT(*) AS n FROM {table} WHERE {column} IS NOT NULL {where} "
+           f"GROUP BY {column} ORDER BY n DESC, MIN(rowid)")
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    return dict(conn.execute(sql).fetchall())
+
+LIKE_MOMENTS = """
+WITH likes AS (SELECT recipe_id, COUNT(*) AS n FROM interactions WHERE type = 'like' GROUP BY recipe_id),
+     xy AS (SELECT r.prep_time_minutes AS x, COALESCE(l.n, 0) AS y
+            FROM recipe r LEFT JOIN likes l ON l.recipe_id = r.recipe_id
+            WHERE r.prep_time_minutes IS NOT NULL)
+SELECT COUNT(*), COALESCE(SUM(x), 0), COALESCE(SUM(y), 0), COALESCE(SUM(x * x), 0),
+       COALESCE(SUM(x * y), 0), COALESCE(SUM(y * y), 0)
+FROM xy
+"""
+
+ENGAGEMENT = """
+WITH engagement AS (SELECT recipe_id, COUNT(*) AS n FROM interactions WHERE recipe_id IS NOT NULL GROUP BY recipe_id),
+     rows AS (SELECT i.ingredient_key AS ingredient_key, i.ingredient_name AS name, e.n AS n
+              FROM ingredients i LEFT JOIN engagement e ON e.recipe_id = i.recipe_id)
+SELECT MIN(name) AS name, COALESCE(SUM(n), 0) AS engagement, (SELECT COUNT(*) FROM rows WHERE n IS NULL) AS missing
+FROM rows WHERE ingredient_key IS NOT NULL GROUP BY ingredient_key ORDER BY name
+"""
+
+# value_counts() of ingredient_name, counted on the integer key (one canonical name per key)
+INGREDIENT_COUNTS = """
+SELECT MIN(ingredient_name), COUNT(*) AS n FROM ingredients
+WHERE ingredient_key IS NOT NULL GROUP BY ingredient_key ORDER BY n DESC, MIN(rowid) LIMIT 10
+"""
+
+MEAN_RATING = """
+SELECT recipe_id, AVG(rating) AS rating FROM interactions
+WHERE type = 'cook' AND recipe_id IS NOT NULL GROUP BY recipe_id ORDER BY recipe_id
+"""
+
+USER_TYPE_COUNTS = """
+SELECT user_id, type, COUNT(*) FROM interactions
+WHERE user_id IS NOT NULL AND type IS NOT NULL GROUP BY user_id, type ORDER BY user_id, type
+"""
+
+def compute_insights(conn) -> dict:
+    insights = {}
+    scalar = lambda sql: conn.execute(sql).fetchone()[0]  # noqa: E731
+
+    # 1. Most common ingredients
+    insights["most_common_ingredients"] = dict(conn.execute(INGREDIENT_COUNTS).fetchall())
+
+    # 2. Average preparation time
+    avg_prep = scalar("SELECT AVG(prep_time_minutes) FROM recipe")
+    insights["average_prep_time_minutes"] = float("nan") if avg_prep is None else avg_prep
+
+    # 3. Difficulty distribution
+    insights["difficulty_distribution"] = value_counts(conn, "recipe", "difficulty")
+
+    # 4. Correlation between prep time & likes (co-moments, as aggregates.like_moments)
+    n, sx, sy, sxx, sxy, syy = conn.execute(LIKE_MOMENTS).fetchone()
+    insights["correlation_prep_time_likes"] = moments_corr(
+        {"n": n, "sx": sx, "sy": sy, "sxx": sxx, "sxy": sxy, "syy": syy})
+
+    # 5. Most frequently viewed recipes
+    insights["most_viewed_recipes"] = value_counts(conn, "interactions", "recipe_id", "AND type = 'view'", 10)
+
+    # 6. Ingredients associated with high engagement (float sums when some recipe has none, as in pandas)
+    rows = pd.read_sql_query(ENGAGEMENT, conn)
+    engagement = rows.set_index("name")["engagement"].rename_axis("ingredient_name")
+    if len(rows) and rows["missing"].iloc[0]:
+        engagement = engagement.astype(float)
+    insights["high_engagement_ingredients"] = engagement.sort_values(ascending=False).head(10).to_dict()
+
+    # 7. Average number of steps per recipe
+    avg_steps = scalar("SELECT AVG(n) FROM (SELECT COUNT(*) AS n FROM steps "
+                       "WHERE recipe_id IS NOT NULL GROUP BY recipe_id)")
+    insights["avg_steps_per_recipe"] = float("nan") if avg_steps is None else avg_steps
+
+    # 8. Most time-consuming recipes
+    top_time = pd.read_sql_query("SELECT recipe_id, name, prep_time_minutes + cook_time_minutes AS total_time "
+                                 "FROM recipe ORDER BY rowid", conn)
+    top_time["total_time"] = top_time["total_time"].astype("Int64")
+    top_time = top_time.sort_values(by="total_time", ascending=False).head(10)
+    insights["most_time_consuming_recipes"] = top_time.to_dict(orient="records")
+
+    # 9. Most active users
+    insights["most_active_users"] = value_counts(conn, "interactions", "user_id", limit=5)
+
+    # 10. Highest rated recipes (NaN when no cook was rated)
+    rated = pd.read_sql_query(MEAN_RATING, conn).set_index("recipe_id")["rating"].astype(float)
+    insights["highest_rated_recipes"] = rated.sort_values(ascending=False).head(10).to_dict()
+
+    # 11. User interaction stats (users x types seen)
+    counts = conn.execute(USER_TYPE_COUNTS).fetchall()
+    types = sorted({t for _, t, _ in counts})
+    users = {}
+    for user, t, c in counts:
+        users.setdefault(user, dict.fromkeys(types, 0))[t] = c
+    insights["user_interaction_counts"] = users
+
+    return insights
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Analytics over the embedded pipeline database")
+    ap.add_argument("--db", type=Path, default=DB_PATH, help="database file (default: %(default)s)")
+    sub = ap.add_subparsers(dest="command", required=True)
+    report = sub.add_parser("report", help="write the analytics report computed in SQL")
+    report.add_argument("-o", "--output", type=Path, default=Path("analytics_report.json"))
+    query = sub.add_parser("query", help="run one SQL statement and print the result")
+    query.add_argument("sql")
+    args = ap.parse_args(argv)
+
+    try:
+        conn = connect(args.db)
+    except FileNotFoundError as e:
+        logging.error("%s", e)
+        return 1
+    try:
+        if args.command == "query":
+            print(pd.read_sql_query(args.sql, conn).to_string(index=False))
+            return 0
+        insights = compute_insights(conn)
+    finally:
+        conn.close()
+    with open(args.output, "w") as f:
+        json.dump(insights, f, indent=4)
+    logging.info("Analytics complete! See %s", args.output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
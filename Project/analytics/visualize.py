@@ -3,13 +3,46 @@
 visualize.py
 Generate charts for the Recipe Analytics project.
 Saves PNG files to: projects/visuals/
+
+Usage: python visualize.py [--chunk-rows N | --max-memory MB] [--workers N] [--changed-only] [--profile]
+
+Interaction charts are drawn from a per-recipe counts matrix
+(aggregates.recipe_matrix) built over the interactions table chunk by
+chunk, so the table never has to fit in memory.
+
+The data each chart plots is computed once in this process (chart_inputs,
+sharing the matrix, recipe names and per-recipe totals); the charts are
+then rendered in a process pool with the Agg backend. --changed-only
+renders only charts whose input data hash differs from the last run
+(hashes in analytics/state/charts.json) or whose PNG is missing.
+
+The fold and each chart are measured (metrics.py; a worker returns its
+chart's record to the parent) and written to Project/metrics/visualize.json
+and visualize.prom.
 """
 
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
 import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-import pandas as pd
-import matplotlib.pyplot as plt
-import numpy as np
+
+# shared table loader lives next to the ETL scripts
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "etl"))
+from table_store import chunk_rows_for, find_table, from_frame, iter_table, load_table  # noqa: E402
+from aggregates import fold_recipe_matrix, ingredient_counts, top_counts  # noqa: E402
+from lazy import lazy  # noqa: E402
+import metrics  # noqa: E402
+
+pd = lazy("pandas")
+np = lazy("numpy")
+matplotlib = lazy("matplotlib")
+plt = lazy("matplotlib.pyplot")
 
 # --- Configuration ---
 BASE = Path(__file__).resolve().parent  # Project/analytics
@@ -19,17 +52,13 @@ DATA = BASE.parent / "output_csv"
 
 # Output images stay inside analytics/visuals
 VISUALS = BASE / "visuals"
-VISUALS.mkdir(exist_ok=True)
 
-RECIPE_CSV = DATA / "recipe.csv"
-ING_CSV = DATA / "ingredients.csv"
-INTERACTIONS_CSV = DATA / "interactions.csv"
-STEPS_CSV = DATA / "steps.csv"
+# input data hashes of the last rendered charts (--changed-only)
+HASHES = BASE / "state" / "charts.json"
 
-def read_csv_safe(path):
-    if not path.exists():
-        raise FileNotFoundError(f"Required CSV not found: {path}")
-    return pd.read_csv(path)
+def read_table_safe(name, columns=None):
+    # raises FileNotFoundError when neither <name>.parquet nor <name>.csv exists
+    return load_table(name, columns, out_dir=DATA)
 
 def save_fig(fig, name):
     out_path = VISUALS / name
@@ -38,39 +67,92 @@ def save_fig(fig, name):
     plt.close(fig)
     print(f"Saved: {out_path}")
 
-def top_viewed_recipes(recipes, interactions, top_n=10):
-    views = interactions[interactions["type"] == "view"]
-    view_counts = views["recipe_id"].value_counts().head(top_n)
-    # join with recipe names
+# --- Chart inputs: computed once in the parent from the shared aggregates ---
+
+def with_names(df, names):
+    # recipe names for the bar labels, falling back to the id
+    return df.assign(name=df["recipe_id"].map(names))
+
+def top_viewed_recipes_data(names, by_recipe, top_n=10):
+    view_counts = top_counts(by_recipe["view"], by_recipe["first_view"], top_n)
     df = view_counts.rename("views").reset_index().rename(columns={"index": "recipe_id"})
-    df = df.merge(recipes[["recipe_id", "name"]], on="recipe_id", how="left")
-    df = df.sort_values("views", ascending=True)  # for horizontal bar plot
+    return with_names(df, names).sort_values("views", ascending=True)  # for horizontal bar plot
+
+def difficulty_distribution_data(recipes):
+    return recipes["difficulty"].fillna("Unknown").value_counts()
+
+def most_common_ingredients_data(ingredients, top_n=15):
+    return ingredient_counts(ingredients, top_n)
+
+def prep_time_vs_likes_data(recipes, by_recipe):
+    merged = recipes[["recipe_id", "prep_time_minutes"]].copy()
+    merged["like_count"] = merged["recipe_id"].map(by_recipe["like"]).fillna(0)
+    return merged
+
+def top_recipes_by_total_interactions_data(names, engagement, top_n=10):
+    top = engagement.rename("total_interactions").reset_index().sort_values("total_interactions", ascending=False).head(top_n)
+    return with_names(top, names).sort_values("total_interactions", ascending=True)
+
+def average_rating_per_recipe_data(names, by_recipe):
+    rated = by_recipe[by_recipe["rating_count"] > 0].sort_index()
+    if rated.empty:
+        return None
+    rating = (rated["rating_sum"] / rated["rating_count"]).rename("rating")
+    return with_names(rating.reset_index().sort_values("rating", ascending=False).head(15), names)
+
+def avg_steps_per_recipe_data(steps):
+    counts = steps.groupby("recipe_id").size().rename("step_count").reset_index().sort_values("step_count", ascending=False)
+    return counts.head(15)
+
+def cuisine_popularity_by_engagement_data(recipes, engagement):
+    cuisine = engagement.index.map(recipes.drop_duplicates("recipe_id").set_index("recipe_id")["cuisine"])
+    return engagement.groupby(cuisine).sum().rename_axis("cuisine").sort_values(ascending=False).head(15)
+
+def chart_inputs(recipes, ingredients, steps, by_recipe):
+    """{png file name: the data its chart plots}; per-recipe totals and names are shared."""
+    names = recipes.drop_duplicates("recipe_id").set_index("recipe_id")["name"]
+    engagement = by_recipe["total"].sort_index().rename_axis("recipe_id")
+    return {
+        "most_viewed_recipes.png": top_viewed_recipes_data(names, by_recipe),
+        "difficulty_distribution.png": difficulty_distribution_data(recipes),
+        "most_common_ingredients.png": most_common_ingredients_data(ingredients),
+        "prep_time_vs_likes.png": prep_time_vs_likes_data(recipes, by_recipe),
+        "top_recipes_total_interactions.png": top_recipes_by_total_interactions_data(names, engagement),
+        "average_rating_per_recipe.png": average_rating_per_recipe_data(names, by_recipe),
+        "avg_steps_per_recipe.png": avg_steps_per_recipe_data(steps),
+        "cuisine_popularity_engagement.png": cuisine_popularity_by_engagement_data(recipes, engagement),
+    }
+
+def input_hash(data) -> str:
+    h = hashlib.sha256()
+    if data is not None:
+        h.update(repr((list(data.columns) if isinstance(data, pd.DataFrame) else data.name, data.index.name)).encode())
+        h.update(pd.util.hash_pandas_object(data).to_numpy().tobytes())
+    return h.hexdigest()
+
+# --- Renderers: only plot the prepared data (run in worker processes) ---
+
+def top_viewed_recipes(df):
     fig, ax = plt.subplots(figsize=(8, 6))
     ax.barh(df["name"].fillna(df["recipe_id"]), df["views"])
     ax.set_xlabel("Views")
     ax.set_title(f"Top {len(df)} Most Viewed Recipes")
     save_fig(fig, "most_viewed_recipes.png")
 
-def difficulty_distribution(recipes):
-    counts = recipes["difficulty"].fillna("Unknown").value_counts()
+def difficulty_distribution(counts):
     fig, ax = plt.subplots(figsize=(6,6))
     ax.pie(counts, labels=counts.index, autopct="%1.1f%%", startangle=90)
     ax.set_title("Difficulty Distribution")
     save_fig(fig, "difficulty_distribution.png")
 
-def most_common_ingredients(ingredients, top_n=15):
-    counts = ingredients["ingredient_name"].value_counts().head(top_n)
+def most_common_ingredients(counts):
     fig, ax = plt.subplots(figsize=(8,6))
     counts.sort_values().plot(kind="barh", ax=ax)
     ax.set_xlabel("Recipe Count (ingredient appears in X recipes)")
     ax.set_title(f"Top {len(counts)} Most Common Ingredients")
     save_fig(fig, "most_common_ingredients.png")
 
-def prep_time_vs_likes(recipes, interactions):
-    likes = interactions[interactions["type"] == "like"]
-    like_counts = likes.groupby("recipe_id").size().rename("like_count").reset_index()
-    merged = recipes[["recipe_id", "name", "prep_time_minutes"]].merge(like_counts, on="recipe_id", how="left")
-    merged["like_count"] = merged["like_count"].fillna(0)
+def prep_time_vs_likes(merged):
     # scatter
     fig, ax = plt.subplots(figsize=(7,6))
     ax.scatter(merged["prep_time_minutes"], merged["like_count"])
@@ -93,23 +175,17 @@ def prep_time_vs_likes(recipes, interactions):
 
     save_fig(fig, "prep_time_vs_likes.png")
 
-def top_recipes_by_total_interactions(recipes, interactions, top_n=10):
-    total = interactions.groupby("recipe_id").size().rename("total_interactions").reset_index()
-    top = total.sort_values("total_interactions", ascending=False).head(top_n)
-    df = top.merge(recipes[["recipe_id","name"]], on="recipe_id", how="left").sort_values("total_interactions", ascending=True)
+def top_recipes_by_total_interactions(df):
     fig, ax = plt.subplots(figsize=(8,6))
     ax.barh(df["name"].fillna(df["recipe_id"]), df["total_interactions"])
     ax.set_xlabel("Total Interactions")
     ax.set_title(f"Top {len(df)} Recipes by Total Interactions")
     save_fig(fig, "top_recipes_total_interactions.png")
 
-def average_rating_per_recipe(interactions, recipes):
-    cook = interactions[interactions["type"] == "cook"].dropna(subset=["rating"])
-    if cook.empty:
+def average_rating_per_recipe(df):
+    if df is None:
         print("No cook interactions with ratings found — skipping average_rating_per_recipe.")
         return
-    avg = cook.groupby("recipe_id")["rating"].mean().reset_index().sort_values("rating", ascending=False).head(15)
-    df = avg.merge(recipes[["recipe_id","name"]], on="recipe_id", how="left")
     fig, ax = plt.subplots(figsize=(8,6))
     ax.bar(df["name"].fillna(df["recipe_id"]), df["rating"])
     ax.set_ylabel("Average Rating")
@@ -117,9 +193,7 @@ def average_rating_per_recipe(interactions, recipes):
     ax.set_xticklabels(df["name"].fillna(df["recipe_id"]), rotation=45, ha="right")
     save_fig(fig, "average_rating_per_recipe.png")
 
-def avg_steps_per_recipe(steps):
-    counts = steps.groupby("recipe_id").size().rename("step_count").reset_index().sort_values("step_count", ascending=False)
-    top = counts.head(15)
+def avg_steps_per_recipe(top):
     fig, ax = plt.subplots(figsize=(8,6))
     ax.bar(top["recipe_id"], top["step_count"])
     ax.set_xlabel("Recipe ID")
@@ -127,25 +201,80 @@ def avg_steps_per_recipe(steps):
     ax.set_title("Top Recipes by Number of Steps (top 15)")
     save_fig(fig, "avg_steps_per_recipe.png")
 
-def cuisine_popularity_by_engagement(recipes, interactions):
-    eng = interactions.groupby("recipe_id").size().rename("engagement").reset_index()
-    merged = eng.merge(recipes[["recipe_id","cuisine"]], on="recipe_id", how="left")
-    by_cuisine = merged.groupby("cuisine")["engagement"].sum().sort_values(ascending=False).head(15)
+def cuisine_popularity_by_engagement(by_cuisine):
     fig, ax = plt.subplots(figsize=(8,6))
     by_cuisine.sort_values().plot(kind="barh", ax=ax)
     ax.set_xlabel("Total Engagement (views+likes+cooks)")
     ax.set_title("Cuisine Popularity by Engagement")
     save_fig(fig, "cuisine_popularity_engagement.png")
 
-def main():
+RENDERERS = {
+    "most_viewed_recipes.png": top_viewed_recipes,
+    "difficulty_distribution.png": difficulty_distribution,
+    "most_common_ingredients.png": most_common_ingredients,
+    "prep_time_vs_likes.png": prep_time_vs_likes,
+    "top_recipes_total_interactions.png": top_recipes_by_total_interactions,
+    "average_rating_per_recipe.png": average_rating_per_recipe,
+    "avg_steps_per_recipe.png": avg_steps_per_recipe,
+    "cuisine_popularity_engagement.png": cuisine_popularity_by_engagement,
+}
+
+def render(name, data):
+    """Render one chart; returns its metrics record."""
+    matplotlib.use("Agg")  # files only, no display; safe in worker processes
+    with metrics.stage(f"visualize.{Path(name).stem}", rows_in=metrics.count(data)) as m:
+        RENDERERS[name](data)
+    return m
+
+def render_all(inputs, workers):
+    """Render every chart in inputs, in a process pool when workers > 1; returns seconds per chart."""
+    names = list(inputs)
+    if workers <= 1 or len(names) <= 1:
+        records = [render(name, inputs[name]) for name in names]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(names))) as pool:
+            records = list(pool.map(render, names, [inputs[n] for n in names]))
+        # measured in the workers' processes
+        metrics.record(records)
+    return {name: m["seconds"] for name, m in zip(names, records)}
+
+def load_hashes():
     try:
-        recipes = read_csv_safe(RECIPE_CSV)
-        ingredients = read_csv_safe(ING_CSV)
-        interactions = read_csv_safe(INTERACTIONS_CSV)
-        steps = read_csv_safe(STEPS_CSV)
-    except FileNotFoundError as e:
-        print(e)
-        return
+        return json.loads(HASHES.read_text())
+    except (OSError, ValueError):
+        return {}
+
+# columns each input table is loaded with
+COLUMNS = {
+    "recipe": ["recipe_id", "name", "difficulty", "prep_time_minutes", "cuisine"],
+    "ingredients": ["recipe_id", "ingredient_name", "ingredient_key", "name"],
+    "steps": ["recipe_id"],
+}
+INTERACTION_COLUMNS = ["recipe_id", "type", "rating"]
+
+def load_inputs(frames=None):
+    """(recipes, ingredients, steps) from `frames` (transform outputs still in memory) or DATA."""
+    loaded = []
+    for name, columns in COLUMNS.items():
+        if frames and name in frames:
+            loaded.append(from_frame(frames[name], name, columns))
+        else:
+            loaded.append(read_table_safe(name, columns))
+    if find_table("interactions", DATA)[0] is None:
+        raise FileNotFoundError(f"Required table not found: {DATA / 'interactions.csv'}")
+    return tuple(loaded)
+
+def draw(recipes, ingredients, steps, chunk_rows=1_000_000, workers=1, changed_only=False):
+    """Fold the interactions table and render the charts; returns seconds per rendered chart."""
+    VISUALS.mkdir(exist_ok=True)
+    with metrics.stage("visualize.fold", rows_in=0) as m:
+        def chunks():
+            for chunk in iter_table("interactions", INTERACTION_COLUMNS, chunk_rows=chunk_rows, out_dir=DATA):
+                m["rows_in"] += len(chunk)
+                yield chunk
+
+        by_recipe = fold_recipe_matrix(chunks())
+        m["rows_out"] = len(by_recipe)
 
     # Ensure expected column names (common variations handled)
     # rename columns if needed for consistency
@@ -155,17 +284,55 @@ def main():
     if col_map:
         ingredients = ingredients.rename(columns=col_map)
 
+    inputs = chart_inputs(recipes, ingredients, steps, by_recipe)
+    hashes = {name: input_hash(data) for name, data in inputs.items()}
+    if changed_only:
+        previous = load_hashes()
+        unchanged = [name for name, data in inputs.items()
+                     if previous.get(name) == hashes[name] and (data is None or (VISUALS / name).exists())]
+        for name in unchanged:
+            del inputs[name]
+        print(f"{len(unchanged)} charts unchanged, rendering {len(inputs)}")
+
     # Run visualizations
-    top_viewed_recipes(recipes, interactions)
-    difficulty_distribution(recipes)
-    most_common_ingredients(ingredients)
-    prep_time_vs_likes(recipes, interactions)
-    top_recipes_by_total_interactions(recipes, interactions)
-    average_rating_per_recipe(interactions, recipes)
-    avg_steps_per_recipe(steps)
-    cuisine_popularity_by_engagement(recipes, interactions)
+    start = time.perf_counter()
+    seconds = render_all(inputs, workers)
+    if seconds:
+        slowest = max(seconds, key=seconds.get)
+        print(f"Rendered {len(seconds)} charts in {time.perf_counter() - start:.2f}s "
+              f"(sum {sum(seconds.values()):.2f}s, slowest {slowest} {seconds[slowest]:.2f}s)")
+
+    HASHES.parent.mkdir(exist_ok=True)
+    HASHES.write_text(json.dumps(hashes, indent=2))
 
     print("\nAll charts saved to:", VISUALS)
+    return seconds
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Generate charts for the Recipe Analytics project")
+    ap.add_argument("--chunk-rows", type=int, default=1_000_000,
+                    help="interactions are aggregated this many rows at a time (default: %(default)s)")
+    ap.add_argument("--max-memory", type=float, metavar="MB",
+                    help="pick --chunk-rows so one chunk and its working copies fit in MB")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                    help="render charts in this many processes (default: %(default)s)")
+    ap.add_argument("--changed-only", action="store_true",
+                    help="render only charts whose input data changed since the last run")
+    ap.add_argument("--profile", action="store_true",
+                    help="also write a cProfile / tracemalloc profile (Project/metrics/visualize.prof)")
+    args = ap.parse_args(argv)
+
+    try:
+        recipes, ingredients, steps = load_inputs()
+    except FileNotFoundError as e:
+        print(e)
+        return
+
+    chunk_rows = args.chunk_rows
+    if args.max_memory:
+        chunk_rows = chunk_rows_for("interactions", args.max_memory, INTERACTION_COLUMNS, out_dir=DATA)
+    with metrics.run("visualize", profile=args.profile), metrics.stage("visualize"):
+        draw(recipes, ingredients, steps, chunk_rows, args.workers, args.changed_only)
 
 if __name__ == "__main__":
     main()
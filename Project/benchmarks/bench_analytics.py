@@ -0,0 +1,118 @@
+# Project/benchmarks/bench_analytics.py
+"""
+Benchmark analytics.py's interaction insights: the original code (three
+type filters, five groupby/value_counts passes over interactions and an
+ingredients x engagement merge) vs the aggregation engine (one grouped pass
+per key into per-recipe / per-user matrices). Checks both give the same
+report (floats up to rounding).
+
+Usage: python bench_analytics.py [--rows 5000000]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "etl"))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "analytics"))
+import aggregates  # noqa: E402
+
+# interactions passes: like/view/cook filters, groupby recipe_id x3
+# (likes, engagement, cook ratings), value_counts on views + user_id,
+# groupby (user_id, type)
+REFERENCE_PASSES = 9
+ENGINE_PASSES = 2
+
+def make_tables(n: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    n_recipes, n_users = 20_000, 200_000
+    recipe_ids = np.array([f"R{i:06d}" for i in range(n_recipes)], dtype=object)
+    user_ids = np.array([f"U{i:06d}" for i in range(n_users)], dtype=object)
+    # power-law popularity, like real engagement
+    recipe_p = 1 / np.arange(1, n_recipes + 1) ** 1.1
+    user_p = 1 / np.arange(1, n_users + 1) ** 0.9
+    types = np.array(["view", "like", "cook"], dtype=object)[rng.choice(3, n, p=[0.6, 0.25, 0.15])]
+    rating = np.where(types == "cook", rng.integers(1, 6, n).astype(float), np.nan)
+    interactions = pd.DataFrame({
+        "user_id": pd.array(user_ids[rng.choice(n_users, n, p=user_p / user_p.sum())], dtype="str"),
+        "recipe_id": pd.array(recipe_ids[rng.choice(n_recipes, n, p=recipe_p / recipe_p.sum())], dtype="str"),
+        "type": pd.array(types, dtype="str"),
+        "rating": rating,
+    })
+    recipes = pd.DataFrame({
+        "recipe_id": pd.array(recipe_ids, dtype="str"),
+        "name": pd.array([f"Recipe {i}" for i in range(n_recipes)], dtype="str"),
+        "prep_time_minutes": rng.integers(5, 120, n_recipes),
+        "cook_time_minutes": rng.integers(0, 240, n_recipes),
+        "difficulty": pd.array(np.array(["Easy", "Medium", "Hard"], dtype=object)[rng.integers(0, 3, n_recipes)], dtype="str"),
+    })
+    per_recipe = rng.integers(3, 12, n_recipes)
+    ingredients = pd.DataFrame({
+        "recipe_id": pd.array(np.repeat(recipe_ids, per_recipe), dtype="str"),
+        "ingredient_name": pd.array([f"ingredient {i}" for i in rng.zipf(1.5, per_recipe.sum()) % 2_000], dtype="str"),
+    })
+    steps = pd.DataFrame({"recipe_id": pd.array(np.repeat(recipe_ids, rng.integers(2, 9, n_recipes)), dtype="str")})
+    return recipes, ingredients, steps, interactions
+
+def reference(recipes, ingredients, steps, interactions):
+    # analytics.py before the aggregation engine
+    insights = {}
+    insights["most_common_ingredients"] = ingredients["ingredient_name"].value_counts().head(10).to_dict()
+    insights["average_prep_time_minutes"] = recipes["prep_time_minutes"].mean()
+    insights["difficulty_distribution"] = recipes["difficulty"].value_counts().to_dict()
+    likes = interactions[interactions["type"] == "like"]
+    likes_count = likes.groupby("recipe_id").size().reset_index(name="like_count")
+    merged = pd.merge(recipes[["recipe_id", "prep_time_minutes"]], likes_count, on="recipe_id", how="left")
+    merged["like_count"] = merged["like_count"].fillna(0)
+    insights["correlation_prep_time_likes"] = merged["prep_time_minutes"].corr(merged["like_count"])
+    views = interactions[interactions["type"] == "view"]
+    insights["most_viewed_recipes"] = views["recipe_id"].value_counts().head(10).to_dict()
+    engagement = interactions.groupby("recipe_id").size().reset_index(name="engagement")
+    merged_ing = pd.merge(ingredients, engagement, on="recipe_id", how="left")
+    insights["high_engagement_ingredients"] = (
+        merged_ing.groupby("ingredient_name")["engagement"].sum().sort_values(ascending=False).head(10).to_dict())
+    insights["avg_steps_per_recipe"] = steps.groupby("recipe_id").size().mean()
+    recipes = recipes.copy()
+    recipes["total_time"] = recipes["prep_time_minutes"] + recipes["cook_time_minutes"]
+    top_time = recipes.sort_values(by="total_time", ascending=False).head(10)
+    insights["most_time_consuming_recipes"] = top_time[["recipe_id", "name", "total_time"]].to_dict(orient="records")
+    insights["most_active_users"] = interactions["user_id"].value_counts().head(5).to_dict()
+    cook = interactions[interactions["type"] == "cook"]
+    if not cook.empty:
+        insights["highest_rated_recipes"] = (
+            cook.groupby("recipe_id")["rating"].mean().sort_values(ascending=False).head(10).to_dict())
+    else:
+        insights["highest_rated_recipes"] = {}
+    insights["user_interaction_counts"] = (
+        interactions.groupby(["user_id", "type"]).size().unstack(fill_value=0).to_dict(orient="index"))
+    return insights
+
+def engine(recipes, ingredients, steps, interactions):
+    by_recipe = aggregates.recipe_matrix(interactions)
+    by_user = aggregates.user_matrix(interactions)
+    return aggregates.compute_insights(recipes, ingredients, steps, by_recipe, by_user)
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--rows", type=int, default=5_000_000)
+    args = ap.parse_args()
+
+    tables = make_tables(args.rows)
+    print(f"{args.rows:,} interactions, {len(tables[0]):,} recipes, {len(tables[1]):,} ingredient rows")
+    results = {}
+    for label, fn, passes in (("reference", reference, REFERENCE_PASSES), ("engine", engine, ENGINE_PASSES)):
+        start = time.perf_counter()
+        results[label] = fn(*tables)
+        elapsed = time.perf_counter() - start
+        print(f"{label:10} {elapsed:8.2f}s  {passes} passes over interactions")
+    # the engine's correlation comes from exact co-moments, so floats may differ in the last bits
+    same = aggregates.same_report(results["reference"], results["engine"])
+    print(f"same report: {same}")
+    return 0 if same else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+# Project/benchmarks/bench_analytics_workers.py
+"""
+Benchmark the process-pool analytics fold (AnalyticsState.refresh with
+--workers) at 1, 2, 4, 8 and 16 workers over a synthetic Parquet
+interactions table, and check every worker count gives the 1-worker report.
+
+Usage: python bench_analytics_workers.py [--rows 20000000] [--workers 1 2 4 8 16]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "etl"))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "analytics"))
+import aggregates  # noqa: E402
+import table_store as tables  # noqa: E402
+from analytics_state import AnalyticsState  # noqa: E402
+from bench_analytics import make_tables  # noqa: E402
+
+def write_interactions(interactions, out_dir: Path, chunk_rows: int = 1_000_000):
+    interactions = interactions.assign(
+        interaction_id=np.char.add("I", np.arange(len(interactions)).astype(str)).astype(object),
+        rating=interactions["rating"].astype(object).where(interactions["rating"].notna(), ""),
+        timestamp="2025-11-01T10:00:00+00:00",
+    )
+    writer = tables.TableWriter("interactions", ("parquet",), out_dir=out_dir)
+    for start in range(0, len(interactions), chunk_rows):
+        writer.write(interactions.iloc[start:start + chunk_rows])
+    return writer.close()
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--rows", type=int, default=20_000_000)
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    ap.add_argument("--chunk-rows", type=int, default=1_000_000)
+    args = ap.parse_args()
+    if not tables.has_parquet():
+        sys.exit("pyarrow is required for this benchmark")
+
+    recipes, ingredients, steps, interactions = make_tables(args.rows)
+    print(f"{args.rows:,} interactions on {os.cpu_count()} CPUs")
+    with tempfile.TemporaryDirectory() as tmp:
+        out_dir = Path(tmp)
+        write_interactions(interactions, out_dir)
+        del interactions
+        baseline, report, same = None, None, True
+        for workers in args.workers:
+            state = AnalyticsState(state_dir=out_dir / f"state{workers}")
+            start = time.perf_counter()
+            state.refresh(recipes, full=True, out_dir=out_dir, chunk_rows=args.chunk_rows, workers=workers)
+            elapsed = time.perf_counter() - start
+            insights = state.insights(recipes, ingredients, steps)
+            baseline = baseline or elapsed
+            report = report or insights
+            ok = aggregates.same_report(report, insights)
+            same = same and ok
+            print(f"{workers:3} workers {elapsed:8.2f}s  {args.rows / elapsed:12,.0f} rows/s"
+                  f"  speedup {baseline / elapsed:5.2f}x  same report: {ok}")
+    return 0 if same else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
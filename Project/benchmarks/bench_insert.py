@@ -0,0 +1,63 @@
+# Project/benchmarks/bench_insert.py
+"""
+Benchmark seeding interactions one set() round-trip per document (the old
+insert_data.py) vs bulk_writer.BulkWriter (500-write batches, concurrent
+commits, retries) against the fake client with a simulated commit latency
+and contention aborts. Checks both leave the same documents behind.
+
+Usage: python bench_insert.py [--docs 20000] [--latency-ms 20] [--abort-rate 0.02] [--in-flight 8]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "etl"))
+from bulk_writer import BulkWriter  # noqa: E402
+from fake_firestore import FakeClient  # noqa: E402
+
+# per-document baseline is timed on a sample and extrapolated
+SAMPLE = 500
+
+def make_docs(n: int):
+    types = ("view", "like", "cook")
+    return [{"interaction_id": f"I{i:07d}", "user_id": f"U{i % 5000:05d}", "recipe_id": f"R{i % 2000:05d}",
+             "type": types[i % 3], "timestamp": "2025-11-01T10:00:00Z"} for i in range(n)]
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--docs", type=int, default=20_000)
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    ap.add_argument("--abort-rate", type=float, default=0.02)
+    ap.add_argument("--in-flight", type=int, default=8)
+    args = ap.parse_args()
+    docs = make_docs(args.docs)
+    latency = args.latency_ms / 1000
+
+    single = FakeClient(latency=latency)
+    sample = docs[:min(SAMPLE, len(docs))]
+    start = time.perf_counter()
+    for doc in sample:
+        single.collection("UserInteractions").document(doc["interaction_id"]).set(doc)
+    per_doc = (time.perf_counter() - start) / len(sample)
+    print(f"per-document set  {per_doc * len(docs):8.2f}s  {1 / per_doc:10,.0f} writes/s"
+          f"  (extrapolated from {len(sample)} docs)")
+
+    bulk = FakeClient(latency=latency, abort_rate=args.abort_rate)
+    collection = bulk.collection("UserInteractions")
+    with BulkWriter(bulk, max_in_flight=args.in_flight) as writer:
+        for doc in docs:
+            writer.set(collection.document(doc["interaction_id"]), doc)
+    stats = writer.stats()
+    print(f"bulk writer       {stats['seconds']:8.2f}s  {stats['writes_per_sec']:10,.0f} writes/s"
+          f"  {stats['batches']} batches, {stats['retries']} retries ({bulk.aborted_count} aborted commits)")
+    print(f"speedup {per_doc * len(docs) / stats['seconds']:.1f}x")
+
+    stored = bulk.dump()["UserInteractions"]
+    same = len(stored) == len(docs) and all(stored[d["interaction_id"]] == d for d in docs)
+    print(f"all documents written: {same}")
+    return 0 if same else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
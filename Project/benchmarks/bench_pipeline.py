@@ -0,0 +1,181 @@
+# Project/benchmarks/bench_pipeline.py
+"""
+End-to-end benchmark of the pipeline stages (export_firestore, transform_etl,
+validator, analytics, visualize) on generated datasets of increasing size.
+
+Usage: python bench_pipeline.py [--sizes 10000 100000 1000000 10000000]
+                                [--stages export transform validator analytics visualize]
+                                [--baseline PATH] [--save-baseline] [--tolerance 0.2] [--keep]
+
+For every size, generate_data.py writes a synthetic export and the stage
+scripts are copied into a scratch Project/ tree (they locate data and
+output relative to their own file), so the checked-in data is never
+touched. Export runs against the in-process fake client seeded from the
+generated files (--fake), so no network is needed; note the fake holds the
+collections in memory. Each stage runs as its own process and is measured
+for wall time, interactions/sec, peak RSS (wait4) and the bytes of the
+files it wrote. A failing stage is recorded and skips the rest of its size.
+
+Results go to results/pipeline.json. With a baseline (default
+results/pipeline_baseline.json, written by --save-baseline) every
+(stage, size) is compared and flagged as a regression when time or peak RSS
+grows by more than --tolerance (time: and by at least --min-seconds); the
+exit status is 1 when anything regressed.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+PROJECT = Path(__file__).resolve().parents[1]
+GENERATOR = PROJECT / "etl" / "generate_data.py"
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+RESULTS = RESULTS_DIR / "pipeline.json"
+BASELINE = RESULTS_DIR / "pipeline_baseline.json"
+
+# stage -> script (relative to Project/) and arguments; {seed} is the generated export
+STAGES = {
+    "export": ("etl/export_firestore.py", ["--fake", "{seed}", "--full", "--format", "ndjson"]),
+    "transform": ("etl/transform_etl.py", []),
+    "validator": ("etl/validator.py", []),
+    "analytics": ("analytics/analytics.py", []),
+    "visualize": ("analytics/visualize.py", []),
+}
+CODE_DIRS = ("etl", "analytics")
+
+def dataset_args(interactions: int, out: Path, seed: int) -> list:
+    # catalogue grows with the traffic: 1 recipe per 1,000 and 1 user per 100 interactions
+    return ["--interactions", str(interactions), "--recipes", str(max(20, interactions // 1_000)),
+            "--users", str(max(5, interactions // 100)), "--seed", str(seed), "--out", str(out)]
+
+def make_workspace(root: Path) -> Path:
+    project = root / "Project"
+    for sub in CODE_DIRS:
+        (project / sub).mkdir(parents=True)
+        for src in (PROJECT / sub).glob("*.py"):
+            shutil.copy2(src, project / sub / src.name)
+    return project
+
+def snapshot(root: Path) -> dict:
+    return {p: (st.st_size, st.st_mtime_ns) for p in root.rglob("*") if p.is_file() and (st := p.stat())}
+
+def run_stage(project: Path, stage: str, seed_dir: Path, log_dir: Path) -> dict:
+    script, extra = STAGES[stage]
+    cmd = [sys.executable, str(project / script)] + [a.format(seed=seed_dir) for a in extra]
+    before = snapshot(project)
+    log_path = log_dir / f"{stage}.log"
+    with open(log_path, "w") as log:
+        start = time.perf_counter()
+        proc = subprocess.Popen(cmd, cwd=(project / script).parent, stdout=log, stderr=subprocess.STDOUT)
+        # wait4 reports the rusage of this child alone (RUSAGE_CHILDREN would mix stages)
+        _, status, usage = os.wait4(proc.pid, 0)
+        seconds = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    after = snapshot(project)
+    written = sum(size for p, (size, mtime) in after.items() if before.get(p) != (size, mtime))
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    return {"stage": stage, "ok": proc.returncode == 0, "seconds": round(seconds, 3),
+            "peak_rss_mb": round(rss / 2**20, 1), "output_bytes": written, "log": str(log_path)}
+
+def bench_size(interactions: int, stages: list, seed: int, keep: bool) -> list:
+    root = Path(tempfile.mkdtemp(prefix=f"bench_pipeline_{interactions}_"))
+    try:
+        project = make_workspace(root)
+        log_dir = root / "logs"
+        log_dir.mkdir()
+        # export reads the generated files through the fake client; without it they are the export
+        seed_dir = root / "seed" if "export" in stages else project / "data"
+        # in a child too: a child's peak RSS starts at this process's RSS when it forks
+        start = time.perf_counter()
+        subprocess.run([sys.executable, str(GENERATOR)] + dataset_args(interactions, seed_dir, seed),
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        print(f"\n{interactions:,} interactions (generated in {time.perf_counter() - start:.1f}s, {root})")
+
+        results = []
+        for stage in stages:
+            r = run_stage(project, stage, seed_dir, log_dir)
+            r.update(interactions=interactions, rows_per_sec=round(interactions / r["seconds"], 1))
+            results.append(r)
+            print(f"  {stage:10} {r['seconds']:9.2f}s {r['rows_per_sec']:13,.0f} rows/s "
+                  f"{r['peak_rss_mb']:9.1f} MB RSS {r['output_bytes'] / 2**20:10.1f} MB out"
+                  + ("" if r["ok"] else "  FAILED"))
+            if not r["ok"]:
+                print("    " + "\n    ".join(Path(r["log"]).read_text().splitlines()[-5:]))
+                break
+        if not keep:
+            for r in results:
+                del r["log"]
+        return results
+    finally:
+        if not keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+def compare(results: list, baseline: list, tolerance: float, min_seconds: float) -> list:
+    base = {(r["stage"], r["interactions"]): r for r in baseline if r.get("ok")}
+    regressions = []
+    for r in results:
+        b = base.get((r["stage"], r["interactions"]))
+        if b is None or not r["ok"]:
+            continue
+        slower = r["seconds"] > b["seconds"] * (1 + tolerance) and r["seconds"] - b["seconds"] >= min_seconds
+        bigger = r["peak_rss_mb"] > b["peak_rss_mb"] * (1 + tolerance)
+        if slower or bigger:
+            regressions.append({"stage": r["stage"], "interactions": r["interactions"],
+                                "seconds": [b["seconds"], r["seconds"]],
+                                "peak_rss_mb": [b["peak_rss_mb"], r["peak_rss_mb"]]})
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000, 10_000_000])
+    ap.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--output", type=Path, default=RESULTS)
+    ap.add_argument("--baseline", type=Path, default=BASELINE)
+    ap.add_argument("--save-baseline", action="store_true", help="also store these results as the baseline")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="allowed relative growth (default: %(default)s)")
+    ap.add_argument("--min-seconds", type=float, default=0.5, help="ignore slowdowns smaller than this")
+    ap.add_argument("--keep", action="store_true", help="keep the scratch trees (logs, outputs)")
+    args = ap.parse_args()
+    stages = [s for s in STAGES if s in args.stages]
+
+    results = []
+    for size in sorted(args.sizes):
+        results += bench_size(size, stages, args.seed, args.keep)
+
+    report = {
+        "meta": {"date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                 "python": platform.python_version(), "platform": platform.platform(),
+                 "cpus": os.cpu_count(), "seed": args.seed},
+        "results": results,
+    }
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())
+        report["baseline"] = {"path": str(args.baseline), "date": baseline["meta"]["date"]}
+        report["regressions"] = compare(results, baseline["results"], args.tolerance, args.min_seconds)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2))
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(report, indent=2))
+    print(f"\nResults: {args.output}")
+
+    for reg in report.get("regressions", []):
+        print(f"REGRESSION {reg['stage']} @ {reg['interactions']:,}: "
+              f"{reg['seconds'][0]:.2f}s -> {reg['seconds'][1]:.2f}s, "
+              f"{reg['peak_rss_mb'][0]:.0f} -> {reg['peak_rss_mb'][1]:.0f} MB")
+    failed = any(not r["ok"] for r in results)
+    return 1 if failed or report.get("regressions") else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
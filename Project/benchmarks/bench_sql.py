@@ -0,0 +1,73 @@
+# Project/benchmarks/bench_sql.py
+"""
+Benchmark the SQLite analytics backend (sql_store.py + sql_analytics.py)
+against the pandas path (AnalyticsState over table_store) on synthetic
+tables: database load, full report, and an indexed ad-hoc lookup (one
+user's interactions). Checks both give the same report.
+
+Usage: python bench_sql.py [--rows 2000000]
+"""
+
+import argparse
+import contextlib
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "etl"))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "analytics"))
+import aggregates  # noqa: E402
+import sql_analytics  # noqa: E402
+import sql_store  # noqa: E402
+import table_store as tables  # noqa: E402
+from analytics_state import AnalyticsState  # noqa: E402
+from bench_analytics import make_tables  # noqa: E402
+from bench_analytics_workers import write_interactions  # noqa: E402
+
+USER = "U000042"
+
+def timed(label, fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    print(f"{label:28} {time.perf_counter() - start:8.2f}s")
+    return result
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--rows", type=int, default=2_000_000)
+    args = ap.parse_args()
+
+    recipes, ingredients, steps, interactions = make_tables(args.rows)
+    print(f"{args.rows:,} interactions, {len(recipes):,} recipes, {len(ingredients):,} ingredient rows")
+    with tempfile.TemporaryDirectory() as tmp:
+        out_dir = Path(tmp)
+        formats = ("parquet",) if tables.has_parquet() else ("csv",)
+        for df, name in ((recipes, "recipe"), (ingredients, "ingredients"), (steps, "steps")):
+            tables.write_table(df, name, formats, out_dir=out_dir)
+        write_interactions(interactions, out_dir)
+        del interactions
+        db = out_dir / "pipeline.db"
+
+        timed("sqlite load", sql_store.load_database, db, out_dir)
+        # closing(): a Connection's own context manager only commits, it never closes
+        with contextlib.closing(sql_store.connect(db)) as conn:
+            sql_report = timed("sqlite report", sql_analytics.compute_insights, conn)
+            rows = timed("sqlite user lookup", conn.execute,
+                         "SELECT * FROM interactions WHERE user_id = ?", (USER,)).fetchall()
+
+        recipes = tables.load_table("recipe", out_dir=out_dir)
+        ingredients = tables.load_table("ingredients", out_dir=out_dir)
+        steps = tables.load_table("steps", out_dir=out_dir)
+        state = AnalyticsState(state_dir=out_dir / "state")
+        timed("pandas fold", state.refresh, recipes, full=True, out_dir=out_dir)
+        pandas_report = timed("pandas report", state.insights, recipes, ingredients, steps)
+        frame = timed("pandas user lookup", tables.load_table, "interactions", out_dir=out_dir)
+        lookup = frame[frame["user_id"] == USER]
+
+    same = aggregates.same_report(sql_report, pandas_report) and len(rows) == len(lookup)
+    print(f"same report: {same}")
+    return 0 if same else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+# Project/benchmarks/bench_startup.py
+"""
+Startup-time benchmark of the ETL and analytics entry points: what importing
+each script costs and how long `script --help` takes.
+
+Usage: python bench_startup.py [--scripts etl/transform_etl.py ...] [--repeat 5]
+                               [--baseline PATH] [--save-baseline] [--tolerance 0.2]
+
+Every measurement runs in a fresh interpreter (python -X importtime -c
+"import <module>", then <script> --help), repeated --repeat times and
+reduced to the median. Importing a script must not load the heavy
+libraries (pandas, numpy, pyarrow, matplotlib, firebase_admin, dateutil;
+see etl/lazy.py): any that show up in the import trace are reported and
+count as a failure, with the ones costing the most self time listed.
+
+Results go to results/startup.json. With a baseline (default
+results/startup_baseline.json, written by --save-baseline) a script is
+flagged as a regression when its import or --help time grows by more than
+--tolerance (and by at least --min-ms); the exit status is 1 when anything
+regressed or imported a heavy library.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+PROJECT = Path(__file__).resolve().parents[1]
+REPO = PROJECT.parent
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+RESULTS = RESULTS_DIR / "startup.json"
+BASELINE = RESULTS_DIR / "startup_baseline.json"
+
+# entry points, relative to the repository root
+SCRIPTS = [
+    "Project/etl/export_firestore.py",
+    "Project/etl/transform_etl.py",
+    "Project/etl/validator.py",
+    "Project/etl/sql_store.py",
+    "Project/etl/generate_data.py",
+    "Project/etl/stage_cache.py",
+    "Project/analytics/analytics.py",
+    "Project/analytics/visualize.py",
+    "Project/analytics/sql_analytics.py",
+    "Project/pipeline.py",
+    "insert_data.py",
+]
+HEAVY = ("pandas", "numpy", "pyarrow", "matplotlib", "firebase_admin", "dateutil")
+# the scripts import their siblings from these directories
+PATHS = [PROJECT / "etl", PROJECT / "analytics"]
+
+def import_trace(script: Path) -> tuple:
+    """Import the script's module in a fresh interpreter; returns (seconds, {module: self µs})."""
+    code = f"import sys; sys.path[:0] = {[str(script.parent)] + [str(p) for p in PATHS]!r}; import {script.stem}"
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=script.parent,
+                          capture_output=True, text=True, check=True)
+    seconds = time.perf_counter() - start
+    # stderr lines: "import time: <self us> | <cumulative us> | <indented module>"
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(self_us)
+    return seconds, modules
+
+def help_time(script: Path) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, str(script), "--help"], cwd=script.parent,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+def bench_script(rel: str, repeat: int) -> dict:
+    script = REPO / rel
+    imports, helps = [], []
+    modules = {}
+    for _ in range(repeat):
+        seconds, modules = import_trace(script)
+        imports.append(seconds)
+        helps.append(help_time(script))
+    heavy = sorted({name.split(".")[0] for name in modules if name.split(".")[0] in HEAVY})
+    slowest = sorted(modules.items(), key=lambda kv: -kv[1])[:5]
+    return {"script": rel, "import_ms": round(statistics.median(imports) * 1000, 1),
+            "help_ms": round(statistics.median(helps) * 1000, 1), "modules": len(modules),
+            "heavy": heavy, "slowest": [[name, us] for name, us in slowest]}
+
+def compare(results: list, baseline: list, tolerance: float, min_ms: float) -> list:
+    base = {r["script"]: r for r in baseline}
+    regressions = []
+    for r in results:
+        b = base.get(r["script"])
+        if b is None:
+            continue
+        for metric in ("import_ms", "help_ms"):
+            if r[metric] > b[metric] * (1 + tolerance) and r[metric] - b[metric] >= min_ms:
+                regressions.append({"script": r["script"], "metric": metric, "ms": [b[metric], r[metric]]})
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--scripts", nargs="+", choices=SCRIPTS, default=SCRIPTS)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--output", type=Path, default=RESULTS)
+    ap.add_argument("--baseline", type=Path, default=BASELINE)
+    ap.add_argument("--save-baseline", action="store_true", help="also store these results as the baseline")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="allowed relative growth (default: %(default)s)")
+    ap.add_argument("--min-ms", type=float, default=20, help="ignore slowdowns smaller than this")
+    args = ap.parse_args()
+
+    results = []
+    print(f"{'script':38} {'import':>9} {'--help':>9} {'modules':>8}  heavy")
+    for rel in args.scripts:
+        r = bench_script(rel, args.repeat)
+        results.append(r)
+        print(f"{rel:38} {r['import_ms']:7.1f}ms {r['help_ms']:7.1f}ms {r['modules']:8}  "
+              + (", ".join(r["heavy"]) or "-"))
+        if r["heavy"]:
+            print("    slowest: " + ", ".join(f"{name} {us / 1000:.0f}ms" for name, us in r["slowest"]))
+
+    report = {
+        "meta": {"date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                 "python": platform.python_version(), "platform": platform.platform(),
+                 "cpus": os.cpu_count(), "repeat": args.repeat},
+        "results": results,
+    }
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())
+        report["baseline"] = {"path": str(args.baseline), "date": baseline["meta"]["date"]}
+        report["regressions"] = compare(results, baseline["results"], args.tolerance, args.min_ms)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2))
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(report, indent=2))
+    print(f"\nResults: {args.output}")
+
+    for reg in report.get("regressions", []):
+        print(f"REGRESSION {reg['script']} {reg['metric']}: {reg['ms'][0]:.0f}ms -> {reg['ms'][1]:.0f}ms")
+    heavy = [r["script"] for r in results if r["heavy"]]
+    for script in heavy:
+        print(f"HEAVY IMPORT {script}")
+    return 1 if heavy or report.get("regressions") else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+# Project/benchmarks/bench_tables.py
+"""
+Disk size and load time of the interactions table: CSV vs Parquet, full
+load and the analytics projection (user_id, recipe_id, type, rating).
+
+Usage: python bench_tables.py [--rows 1000000]
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "etl"))
+import table_store  # noqa: E402
+import transform_etl  # noqa: E402
+from bench_transform import make_interactions  # noqa: E402
+
+PROJECTION = ["user_id", "recipe_id", "type", "rating"]
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    args = ap.parse_args()
+    if not table_store.has_parquet():
+        print("pyarrow is not installed; nothing to compare")
+        return 1
+
+    df = transform_etl.transform_interactions(make_interactions(args.rows))
+    print(f"{args.rows:,} interactions")
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for fmt in ("csv", "parquet"):
+            out_dir = Path(tmp) / fmt
+            out_dir.mkdir()
+            write_s = timed(lambda: table_store.write_table(df, "interactions", (fmt,), out_dir=out_dir))
+            size = table_store.table_path("interactions", fmt, out_dir).stat().st_size
+            full_s = timed(lambda: table_store.load_table("interactions", out_dir=out_dir))
+            proj_s = timed(lambda: table_store.load_table("interactions", PROJECTION, out_dir=out_dir))
+            results[fmt] = (size, full_s, proj_s)
+            print(f"{fmt:8} {size / 2**20:9.1f} MiB  write {write_s:6.2f}s  "
+                  f"load {full_s:6.2f}s  load projected {proj_s:6.2f}s")
+        (cs, cf, cp), (ps, pf, pp) = results["csv"], results["parquet"]
+        print(f"parquet vs csv: {cs / ps:.1f}x smaller, {cf / pf:.1f}x faster full load, "
+              f"{cp / pp:.1f}x faster projected load")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+# Project/benchmarks/bench_transform.py
+"""
+Benchmark the interactions transform: row-wise reference (transform_interaction
+per record) vs the columnar path (transform_interactions).
+
+Usage: python bench_transform.py [--rows 1000000]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "etl"))
+import transform_etl  # noqa: E402
+
+def make_interactions(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    types = ["view", "like", "cook"]
+    out = []
+    for i in range(n):
+        t = rng.choices(types, weights=[0.6, 0.25, 0.15])[0]
+        d = {
+            "interaction_id": f"I{i:08d}",
+            "user_id": f"U{rng.randrange(50_000):05d}",
+            "recipe_id": f"R{rng.randrange(5_000):04d}",
+            "type": t,
+            "timestamp": f"2025-11-{rng.randint(1, 28):02d}T{rng.randrange(24):02d}:"
+                         f"{rng.randrange(60):02d}:{rng.randrange(60):02d}.{rng.randrange(10**6):06d}Z",
+            "_doc_id": f"I{i:08d}",
+        }
+        if t == "cook":
+            d["rating"] = rng.randint(1, 5)
+        out.append(d)
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    args = ap.parse_args()
+
+    records = make_interactions(args.rows)
+    print(f"{args.rows:,} interactions")
+
+    start = time.perf_counter()
+    rowwise = pd.DataFrame([transform_etl.transform_interaction(r) for r in records]).fillna("").astype(object)
+    t_row = time.perf_counter() - start
+    print(f"row-wise   {t_row:8.2f}s  {args.rows / t_row:12,.0f} rows/s")
+
+    start = time.perf_counter()
+    columnar = transform_etl.transform_interactions(records)
+    t_col = time.perf_counter() - start
+    print(f"columnar   {t_col:8.2f}s  {args.rows / t_col:12,.0f} rows/s")
+
+    same = rowwise.to_csv(index=False) == columnar.to_csv(index=False)
+    print(f"speedup    {t_row / t_col:8.1f}x  (identical CSV: {same})")
+    return 0 if same else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
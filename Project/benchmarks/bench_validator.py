@@ -0,0 +1,106 @@
+# Project/benchmarks/bench_validator.py
+"""
+Benchmark interaction validation: the per-row iterrows loop the validator
+used to run vs the column-mask rule engine (validator.find_errors).
+
+The row loop is timed on a --reference-rows sample (and checked to give the
+same report as the rule engine there); the rule engine runs on all --rows.
+
+Usage: python bench_validator.py [--rows 10000000] [--reference-rows 200000]
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "etl"))
+import validator  # noqa: E402
+
+def make_interactions(n: int, seed: int = 7):
+    # text frame as validator.read_table_no_nan returns it, ~1% bad rows
+    rng = np.random.default_rng(seed)
+    types = np.array(["view", "like", "cook", "", "share"], dtype=object)
+    t = types[rng.choice(5, n, p=[0.59, 0.25, 0.15, 0.005, 0.005])]
+    ratings = np.array(["", "1", "2", "3", "4", "5", "0", "4.5", "bad"], dtype=object)
+    rating = np.where(t == "cook", ratings[rng.integers(1, 9, n)], "")
+    rating[rng.random(n) < 0.002] = "3"
+    users = np.array([f"U{i:05d}" for i in range(50_000)], dtype=object)
+    recipes = np.array([f"R{i:04d}" for i in range(5_000)] + [""], dtype=object)
+    return pd.DataFrame({
+        "interaction_id": np.array([f"I{i:08d}" for i in range(n)], dtype=object),
+        "user_id": users[rng.integers(0, len(users), n)],
+        "recipe_id": recipes[rng.integers(0, len(recipes), n)],
+        "type": t,
+        "rating": rating.astype(object),
+        "timestamp": "2025-11-01T10:00:00.000000+00:00",
+    })
+
+def reference(df):
+    # the pre-rule-engine validate_interactions loop
+    out = {"valid": [], "invalid": []}
+    for _, r in df.iterrows():
+        errors = []
+        if r.get("interaction_id", "") == "":
+            errors.append("Missing interaction_id")
+        if r.get("user_id", "") == "":
+            errors.append("Missing user_id")
+        if r.get("recipe_id", "") == "":
+            errors.append("Missing recipe_id")
+        t = r.get("type", "")
+        if t == "":
+            errors.append("Missing type")
+        if t and t not in ["view", "like", "cook"]:
+            errors.append("Invalid type")
+        rating = r.get("rating", "")
+        if t == "cook":
+            try:
+                val = float(rating)
+                if not (1 <= val <= 5):
+                    errors.append("rating must be 1-5")
+            except:
+                errors.append("cook rating not numeric")
+        else:
+            if rating not in ["", None]:
+                errors.append("non-cook interaction should not have rating")
+        if errors:
+            out["invalid"].append({**r.to_dict(), "errors": errors})
+        else:
+            out["valid"].append(r.to_dict())
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--rows", type=int, default=10_000_000)
+    ap.add_argument("--reference-rows", type=int, default=200_000)
+    args = ap.parse_args()
+    rules = validator.RULES["interactions"][1]
+
+    sample = make_interactions(min(args.reference_rows, args.rows))
+    start = time.perf_counter()
+    expected = reference(sample)
+    t_ref = time.perf_counter() - start
+    start = time.perf_counter()
+    got = validator.validate(sample, rules)
+    t_sample = time.perf_counter() - start
+    same = json.dumps(expected) == json.dumps(got)
+    print(f"{len(sample):,} rows   iterrows {t_ref:8.2f}s  {len(sample) / t_ref:12,.0f} rows/s")
+    print(f"{len(sample):,} rows   rules    {t_sample:8.2f}s  {len(sample) / t_sample:12,.0f} rows/s"
+          f"  (incl. report records)  same report: {same}")
+    del sample, expected, got
+
+    df = make_interactions(args.rows)
+    start = time.perf_counter()
+    failed, errors = validator.find_errors(df, rules)
+    t_rules = time.perf_counter() - start
+    print(f"{args.rows:,} rows   rules    {t_rules:8.2f}s  {args.rows / t_rules:12,.0f} rows/s"
+          f"  ({int(failed.sum()):,} invalid)")
+    print(f"iterrows at {args.rows:,} rows, extrapolated: {t_ref * args.rows / args.reference_rows:,.0f}s")
+    return 0 if same else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
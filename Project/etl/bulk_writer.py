@@ -0,0 +1,171 @@
+# Project/etl/bulk_writer.py
+"""
+Batched, concurrent, rate-limited Firestore writer for seeding large
+collections (insert_data.py), instead of one blocking set() per document.
+
+Usage:
+    with BulkWriter(db, max_in_flight=8, ops_per_second=500) as writer:
+        for doc in docs:
+            writer.set(db.collection("UserInteractions").document(doc["interaction_id"]), doc)
+    logging.info("%s", writer.stats())
+
+Writes are grouped into write batches of up to 500 (the Firestore limit per
+commit) and committed on a pool of max_in_flight threads; set() blocks
+while that many batches are already in flight, so memory stays bounded.
+A token bucket caps writes per second, ramping up by 50% every 5 minutes
+from ops_per_second (Firestore's 500/50/5 guideline for new collections)
+unless ramp=False. Commits failing with a contention / availability error
+(RETRYABLE) are retried with exponential backoff and jitter; set() is
+idempotent, so a retried batch is safe. Works with the real client, the
+Firestore emulator (FIRESTORE_EMULATOR_HOST) and fake_firestore.FakeClient.
+"""
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_BATCH = 500
+
+# google.api_core.exceptions (and fake_firestore) class names worth retrying;
+# matched by name so this module does not need google-api-core to import
+RETRYABLE = {"Aborted", "DeadlineExceeded", "InternalServerError", "ResourceExhausted",
+             "ServiceUnavailable", "TooManyRequests"}
+
+def is_retryable(exc: Exception) -> bool:
+    return type(exc).__name__ in RETRYABLE
+
+class RateLimiter:
+    """Token bucket of ops per second; ops_per_second=None means unlimited."""
+
+    RAMP_SECONDS = 300
+    RAMP_FACTOR = 1.5
+
+    def __init__(self, ops_per_second: float = None, ramp: bool = True):
+        self.base = ops_per_second
+        self.ramp = ramp
+        self.start = time.monotonic()
+        self.tokens = float(ops_per_second or 0)
+        self.last = self.start
+        self.lock = threading.Lock()
+
+    def rate(self, now: float) -> float:
+        if not self.ramp:
+            return self.base
+        return self.base * self.RAMP_FACTOR ** int((now - self.start) // self.RAMP_SECONDS)
+
+    def acquire(self, n: int):
+        if not self.base:
+            return
+        with self.lock:
+            now = time.monotonic()
+            rate = self.rate(now)
+            self.tokens = min(max(rate, n), self.tokens + (now - self.last) * rate)
+            self.last = now
+            self.tokens -= n
+            wait = -self.tokens / rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+class BulkWriter:
+    def __init__(self, db, batch_size: int = MAX_BATCH, max_in_flight: int = 8,
+                 ops_per_second: float = None, ramp: bool = True,
+                 max_retries: int = 8, backoff: float = 0.1, max_backoff: float = 10.0):
+        if not 1 <= batch_size <= MAX_BATCH:
+            raise ValueError(f"batch_size must be between 1 and {MAX_BATCH}")
+        self.db = db
+        self.batch_size = batch_size
+        self.limiter = RateLimiter(ops_per_second, ramp)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool = ThreadPoolExecutor(max_workers=max(1, max_in_flight))
+        self.slots = threading.BoundedSemaphore(max(1, max_in_flight))
+        self.lock = threading.Lock()
+        self.pending = []
+        self.futures = []
+        self.counts = {"writes": 0, "batches": 0, "retries": 0}
+        self.started = time.perf_counter()
+        self.elapsed = None
+
+    def set(self, reference, document_data, merge: bool = False):
+        self.pending.append(("set", reference, document_data, merge))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def delete(self, reference):
+        self.pending.append(("delete", reference, None, False))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Submit the pending writes as one batch (blocks while max_in_flight batches are running)."""
+        if not self.pending:
+            return
+        writes, self.pending = self.pending, []
+        self.slots.acquire()
+        # stop feeding batches once one has failed for good; one snapshot of the finished
+        # batches is both checked and pruned, so none can finish unchecked in between
+        done = [f for f in self.futures if f.done()]
+        failed = next((f for f in done if f.exception()), None)
+        if failed is not None:
+            self.slots.release()
+            raise failed.exception()
+        done = set(done)
+        self.futures = [f for f in self.futures if f not in done]
+        fut = self.pool.submit(self._commit, writes)
+        fut.add_done_callback(lambda _: self.slots.release())
+        self.futures.append(fut)
+
+    def _commit(self, writes):
+        self.limiter.acquire(len(writes))
+        for attempt in range(self.max_retries + 1):
+            batch = self.db.batch()
+            for op, ref, data, merge in writes:
+                if op == "set":
+                    batch.set(ref, data, merge=merge)
+                else:
+                    batch.delete(ref)
+            try:
+                batch.commit()
+                break
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    raise
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.5)
+                logging.debug("Batch of %d writes failed (%s); retry %d in %.2fs",
+                              len(writes), type(e).__name__, attempt + 1, delay)
+                with self.lock:
+                    self.counts["retries"] += 1
+                time.sleep(delay)
+        with self.lock:
+            self.counts["writes"] += len(writes)
+            self.counts["batches"] += 1
+
+    def close(self):
+        """Commit what is left and wait for every batch; raises the first failed batch's error."""
+        self.flush()
+        self.pool.shutdown(wait=True)
+        self.elapsed = time.perf_counter() - self.started
+        for fut in self.futures:
+            if fut.exception():
+                raise fut.exception()
+        return self.stats()
+
+    def stats(self) -> dict:
+        seconds = self.elapsed if self.elapsed is not None else time.perf_counter() - self.started
+        with self.lock:
+            counts = dict(self.counts)
+        return {**counts, "seconds": round(seconds, 3),
+                "writes_per_sec": round(counts["writes"] / seconds, 1) if seconds else 0.0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.pool.shutdown(wait=True)
+        return False
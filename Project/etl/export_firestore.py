@@ -1,16 +1,43 @@
 # Project/etl/export_firestore.py
 """
 Export Firestore collections to Project/data/*.json
-Usage: python export_firestore.py
+Usage: python export_firestore.py [--full] [--format json|ndjson] [--gzip]
+                                   [--workers N] [--partitions N] [--fake DIR] [--profile]
+
+By default only documents newer than the per-collection watermark stored in
+Project/data/export_state.json are fetched and merged into the existing
+snapshot. --full rescans every collection and rewrites the snapshots.
+
+--format ndjson writes one document per line (*.ndjson, or *.ndjson.gz with
+--gzip) without holding the collection in memory; incremental runs append to
+the file instead of rewriting it, then compact it when an appended document
+was already in the file (compact_appended), so it keeps one line per
+document and transform reads it in a single pass.
+
+Collections are exported concurrently on a pool of --workers threads. With
+--partitions N a full export splits each collection into N document-ID
+ranges (Firestore partition queries) that are read in parallel into
+per-partition files and merged at the end. --fake DIR runs against an
+in-process fake client seeded from the export files in DIR.
+
+Each collection (and partition) is measured (metrics.py): time, documents,
+bytes and peak memory go to Project/metrics/export.json and export.prom;
+--profile also writes a cProfile / tracemalloc profile of the run.
 """
 
+import argparse
+import gzip
 import json
+import os
+import re
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import logging
 import sys
-import firebase_admin
-from firebase_admin import credentials, firestore
-from pathlib import Path
+
+import metrics
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
@@ -20,46 +47,463 @@ PROJECT_DIR = Path(__file__).resolve().parents[1]
 
 # data folder inside Project/
 DATA_DIR = PROJECT_DIR / "data"
-DATA_DIR.mkdir(parents=True, exist_ok=True)
+
+# per-collection watermarks for incremental exports
+STATE_FILE = DATA_DIR / "export_state.json"
 
 # serviceAccountKey.json is stored in repo root (one level above Project)
 SERVICE_KEY = PROJECT_DIR.parent / "serviceAccountKey.json"
 
-# Validate Key Exists
-if not SERVICE_KEY.exists():
-    logging.error(f"Service account key not found at: {SERVICE_KEY}")
-    logging.error("Move your serviceAccountKey.json into the firebase_recipe_pipeline/ folder.")
-    sys.exit(1)
+# Field used as the incremental watermark for each collection. Values are the
+# ISO-8601 UTC strings written by insert_data.py, which sort lexicographically
+# in the same order as the instants they represent.
+WATERMARK_FIELDS = {
+    "Recipes": "created_at",
+    "Users": "joined_at",
+    "UserInteractions": "timestamp",
+}
 
-logging.info(f"Using service account: {SERVICE_KEY}")
+PAGE_SIZE = 1000
+# persist snapshot + watermark every N pages so an interrupted run resumes
+CHECKPOINT_PAGES = 10
 
-# Initialize Firebase
-try:
-    cred = credentials.Certificate(str(SERVICE_KEY))
-    firebase_admin.initialize_app(cred)
-    db = firestore.client()
-except Exception as e:
-    logging.error("Failed to initialize Firebase Admin: %s", e)
-    sys.exit(1)
+COLLECTIONS = [
+    ("Recipes", "recipes.json"),
+    ("Users", "users.json"),
+    ("UserInteractions", "user_interactions.json"),
+]
 
-def export_collection(collection_name: str, file_name: str = None):
-    file_name = file_name or f"{collection_name}.json"
-    out_path = DATA_DIR / file_name
-    docs = db.collection(collection_name).stream()
-    data = []
-    count = 0
-    for doc in docs:
+# per-partition files are written here and merged into the final export
+PARTS_DIR = DATA_DIR / ".parts"
+
+STATE_LOCK = threading.Lock()
+
+# "_doc_id" as iter_docs writes it (json.dumps separators); ids with escapes go through json.loads
+DOC_ID_RE = re.compile(rb'"_doc_id": ("[^"\\]*")')
+READ_BLOCK = 1 << 22
+
+db = None
+
+def init_firebase():
+    global db
+    # imported here: firebase_admin takes ~0.4s to load and --fake never needs it
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    # Validate Key Exists
+    if not SERVICE_KEY.exists():
+        logging.error(f"Service account key not found at: {SERVICE_KEY}")
+        logging.error("Move your serviceAccountKey.json into the firebase_recipe_pipeline/ folder.")
+        sys.exit(1)
+
+    logging.info(f"Using service account: {SERVICE_KEY}")
+
+    # Initialize Firebase
+    try:
+        cred = credentials.Certificate(str(SERVICE_KEY))
+        firebase_admin.initialize_app(cred)
+        db = firestore.client()
+    except Exception as e:
+        logging.error("Failed to initialize Firebase Admin: %s", e)
+        sys.exit(1)
+    return db
+
+def write_json_atomic(path: Path, data):
+    # write to a temp file first so a crash never leaves a truncated file behind
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def export_path(file_name: str, fmt: str = "json", compress: bool = False) -> Path:
+    # recipes.json -> recipes.ndjson / recipes.ndjson.gz
+    path = DATA_DIR / file_name
+    if fmt == "ndjson":
+        path = path.with_suffix(".ndjson")
+        if compress:
+            path = path.with_name(path.name + ".gz")
+    return path
+
+def open_text(path: Path, mode: str):
+    if path.name.endswith((".gz", ".gz.tmp")):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def read_lines(path: Path, start: int = 0):
+    # raw lines from byte offset start (for .gz a member boundary: every checkpoint ends a member)
+    with open(path, "rb") as raw:
+        raw.seek(start)
+        f = gzip.GzipFile(fileobj=raw) if path.suffix == ".gz" else raw
+        yield from f
+
+def line_doc_id(line: bytes):
+    # the document's _doc_id as JSON bytes without parsing the line; iter_docs puts it last
+    at = line.rfind(b'"_doc_id": "')
+    m = DOC_ID_RE.match(line, at) if at >= 0 else None
+    if m:
+        return m.group(1)
+    if b"_doc_id" not in line:
+        return None
+    try:
+        d = json.loads(line)
+    except Exception:
+        return None
+    return json.dumps(d["_doc_id"], ensure_ascii=False).encode() if isinstance(d, dict) and "_doc_id" in d else None
+
+def _count_ids(out_path: Path, doc_ids) -> int:
+    # lines naming one of doc_ids, by a block-wise scan instead of line by line
+    opener = gzip.open if out_path.suffix == ".gz" else open
+    hits, tail = 0, b""
+    with opener(out_path, "rb") as f:
+        while block := f.read(READ_BLOCK):
+            block = tail + block
+            cut = block.rfind(b"\n") + 1
+            hits += sum(m.group(1) in doc_ids for m in DOC_ID_RE.finditer(block, 0, cut))
+            tail = block[cut:]
+    return hits + sum(m.group(1) in doc_ids for m in DOC_ID_RE.finditer(tail))
+
+def compact_appended(out_path: Path, clean: int, compacted: Path) -> int:
+    """Write out_path without the older copies of documents appended past byte offset clean.
+
+    Lines before clean hold one copy per document. As in the JSON snapshot
+    merge, the last copy of a document takes the place of its first one.
+    Memory is the appended lines only. Returns the copies dropped; with none
+    (the usual case, checked in one read-only pass) compacted is not written.
+    """
+    latest = {}
+    for line in read_lines(out_path, clean):
+        doc_id = line_doc_id(line)
+        if doc_id is not None:
+            latest[doc_id] = line
+    if not latest:
+        return 0
+    if any(b"\\" in doc_id for doc_id in latest):
+        # escaped ids are only recognized by parsing the line
+        seen = sum(line_doc_id(line) in latest for line in read_lines(out_path))
+    else:
+        seen = _count_ids(out_path, latest)
+    dropped = seen - len(latest)
+    if not dropped:
+        return 0
+    placed = set()
+    with (gzip.open(compacted, "wb") if out_path.suffix == ".gz" else open(compacted, "wb")) as out:
+        for line in read_lines(out_path):
+            doc_id = line_doc_id(line)
+            if doc_id in latest:
+                if doc_id in placed:
+                    continue
+                placed.add(doc_id)
+                line = latest[doc_id]
+            out.write(line)
+    return dropped
+
+def load_state():
+    if not STATE_FILE.exists():
+        return {}
+    try:
+        with open(STATE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logging.warning("Ignoring unreadable export state %s: %s", STATE_FILE, e)
+        return {}
+
+def set_mark(state: dict, collection_name: str, mark: dict):
+    # collections export concurrently, so state updates are serialized
+    with STATE_LOCK:
+        state[collection_name] = mark
+        write_json_atomic(STATE_FILE, state)
+
+def load_snapshot(path: Path):
+    # existing export keyed by document id, in file order
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {d.get("_doc_id"): d for d in data if isinstance(d, dict)}
+
+def iter_docs(stream, field, cursor):
+    # yields export records and tracks the max (field, doc id) seen in cursor
+    for doc in stream:
         d = doc.to_dict() or {}
         d["_doc_id"] = doc.id
-        data.append(d)
-        count += 1
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-    logging.info("Exported %s → %s (%d documents)", collection_name, out_path, count)
+        value = d.get(field) if field else None
+        if value is not None and (not cursor or (value, doc.id) > tuple(cursor)):
+            cursor[:] = [value, doc.id]
+        yield d
 
-if __name__ == "__main__":
-    # export exact collection names used in your project
-    export_collection("Recipes", "recipes.json")
-    export_collection("Users", "users.json")
-    export_collection("UserInteractions", "user_interactions.json")
+def export_collection_full(collection_name: str, out_path: Path, state: dict):
+    docs = db.collection(collection_name).stream()
+    field = WATERMARK_FIELDS.get(collection_name)
+    cursor = []
+    count = 0
+    if out_path.name.endswith((".ndjson", ".ndjson.gz")):
+        tmp_path = out_path.with_name(out_path.name + ".tmp")
+        with open_text(tmp_path, "w") as f:
+            for d in iter_docs(docs, field, cursor):
+                f.write(json.dumps(d, ensure_ascii=False, default=str) + "\n")
+                count += 1
+        os.replace(tmp_path, out_path)
+    else:
+        data = list(iter_docs(docs, field, cursor))
+        count = len(data)
+        write_json_atomic(out_path, data)
+    if field:
+        size = out_path.stat().st_size
+        set_mark(state, collection_name, {"field": field, "value": cursor[0] if cursor else None,
+                                          "doc_id": cursor[1] if cursor else None,
+                                          "file": out_path.name, "offset": size, "clean": size})
+    return count
+
+def export_partition(collection_name: str, index: int, query, part_path: Path):
+    # one key range of a collection → plain NDJSON part file
+    field = WATERMARK_FIELDS.get(collection_name)
+    cursor = []
+    count = 0
+    with metrics.stage(f"export.{collection_name}.part{index}") as m:
+        with open_text(part_path, "w") as f:
+            for d in iter_docs(query.stream(), field, cursor):
+                f.write(json.dumps(d, ensure_ascii=False, default=str) + "\n")
+                count += 1
+        m["rows_in"] = m["rows_out"] = count
+    seconds = m["seconds"]
+    rate = count / seconds if seconds > 0 else 0.0
+    logging.info("%s partition %d: %d docs in %.2fs (%.0f docs/sec)",
+                 collection_name, index, count, seconds, rate)
+    return {"collection": collection_name, "partition": index, "docs": count,
+            "seconds": round(seconds, 4), "docs_per_sec": round(rate, 1),
+            "cursor": cursor, "path": part_path}
+
+def merge_partitions(collection_name: str, out_path: Path, results: list, state: dict):
+    # concatenate part files in key order into the final export file
+    results = sorted(results, key=lambda r: r["partition"])
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    count = 0
+    if out_path.name.endswith((".ndjson", ".ndjson.gz")):
+        with open_text(tmp_path, "w") as out:
+            for r in results:
+                with open(r["path"], "r", encoding="utf-8") as f:
+                    shutil.copyfileobj(f, out)
+                count += r["docs"]
+    else:
+        # stream the JSON array; same layout as json.dump(..., indent=2)
+        with open(tmp_path, "w", encoding="utf-8") as out:
+            out.write("[")
+            for r in results:
+                with open(r["path"], "r", encoding="utf-8") as f:
+                    for line in f:
+                        item = json.dumps(json.loads(line), indent=2, ensure_ascii=False)
+                        out.write((",\n  " if count else "\n  ") + item.replace("\n", "\n  "))
+                        count += 1
+            out.write("\n]" if count else "]")
+    os.replace(tmp_path, out_path)
+    for r in results:
+        r["path"].unlink()
+
+    field = WATERMARK_FIELDS.get(collection_name)
+    if field:
+        cursors = [tuple(r["cursor"]) for r in results if r["cursor"]]
+        cursor = max(cursors) if cursors else None
+        size = out_path.stat().st_size
+        set_mark(state, collection_name, {"field": field, "value": cursor[0] if cursor else None,
+                                          "doc_id": cursor[1] if cursor else None,
+                                          "file": out_path.name, "offset": size, "clean": size})
+    return count
+
+def fetch_pages(collection_name: str, field: str, mark: dict):
+    # (field, __name__) ordering gives a total order, so the cursor never skips
+    # or repeats documents that share the same watermark value
+    base = db.collection(collection_name).order_by(field).order_by("__name__")
+    while True:
+        query = base
+        if mark.get("value") is not None:
+            query = query.start_after({field: mark["value"], "__name__": mark["doc_id"]})
+        page = list(query.limit(PAGE_SIZE).stream())
+        if page:
+            last = page[-1]
+            mark = {"field": field, "value": (last.to_dict() or {}).get(field), "doc_id": last.id}
+        yield page, mark
+        if len(page) < PAGE_SIZE:
+            return
+
+def export_collection_incremental(collection_name: str, out_path: Path, state: dict):
+    field = WATERMARK_FIELDS[collection_name]
+    mark = state[collection_name]
+    snapshot = load_snapshot(out_path)
+    fetched = 0
+    for pages, (page, mark) in enumerate(fetch_pages(collection_name, field, mark), start=1):
+        for doc in page:
+            d = doc.to_dict() or {}
+            d["_doc_id"] = doc.id
+            snapshot[doc.id] = d
+        fetched += len(page)
+        if len(page) < PAGE_SIZE or pages % CHECKPOINT_PAGES == 0:
+            # snapshot first, watermark second: a crash in between only
+            # refetches a page, and the merge by _doc_id makes that idempotent
+            write_json_atomic(out_path, list(snapshot.values()))
+            set_mark(state, collection_name, {**mark, "file": out_path.name,
+                                              "offset": out_path.stat().st_size})
+    return fetched, len(snapshot)
+
+def export_collection_append(collection_name: str, out_path: Path, state: dict):
+    # NDJSON incremental mode: append new documents instead of rewriting.
+    # Anything past the last checkpointed offset was written by an interrupted
+    # run and is dropped before resuming from the stored watermark.
+    # Then updated documents (appended again) are compacted to one line each.
+    field = WATERMARK_FIELDS[collection_name]
+    mark = state[collection_name]
+    # lines before "clean" hold one copy per document (0 for files exported before it was kept)
+    clean = mark.get("clean", 0)
+    compacted = out_path.with_name(out_path.name + ".compact")
+    if mark.get("compacting"):
+        # an interrupted run wrote the compacted file; finish swapping it in
+        if compacted.exists():
+            os.replace(compacted, out_path)
+        clean = out_path.stat().st_size
+        mark = {k: v for k, v in mark.items() if k != "compacting"}
+    else:
+        with open(out_path, "r+b") as f:
+            f.truncate(mark["offset"])
+    fetched = 0
+    # opened on the first document, so a run with nothing new leaves the file (and its gzip members) alone
+    f = None
+    try:
+        for pages, (page, mark) in enumerate(fetch_pages(collection_name, field, mark), start=1):
+            if page and f is None:
+                f = open_text(out_path, "a")
+            for doc in page:
+                d = doc.to_dict() or {}
+                d["_doc_id"] = doc.id
+                f.write(json.dumps(d, ensure_ascii=False, default=str) + "\n")
+            fetched += len(page)
+            if len(page) < PAGE_SIZE or pages % CHECKPOINT_PAGES == 0:
+                # close (ends the gzip member) before recording the offset
+                if f is not None:
+                    f.close()
+                    f = None
+                set_mark(state, collection_name, {**mark, "file": out_path.name,
+                                                  "offset": out_path.stat().st_size, "clean": clean})
+    finally:
+        if f is not None:
+            f.close()
+    mark = state[collection_name]
+    dropped = compact_appended(out_path, clean, compacted)
+    if dropped:
+        # flagged first, so a crash before the new offset is recorded finishes the swap next run
+        set_mark(state, collection_name, {**mark, "compacting": True})
+        os.replace(compacted, out_path)
+    size = out_path.stat().st_size
+    set_mark(state, collection_name, {**mark, "offset": size, "clean": size})
+    return fetched, dropped
+
+def is_incremental(collection_name: str, out_path: Path, state: dict, full: bool):
+    mark = state.get(collection_name) or {}
+    return (not full and collection_name in WATERMARK_FIELDS and out_path.exists()
+            and mark.get("field") == WATERMARK_FIELDS[collection_name]
+            and mark.get("file") == out_path.name and "offset" in mark)
+
+def export_collection(collection_name: str, file_name: str = None, full: bool = False,
+                      state: dict = None, fmt: str = "json", compress: bool = False):
+    file_name = file_name or f"{collection_name}.json"
+    out_path = export_path(file_name, fmt, compress)
+    state = load_state() if state is None else state
+    with metrics.stage(f"export.{collection_name}") as m:
+        if not is_incremental(collection_name, out_path, state, full):
+            count = export_collection_full(collection_name, out_path, state)
+            m["rows_in"] = m["rows_out"] = count
+            logging.info("Exported %s → %s (%d documents)", collection_name, out_path, count)
+            return
+        if fmt == "ndjson":
+            fetched, dropped = export_collection_append(collection_name, out_path, state)
+            m["rows_in"] = m["rows_out"] = fetched
+            logging.info("Exported %s → %s (%d new documents appended, %d older copies compacted away)",
+                         collection_name, out_path, fetched, dropped)
+            return
+        fetched, total = export_collection_incremental(collection_name, out_path, state)
+        m["rows_in"], m["rows_out"] = fetched, total
+        logging.info("Exported %s → %s (%d new/updated, %d documents total)",
+                     collection_name, out_path, fetched, total)
+
+def export_all(collections=COLLECTIONS, full: bool = False, fmt: str = "json",
+               compress: bool = False, workers: int = 4, partitions: int = 1):
+    """Export several collections concurrently on one bounded thread pool.
+
+    Incremental exports run as a single task per collection. Full exports
+    with partitions > 1 fan out one task per document-ID range; the parts
+    are merged as soon as every range of that collection has finished.
+    Returns the per-partition stats (docs, seconds, docs_per_sec).
+    """
+    state = load_state()
+    PARTS_DIR.mkdir(parents=True, exist_ok=True)
+    pending = {}
+    stats = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {}
+        for collection_name, file_name in collections:
+            out_path = export_path(file_name, fmt, compress)
+            if partitions <= 1 or is_incremental(collection_name, out_path, state, full):
+                fut = pool.submit(export_collection, collection_name, file_name, full=full,
+                                  state=state, fmt=fmt, compress=compress)
+                futures[fut] = (collection_name, None)
+                continue
+            ranges = list(db.collection_group(collection_name).get_partitions(partitions))
+            pending[collection_name] = {"out_path": out_path, "left": len(ranges), "results": []}
+            for index, part in enumerate(ranges):
+                part_path = PARTS_DIR / f"{file_name.split('.')[0]}.part{index:04d}.ndjson"
+                fut = pool.submit(export_partition, collection_name, index, part.query(), part_path)
+                futures[fut] = (collection_name, index)
+
+        for fut in as_completed(futures):
+            collection_name, index = futures[fut]
+            result = fut.result()
+            if index is None:
+                continue
+            stats.append({k: v for k, v in result.items() if k not in ("cursor", "path")})
+            job = pending[collection_name]
+            job["results"].append(result)
+            job["left"] -= 1
+            if job["left"] == 0:
+                with metrics.stage(f"export.{collection_name}.merge") as m:
+                    count = merge_partitions(collection_name, job["out_path"], job["results"], state)
+                    m["rows_in"] = m["rows_out"] = count
+                logging.info("Exported %s → %s (%d documents, %d partitions)",
+                             collection_name, job["out_path"], count, len(job["results"]))
+    return stats
+
+def connect(fake: Path = None):
+    """Set the module client: the fake client seeded from the export files in `fake`, else Firebase."""
+    global db
+    if fake:
+        from fake_firestore import FakeClient
+        db = FakeClient.from_export_dir(fake)
+        return db
+    return init_firebase()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Export Firestore collections to Project/data/*.json")
+    ap.add_argument("--full", action="store_true",
+                    help="ignore stored watermarks and rescan every collection")
+    ap.add_argument("--format", choices=["json", "ndjson"], default="json",
+                    help="output format (ndjson = one document per line, streamed)")
+    ap.add_argument("--gzip", action="store_true", help="gzip-compress NDJSON output")
+    ap.add_argument("--workers", type=int, default=4, help="size of the export thread pool")
+    ap.add_argument("--partitions", type=int, default=1,
+                    help="document-ID ranges to read in parallel per collection (full exports)")
+    ap.add_argument("--fake", type=Path, metavar="DIR",
+                    help="export from an in-process fake client seeded from DIR (offline runs)")
+    ap.add_argument("--profile", action="store_true",
+                    help="also write a cProfile / tracemalloc profile (Project/metrics/export.prof)")
+    args = ap.parse_args(argv)
+    if args.gzip and args.format != "ndjson":
+        ap.error("--gzip requires --format ndjson")
+
+    with metrics.run("export", profile=args.profile), metrics.stage("export"):
+        connect(args.fake)
+        stats = export_all(full=args.full, fmt=args.format, compress=args.gzip,
+                           workers=args.workers, partitions=args.partitions)
+    for s in stats:
+        logging.info("  %-16s part %3d  %8d docs  %8.2fs  %10.0f docs/sec",
+                     s["collection"], s["partition"], s["docs"], s["seconds"], s["docs_per_sec"])
     logging.info("All exports complete.")
+
+if __name__ == "__main__":
+    main()
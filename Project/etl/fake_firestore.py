@@ -0,0 +1,358 @@
+# Project/etl/fake_firestore.py
+"""
+In-process stand-in for the parts of the Firestore client the pipeline uses,
+so exports and seeding can run offline (local runs, benchmarks).
+
+Supported: collection(), collection_group().get_partitions(), document()
+get/set/delete, where/order_by/limit/start_at/start_after/end_at/end_before
+cursors, stream()/get(), and batch() write batches.
+
+FakeClient(latency=s, abort_rate=p) makes every write RPC (document set or
+delete, batch commit) take s seconds and fail with Aborted (as Firestore
+does under contention) with probability p, to exercise bulk_writer.py's
+concurrency and retries offline.
+
+Usage:
+    db = FakeClient.from_export_dir(Path("Project/data"))
+    for doc in db.collection("Recipes").order_by("created_at").limit(10).stream():
+        print(doc.id, doc.to_dict())
+"""
+
+import copy
+import gzip
+import json
+import random
+import threading
+import time
+from pathlib import Path
+
+# same file names export_firestore.py writes
+EXPORT_FILES = {
+    "Recipes": "recipes",
+    "Users": "users",
+    "UserInteractions": "user_interactions",
+}
+
+_OPS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "in": lambda a, b: a in b,
+    "not-in": lambda a, b: a not in b,
+    "array_contains": lambda a, b: isinstance(a, list) and b in a,
+}
+
+_MISSING = object()
+
+class Aborted(Exception):
+    """Same name as google.api_core.exceptions.Aborted (transaction contention)."""
+
+def _iter_records(path: Path):
+    if path.name.endswith((".ndjson", ".ndjson.gz")):
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    yield from (data if isinstance(data, list) else [data])
+
+def _sort_key(value):
+    # Firestore orders values by type first, then by value within the type
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (4, value)
+    return (9, str(value))
+
+class FakeDocumentSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+class FakeDocumentReference:
+    def __init__(self, client, collection_name, doc_id):
+        self._client = client
+        self._collection = collection_name
+        self.id = doc_id
+
+    @property
+    def path(self):
+        return f"{self._collection}/{self.id}"
+
+    def get(self):
+        with self._client._lock:
+            data = self._client._store.get(self._collection, {}).get(self.id)
+        return FakeDocumentSnapshot(self, copy.deepcopy(data) if data is not None else None)
+
+    def set(self, data, merge=False):
+        self._client._rpc()
+        self._set(data, merge)
+
+    def delete(self):
+        self._client._rpc()
+        self._delete()
+
+    def _set(self, data, merge=False):
+        with self._client._lock:
+            docs = self._client._store.setdefault(self._collection, {})
+            if merge and self.id in docs:
+                docs[self.id] = {**docs[self.id], **copy.deepcopy(data)}
+            else:
+                docs[self.id] = copy.deepcopy(data)
+            self._client.write_count += 1
+
+    def _delete(self):
+        with self._client._lock:
+            self._client._store.get(self._collection, {}).pop(self.id, None)
+            self._client.write_count += 1
+
+class FakeQuery:
+    def __init__(self, client, collection_name, filters=(), orders=(), limit=None,
+                 start=None, end=None):
+        self._client = client
+        self._collection = collection_name
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._start = start  # (cursor_values, inclusive)
+        self._end = end
+
+    def _copy(self, **kw):
+        args = dict(filters=self._filters, orders=self._orders, limit=self._limit,
+                    start=self._start, end=self._end)
+        args.update(kw)
+        return FakeQuery(self._client, self._collection, **args)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        if op_string not in _OPS:
+            raise ValueError(f"Unsupported operator: {op_string}")
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction="ASCENDING"):
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def select(self, field_paths):
+        return self
+
+    def _cursor(self, values):
+        if isinstance(values, FakeDocumentSnapshot):
+            data = dict(values._data or {}, __name__=values.id)
+            values = [data.get(f) for f, _ in self._orders]
+        elif isinstance(values, dict):
+            values = [values[f] for f, _ in self._orders if f in values]
+        values = [v.id if isinstance(v, FakeDocumentReference) else v for v in values]
+        return list(values)
+
+    def start_at(self, values):
+        return self._copy(start=(self._cursor(values), True))
+
+    def start_after(self, values):
+        return self._copy(start=(self._cursor(values), False))
+
+    def end_at(self, values):
+        return self._copy(end=(self._cursor(values), True))
+
+    def end_before(self, values):
+        return self._copy(end=(self._cursor(values), False))
+
+    def _orders_with_name(self):
+        orders = list(self._orders)
+        if "__name__" not in [f for f, _ in orders]:
+            orders.append(("__name__", orders[-1][1] if orders else "ASCENDING"))
+        return orders
+
+    def stream(self, transaction=None):
+        with self._client._lock:
+            # set() replaces whole dicts, so a shallow snapshot is stable;
+            # to_dict() hands out copies
+            items = list(self._client._store.get(self._collection, {}).items())
+
+        def value(doc_id, data, field):
+            return doc_id if field == "__name__" else data.get(field, _MISSING)
+
+        for field, op, expected in self._filters:
+            items = [(i, d) for i, d in items
+                     if value(i, d, field) is not _MISSING and _OPS[op](value(i, d, field), expected)]
+        orders = self._orders_with_name()
+        # ordering on a field drops documents that do not have it
+        items = [(i, d) for i, d in items
+                 if all(value(i, d, f) is not _MISSING for f, _ in orders)]
+        for field, direction in reversed(orders):
+            items.sort(key=lambda kv: _sort_key(value(kv[0], kv[1], field)),
+                       reverse=direction == "DESCENDING")
+
+        def compare(doc_id, data, cursor):
+            # -1/0/1 comparison of a document against a cursor, in query order
+            for (field, direction), c in zip(orders, cursor):
+                a, b = _sort_key(value(doc_id, data, field)), _sort_key(c)
+                if a != b:
+                    result = -1 if a < b else 1
+                    return -result if direction == "DESCENDING" else result
+            return 0
+
+        if self._start:
+            cursor, inclusive = self._start
+            items = [(i, d) for i, d in items
+                     if compare(i, d, cursor) > 0 or (inclusive and compare(i, d, cursor) == 0)]
+        if self._end:
+            cursor, inclusive = self._end
+            items = [(i, d) for i, d in items
+                     if compare(i, d, cursor) < 0 or (inclusive and compare(i, d, cursor) == 0)]
+        if self._limit is not None:
+            items = items[:self._limit]
+        with self._client._lock:
+            self._client.read_count += len(items)
+        for doc_id, data in items:
+            yield FakeDocumentSnapshot(FakeDocumentReference(self._client, self._collection, doc_id), data)
+
+    def get(self, transaction=None):
+        return list(self.stream())
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client, collection_name):
+        super().__init__(client, collection_name)
+        self.id = collection_name
+
+    def document(self, document_id=None):
+        if document_id is None:
+            document_id = self._client._auto_id()
+        return FakeDocumentReference(self._client, self._collection, document_id)
+
+class FakeQueryPartition:
+    def __init__(self, query, start_at, end_at):
+        self._query = query
+        self.start_at = start_at
+        self.end_at = end_at
+
+    def query(self):
+        q = self._query.order_by("__name__")
+        if self.start_at is not None:
+            q = q.start_at({"__name__": self.start_at})
+        if self.end_at is not None:
+            q = q.end_before({"__name__": self.end_at})
+        return q
+
+class FakeCollectionGroup(FakeQuery):
+    def get_partitions(self, partition_count):
+        # split points at evenly spaced document ids, like PartitionQuery
+        with self._client._lock:
+            ids = sorted(self._client._store.get(self._collection, {}))
+        count = max(1, min(partition_count, len(ids)))
+        bounds = [ids[len(ids) * k // count] for k in range(1, count)]
+        starts = [None] + bounds
+        ends = bounds + [None]
+        for start, end in zip(starts, ends):
+            yield FakeQueryPartition(self, start, end)
+
+class FakeWriteBatch:
+    MAX_WRITES = 500
+
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def __len__(self):
+        return len(self._writes)
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append(("set", reference, document_data, merge))
+
+    def delete(self, reference):
+        self._writes.append(("delete", reference, None, False))
+
+    def commit(self):
+        if len(self._writes) > self.MAX_WRITES:
+            raise ValueError(f"maximum {self.MAX_WRITES} writes allowed per request")
+        # one RPC for the whole batch; an aborted commit applies nothing
+        self._client._rpc()
+        for op, ref, data, merge in self._writes:
+            if op == "set":
+                ref._set(data, merge=merge)
+            else:
+                ref._delete()
+        writes, self._writes = self._writes, []
+        return writes
+
+class FakeClient:
+    def __init__(self, collections=None, latency: float = 0.0, abort_rate: float = 0.0):
+        self._store = {name: {k: copy.deepcopy(v) for k, v in docs.items()}
+                       for name, docs in (collections or {}).items()}
+        self._lock = threading.RLock()
+        self._next_id = 0
+        self.read_count = 0
+        self.write_count = 0
+        self.latency = latency
+        self.abort_rate = abort_rate
+        self.aborted_count = 0
+
+    @classmethod
+    def from_export_dir(cls, data_dir: Path, files=EXPORT_FILES):
+        """Seed from an export_firestore.py snapshot (JSON arrays or NDJSON)."""
+        collections = {}
+        for name, stem in files.items():
+            docs = {}
+            for ext in (".json", ".ndjson", ".ndjson.gz"):
+                path = Path(data_dir) / f"{stem}{ext}"
+                if path.exists():
+                    for d in _iter_records(path):
+                        d = dict(d)
+                        docs[str(d.pop("_doc_id", None) or len(docs))] = d
+                    break
+            collections[name] = docs
+        return cls(collections)
+
+    def _rpc(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.abort_rate and random.random() < self.abort_rate:
+            with self._lock:
+                self.aborted_count += 1
+            raise Aborted("Too much contention on these documents. Please try again.")
+
+    def _auto_id(self):
+        with self._lock:
+            self._next_id += 1
+            return f"auto{self._next_id:016d}"
+
+    def collection(self, name):
+        return FakeCollectionReference(self, name)
+
+    def collection_group(self, collection_id):
+        return FakeCollectionGroup(self, collection_id)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def collections(self):
+        return [self.collection(name) for name in self._store]
+
+    def dump(self):
+        """Plain dict copy of every collection, for assertions in ad-hoc checks."""
+        with self._lock:
+            return json.loads(json.dumps(self._store, default=str))
@@ -0,0 +1,297 @@
+# Project/etl/generate_data.py
+"""
+Generate a synthetic Firestore export (recipes, users, user_interactions)
+of any size in the format export_firestore.py writes, to drive benchmarks
+of every downstream stage without Firestore.
+
+Usage: python generate_data.py [--recipes 1000] [--users 10000] [--interactions 1000000]
+                               [--seed 42] [--start 2025-01-01] [--days 365]
+                               [--recipe-skew 1.1] [--user-skew 0.9]
+                               [--format ndjson|json] [--gzip] [--workers N] [--out DIR]
+
+Writes <out>/recipes, users and user_interactions as .ndjson (default,
+.ndjson.gz with --gzip) or .json. The default --out is the scratch
+directory Project/data/generated: transform_etl.py reads the newest export
+file in Project/data, so generating there would replace the real export in
+the next transform / pipeline run. Pass --out Project/data to do that on
+purpose.
+
+ - recipes are popular by a Zipf law (weight 1 / rank ** recipe-skew over
+   a random ranking) and users active by a power law (user-skew), so a few
+   recipes / users account for most interactions, as in real traffic;
+ - interaction types are 60% view, 25% like, 15% cook (cooks rated 1-5),
+   as in insert_data.py;
+ - timestamps increase with the interaction id, spread uniformly over
+   --days from --start; recipes and users are created in the year before.
+
+Interactions are sampled with NumPy and formatted as JSON lines in a byte
+matrix, --chunk-rows at a time (on --workers processes). Each chunk has its own seed derived from --seed and its index,
+so the output depends only on the arguments, not on --workers.
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import gzip
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from lazy import lazy
+
+np = lazy("numpy")
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+# default output: next to, never in place of, the real export
+GENERATED_DIR = DATA_DIR / "generated"
+CHUNK_ROWS = 1_000_000
+
+TYPES = ("view", "like", "cook")
+TYPE_WEIGHTS = [0.6, 0.25, 0.15]
+DIFFICULTIES = ["Easy", "Medium", "Hard"]
+CUISINES = ["Indian", "Italian", "Chinese", "Mediterranean", "Mexican", "Thai", "International"]
+DISHES = ["Pulav", "Curry", "Soup", "Salad", "Pasta", "Stir-fry", "Dosa", "Tacos", "Risotto", "Noodles",
+          "Biryani", "Stew", "Wrap", "Bowl", "Masala"]
+# (name, unit, typical quantity), most common first
+INGREDIENTS = [
+    ("Salt", "tsp", 1), ("Onion", "medium", 1), ("Tomato", "pcs", 2), ("Oil", "tbsp", 1),
+    ("Garlic", "cloves", 2), ("Butter", "tbsp", 1), ("Water", "cups", 2), ("Rice", "cup", 1),
+    ("Pepper", "tsp", 0.5), ("Green Chili", "pcs", 1), ("Coriander", "tbsp", 1), ("Cream", "tbsp", 2),
+    ("Olive Oil", "tbsp", 1), ("Carrot", "cup", 0.5), ("Potato", "pcs", 2), ("Ginger", "tsp", 1),
+    ("Turmeric", "tsp", 0.5), ("Cumin", "tsp", 1), ("Paneer", "g", 200), ("Pasta", "g", 200),
+    ("Cheese", "g", 50), ("Lemon", "pcs", 1), ("Soy Sauce", "tbsp", 1), ("Chickpeas", "cup", 1),
+    ("Spinach", "cup", 1), ("Cucumber", "cup", 0.5), ("Broccoli", "cup", 1), ("Mushroom", "cup", 1),
+    ("Basil", "tbsp", 1), ("Yogurt", "cup", 0.5), ("Milk", "cup", 1), ("Flour", "cup", 1),
+    ("Sugar", "tsp", 1), ("Egg", "pcs", 2), ("Chicken", "g", 250), ("Beans", "cup", 0.5),
+    ("Peas", "cup", 0.5), ("Bell Pepper", "pcs", 1), ("Parmesan", "g", 30), ("Cauliflower", "cup", 1),
+]
+STEPS = ["Wash and chop the vegetables.", "Heat oil in a pan on medium heat.", "Add the spices and sauté for a minute.",
+         "Add the main ingredients and mix well.", "Cover and cook until tender.", "Season to taste.",
+         "Simmer for 10 minutes.", "Garnish and serve hot."]
+FIRST_NAMES = ["Janhavi", "Amit", "Neha", "Rohan", "Priya", "Arjun", "Sara", "Vikram", "Meera", "Kabir"]
+
+def zipf_cdf(n: int, skew: float, rng: np.random.Generator) -> np.ndarray:
+    """CDF over n keys with weight 1 / rank ** skew, ranks randomly assigned to keys."""
+    weights = np.empty(n)
+    weights[rng.permutation(n)] = 1.0 / np.arange(1, n + 1) ** skew
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+def sample(cdf: np.ndarray, n: int, rng: np.random.Generator) -> np.ndarray:
+    return np.minimum(np.searchsorted(cdf, rng.random(n), side="right"), len(cdf) - 1)
+
+def id_width(n: int) -> int:
+    return max(4, len(str(n)))
+
+def ids(prefix: str, n: int) -> np.ndarray:
+    """R0001 .. Rn, zero-padded to the width of n."""
+    width = id_width(n)
+    return np.array([f"{prefix}{i:0{width}d}" for i in range(1, n + 1)], dtype=object)
+
+@functools.lru_cache(maxsize=None)
+def popularity(seed: int, recipes: int, users: int, recipe_skew: float, user_skew: float):
+    """Recipe / user CDFs, the same for every chunk (cached per process)."""
+    rng = np.random.default_rng([seed, 0])
+    return zipf_cdf(recipes, recipe_skew, rng), zipf_cdf(users, user_skew, rng)
+
+def iso(seconds: np.ndarray) -> np.ndarray:
+    """Epoch seconds -> "YYYY-MM-DDTHH:MM:SS.ffffffZ" strings (object array)."""
+    us = (seconds * 1e6).astype("datetime64[us]")
+    return np.char.add(np.datetime_as_string(us, unit="us"), "Z").astype(object)
+
+def epoch(day: str) -> float:
+    return np.datetime64(day, "s").astype(np.int64).item()
+
+def make_recipes(n: int, start: float, rng: np.random.Generator) -> list:
+    recipe_ids = ids("R", n)
+    created = iso(np.sort(rng.uniform(start - 365 * 86400, start, n)))
+    # distinct ingredients per recipe, common ones more often (Gumbel top-k over Zipf weights)
+    vocab = len(INGREDIENTS)
+    log_w = -1.0 * np.log(np.arange(1, vocab + 1))
+    per_recipe = rng.integers(4, 11, n)
+    picks = np.argsort(-(log_w + rng.gumbel(size=(n, vocab))), axis=1)
+    steps_per_recipe = rng.integers(3, len(STEPS) + 1, n)
+    cuisines = rng.integers(0, len(CUISINES), n)
+    dishes = rng.integers(0, len(DISHES), n)
+    prep = rng.integers(5, 61, n)
+    cook = rng.integers(5, 91, n)
+    difficulty = rng.integers(0, 3, n)
+    servings = rng.integers(1, 7, n)
+    scale = rng.choice([0.5, 1.0, 1.5, 2.0], size=(n, vocab))
+
+    recipes = []
+    for i in range(n):
+        name = f"{CUISINES[cuisines[i]]} {DISHES[dishes[i]]}"
+        ingredients = [{"name": INGREDIENTS[j][0], "qty": INGREDIENTS[j][2] * scale[i, j], "unit": INGREDIENTS[j][1]}
+                       for j in picks[i, :per_recipe[i]]]
+        recipes.append({
+            "recipe_id": recipe_ids[i],
+            "name": name,
+            "description": f"A {DIFFICULTIES[difficulty[i]].lower()} {name.lower()}.",
+            "servings": int(servings[i]),
+            "prep_time_minutes": int(prep[i]),
+            "cook_time_minutes": int(cook[i]),
+            "difficulty": DIFFICULTIES[difficulty[i]],
+            "ingredients": ingredients,
+            "steps": STEPS[:steps_per_recipe[i] - 1] + [STEPS[-1]],
+            "cuisine": CUISINES[cuisines[i]],
+            "created_at": created[i],
+            "_doc_id": recipe_ids[i],
+        })
+    return recipes
+
+def make_users(n: int, start: float, rng: np.random.Generator) -> list:
+    user_ids = ids("U", n)
+    joined = iso(np.sort(rng.uniform(start - 365 * 86400, start, n)))
+    first = rng.integers(0, len(FIRST_NAMES), n)
+    return [{"user_id": uid, "name": f"{FIRST_NAMES[f]} {i + 1}", "email": f"{FIRST_NAMES[f].lower()}{i + 1}@example.com",
+             "joined_at": joined[i], "_doc_id": uid}
+            for i, (uid, f) in enumerate(zip(user_ids, first))]
+
+def _bytes(text: str) -> np.ndarray:
+    return np.frombuffer(text.encode("ascii"), dtype=np.uint8)
+
+def _digits(values: np.ndarray, width: int) -> np.ndarray:
+    """Zero-padded decimal digits of non-negative ints as an (n, width) ASCII matrix."""
+    powers = 10 ** np.arange(width - 1, -1, -1, dtype=np.int64)
+    return (values[:, None] // powers % 10 + 48).astype(np.uint8)
+
+def _iso_bytes(us: np.ndarray) -> list:
+    """Epoch microseconds -> pieces of "YYYY-MM-DDTHH:MM:SS.ffffffZ" (civil-from-days)."""
+    days, us = np.divmod(us, 86_400_000_000)
+    z = days + 719_468
+    era = z // 146_097
+    doe = z - era * 146_097
+    yoe = (doe - doe // 1460 + doe // 36_524 - doe // 146_096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    day = doy - (153 * mp + 2) // 5 + 1
+    month = np.where(mp < 10, mp + 3, mp - 9)
+    year = yoe + era * 400 + (month <= 2)
+    secs, frac = np.divmod(us, 1_000_000)
+    return [_digits(year, 4), "-", _digits(month, 2), "-", _digits(day, 2), "T", _digits(secs // 3600, 2), ":",
+            _digits(secs // 60 % 60, 2), ":", _digits(secs % 60, 2), ".", _digits(frac, 6), "Z"]
+
+def _rows(pieces: list, n: int) -> np.ndarray:
+    # constant strings broadcast down the column, matrices as they are
+    return np.hstack([np.broadcast_to(_bytes(p), (n, len(p))) if isinstance(p, str) else p for p in pieces])
+
+def interaction_lines(args, lo: int, hi: int) -> bytes:
+    """NDJSON lines of interactions lo..hi-1 (deterministic per chunk).
+
+    Every field but the optional rating has a fixed width, so the lines are
+    built as one byte matrix; the rating bytes are masked out for non-cooks.
+    """
+    rng = np.random.default_rng([args.seed, 1, lo])
+    recipe_cdf, user_cdf = popularity(args.seed, args.recipes, args.users, args.recipe_skew, args.user_skew)
+
+    n = hi - lo
+    start, span = epoch(args.start), args.days * 86400
+    # chunk k covers its share of the time span, sorted, so time grows with the id
+    times = np.sort(rng.uniform(start + span * lo / args.interactions, start + span * hi / args.interactions, n))
+    types = rng.choice(3, n, p=TYPE_WEIGHTS)
+    rating = rng.integers(1, 6, n)
+    users = sample(user_cdf, n, rng) + 1
+    recipes = sample(recipe_cdf, n, rng) + 1
+
+    iid = _digits(np.arange(lo + 1, hi + 1), id_width(args.interactions))
+    type_bytes = np.frombuffer("".join(TYPES).encode("ascii"), dtype=np.uint8).reshape(3, 4)
+    head = ['{"interaction_id": "I', iid, '", "user_id": "U', _digits(users, id_width(args.users)),
+            '", "recipe_id": "R', _digits(recipes, id_width(args.recipes)), '", "type": "', type_bytes[types], '"']
+    rated = [', "rating": ', _digits(rating, 1)]
+    tail = [', "timestamp": "', *_iso_bytes((times * 1e6).astype(np.int64)), '", "_doc_id": "I', iid, '"}\n']
+    head, rated, tail = _rows(head, n), _rows(rated, n), _rows(tail, n)
+    keep = np.ones((n, head.shape[1] + rated.shape[1] + tail.shape[1]), dtype=bool)
+    keep[:, head.shape[1]:head.shape[1] + rated.shape[1]] = (types == 2)[:, None]
+    return np.hstack([head, rated, tail])[keep].tobytes()
+
+def open_out(path: Path, mode: str = "wt"):
+    # level 1: the generator must not be bound by gzip
+    if path.name.endswith(".gz.tmp"):
+        return gzip.open(path, mode, encoding="utf-8" if "t" in mode else None, compresslevel=1)
+    return open(path, mode, encoding="utf-8" if "t" in mode else None)
+
+def out_path(out: Path, stem: str, fmt: str, compress: bool) -> Path:
+    return out / (f"{stem}.ndjson.gz" if compress else f"{stem}.{fmt}")
+
+def write_records(path: Path, records: list, fmt: str):
+    tmp = path.with_name(path.name + ".tmp")
+    with open_out(tmp) as f:
+        if fmt == "json":
+            json.dump(records, f, indent=2, ensure_ascii=False)
+        else:
+            for r in records:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+
+def write_interactions(path: Path, args, fmt: str):
+    bounds = list(range(0, args.interactions, args.chunk_rows)) + [args.interactions]
+    ranges = list(zip(bounds[:-1], bounds[1:]))
+    tmp = path.with_name(path.name + ".tmp")
+    with open_out(tmp, "wb") as f, ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        f.write(b"[\n" if fmt == "json" else b"")
+        chunks = (pool.map(interaction_lines, [args] * len(ranges), *zip(*ranges)) if args.workers > 1
+                  else (interaction_lines(args, lo, hi) for lo, hi in ranges))
+        for i, lines in enumerate(chunks):
+            if fmt == "json":
+                # JSON array: the same records, comma separated
+                lines = (b",\n" if i else b"") + lines.rstrip(b"\n").replace(b"}\n{", b"},\n{")
+            f.write(lines)
+        f.write(b"\n]\n" if fmt == "json" else b"")
+    os.replace(tmp, path)
+
+def generate(args) -> dict:
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng([args.seed, 2])
+    start = epoch(args.start)
+    fmt = "ndjson" if args.gzip else args.format
+    paths = {stem: out_path(out, stem, fmt, args.gzip) for stem in ("recipes", "users", "user_interactions")}
+
+    t0 = time.perf_counter()
+    write_records(paths["recipes"], make_recipes(args.recipes, start, rng), fmt)
+    write_records(paths["users"], make_users(args.users, start, rng), fmt)
+    t1 = time.perf_counter()
+    write_interactions(paths["user_interactions"], args, fmt)
+    t2 = time.perf_counter()
+    logging.info("Wrote %d recipes and %d users in %.2fs", args.recipes, args.users, t1 - t0)
+    logging.info("Wrote %d interactions to %s in %.2fs (%.0f rows/s)", args.interactions,
+                 paths["user_interactions"], t2 - t1, args.interactions / max(t2 - t1, 1e-9))
+    return paths
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Generate a synthetic Firestore export of any size")
+    ap.add_argument("--recipes", type=int, default=1_000)
+    ap.add_argument("--users", type=int, default=10_000)
+    ap.add_argument("--interactions", type=int, default=1_000_000)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--start", default="2025-01-01", help="first day of the interactions (UTC)")
+    ap.add_argument("--days", type=float, default=365, help="time span of the interactions")
+    ap.add_argument("--recipe-skew", type=float, default=1.1, help="Zipf exponent of recipe popularity")
+    ap.add_argument("--user-skew", type=float, default=0.9, help="power-law exponent of user activity")
+    ap.add_argument("--format", choices=["ndjson", "json"], default="ndjson")
+    ap.add_argument("--gzip", action="store_true", help="write .ndjson.gz")
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    ap.add_argument("--workers", type=int, default=1, help="processes formatting interaction chunks")
+    ap.add_argument("--out", type=Path, default=GENERATED_DIR,
+                    help="output directory (default: %(default)s; Project/data feeds the next transform)")
+    args = ap.parse_args(argv)
+    if args.gzip and args.format != "ndjson":
+        ap.error("--gzip requires --format ndjson")
+    if min(args.recipes, args.users) < 1:
+        ap.error("--recipes and --users must be at least 1")
+    if args.interactions < 0:
+        ap.error("--interactions must not be negative")
+    return args
+
+def main(argv=None):
+    generate(parse_args(argv))
+
+if __name__ == "__main__":
+    main()
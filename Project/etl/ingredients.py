@@ -0,0 +1,226 @@
+# Project/etl/ingredients.py
+"""
+Canonical ingredient catalog used by transform_etl.py: maps the raw
+ingredient names and units of the exported recipes onto one name, one
+integer key and a base unit each, so "Green Chillies" and "Green Chili"
+(or "Oil/Butter" and "Olive Oil") count as the same ingredient.
+
+Usage:
+    key, name = canonical("Fresh Coriander")     # (…, "Coriander")
+    qty, unit = to_base(2, "tbsp")               # (29.574, "ml")
+    keys, names = canonical_names(raw_names)     # whole column, one call per distinct name
+
+A raw name is matched on its match form: lower case, the first of
+"a/b" or "a or b" alternatives, no parenthesised notes, punctuation or
+preparation words (fresh, chopped, large, ...), each word singular
+(WORDS, then plain English plural rules). CATALOG lists the canonical
+names with their aliases; a name not in it gets the title-cased match form
+as its canonical name, so it still groups with its variants.
+
+ingredient_key is a small integer for catalog entries: 1, 2, ... in
+CATALOG order, so new entries go at the end. Names outside the catalog
+have no registry to draw from, so their key is a 53-bit BLAKE2b hash of
+the match form with the top bit set (never a catalog key); two forms
+hashing to the same key raise ValueError, as does an alias listed under
+two entries. Either way the key is the same in every run and process,
+survives the float parsing of CSV (and JavaScript clients) exactly, and
+lets the analytics count and join ingredients on int64 columns instead
+of strings. A name made only of preparation words keeps its own,
+lower-cased form; empty names have no key (None).
+
+Units convert to base units: volumes (tsp, tbsp, cup, ml, l, fl oz) to
+ml, weights (g, kg, mg, oz, lb) to g, counts (pcs, medium, whole, ...)
+to pcs; other units are kept, lower-cased, with factor 1. Units are
+matched case-insensitively, except T (tablespoon) and t (teaspoon).
+
+canonical() and unit_factor() are LRU-memoized; the vectorized helpers
+also factorize their column first, so each distinct value is resolved once
+per call and once per process across calls.
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import re
+
+from lazy import lazy
+
+np = lazy("numpy")
+pd = lazy("pandas")
+
+CACHE_SIZE = 65_536
+# keys of names outside the catalog have this bit set; catalog keys stay far below it
+HASHED_KEY_BIT = 1 << 52
+
+# canonical name -> aliases (matched after normalization, like the names themselves)
+CATALOG = {
+    "Salt": ["sea salt", "table salt", "rock salt"],
+    "Onion": ["onions", "red onion", "white onion", "yellow onion"],
+    "Tomato": ["tomatoes", "roma tomato", "cherry tomato"],
+    "Oil": ["olive oil", "vegetable oil", "cooking oil", "sunflower oil", "canola oil", "extra virgin olive oil"],
+    "Garlic": ["garlic clove", "garlic cloves", "garlic paste"],
+    "Butter": ["unsalted butter", "salted butter"],
+    "Ghee": ["desi ghee", "clarified butter"],
+    "Water": ["warm water", "cold water", "hot water"],
+    "Rice": ["basmati rice", "white rice", "cooked rice"],
+    "Pepper": ["black pepper", "ground pepper", "pepper powder", "black pepper powder"],
+    "Green Chili": ["green chilli", "green chillies", "green chilies", "green chile"],
+    "Red Chili": ["red chilli", "red chillies", "dried red chili", "dry red chilli"],
+    "Coriander": ["coriander leaves", "cilantro", "dhania"],
+    "Cream": ["heavy cream", "fresh cream", "whipping cream"],
+    "Carrot": ["carrots"],
+    "Potato": ["potatoes", "aloo"],
+    "Ginger": ["ginger paste"],
+    "Turmeric": ["turmeric powder", "haldi"],
+    "Cumin": ["cumin seeds", "cumin powder", "jeera"],
+    "Paneer": ["cottage cheese"],
+    "Pasta": ["penne", "spaghetti", "macaroni"],
+    "Cheese": ["cheddar", "cheddar cheese", "mozzarella", "mozzarella cheese"],
+    "Lemon": ["lemon juice"],
+    "Lime": ["lime juice"],
+    "Soy Sauce": ["soya sauce", "light soy sauce", "dark soy sauce"],
+    "Chickpeas": ["chickpea", "garbanzo beans", "chana", "kabuli chana"],
+    "Spinach": ["palak", "baby spinach"],
+    "Cucumber": ["cucumbers"],
+    "Broccoli": ["broccoli florets"],
+    "Mushroom": ["mushrooms", "button mushroom"],
+    "Basil": ["basil leaves"],
+    "Yogurt": ["yoghurt", "curd", "dahi", "greek yogurt"],
+    "Milk": ["whole milk"],
+    "Flour": ["all purpose flour", "all-purpose flour", "maida", "plain flour"],
+    "Sugar": ["white sugar", "caster sugar", "granulated sugar"],
+    "Egg": ["eggs"],
+    "Chicken": ["chicken breast", "boneless chicken", "chicken thighs"],
+    "Beans": ["mixed beans"],
+    "Kidney Beans": ["rajma", "red kidney beans"],
+    "Green Beans": ["french beans", "string beans"],
+    "Peas": ["green peas", "matar"],
+    "Bell Pepper": ["capsicum", "red bell pepper", "green bell pepper"],
+    "Parmesan": ["parmesan cheese", "parmigiano"],
+    "Cauliflower": ["gobi", "cauliflower florets"],
+}
+
+# preparation / size words dropped from a name before matching
+DESCRIPTORS = {
+    "fresh", "freshly", "chopped", "finely", "roughly", "minced", "sliced", "diced", "grated", "crushed",
+    "ground", "large", "small", "medium", "big", "ripe", "raw", "peeled", "boiled", "optional", "to", "taste",
+}
+# spellings mapped before the plural rules
+WORDS = {"chillies": "chili", "chilies": "chili", "chilli": "chili", "chile": "chili", "chilly": "chili",
+         "tomatoes": "tomato", "potatoes": "potato", "leaves": "leaf", "yoghurt": "yogurt"}
+# words the plural rules must leave alone
+SINGULAR = {"molasses", "hummus", "couscous", "asparagus", "swiss", "citrus", "bass", "glass", "gas"}
+
+# unit (lower case, no trailing dot) -> (base unit, factor)
+UNITS = {
+    **dict.fromkeys(["ml", "milliliter", "milliliters", "millilitre", "millilitres"], ("ml", 1.0)),
+    **dict.fromkeys(["l", "liter", "liters", "litre", "litres"], ("ml", 1000.0)),
+    **dict.fromkeys(["tsp", "teaspoon", "teaspoons"], ("ml", 4.92892)),
+    **dict.fromkeys(["tbsp", "tablespoon", "tablespoons", "tbs", "tbl", "tbsps"], ("ml", 14.7868)),
+    **dict.fromkeys(["cup", "cups", "c"], ("ml", 236.588)),
+    **dict.fromkeys(["fl oz", "floz", "fluid ounce", "fluid ounces"], ("ml", 29.5735)),
+    **dict.fromkeys(["g", "gm", "gms", "gram", "grams", "gr"], ("g", 1.0)),
+    **dict.fromkeys(["kg", "kilogram", "kilograms", "kgs"], ("g", 1000.0)),
+    **dict.fromkeys(["mg", "milligram", "milligrams"], ("g", 0.001)),
+    **dict.fromkeys(["oz", "ounce", "ounces"], ("g", 28.3495)),
+    **dict.fromkeys(["lb", "lbs", "pound", "pounds"], ("g", 453.592)),
+    **dict.fromkeys(["pc", "pcs", "piece", "pieces", "whole", "no", "nos", "small", "medium", "large"],
+                    ("pcs", 1.0)),
+    **dict.fromkeys(["clove", "cloves"], ("clove", 1.0)),
+    **dict.fromkeys(["pinch", "pinches"], ("pinch", 1.0)),
+}
+# units whose case matters (T is a tablespoon, t a teaspoon), matched before lower-casing
+CASED_UNITS = {"T": ("ml", 14.7868), "t": ("ml", 4.92892)}
+
+ALTERNATIVES_RE = re.compile(r"/|\bor\b")
+NOTES_RE = re.compile(r"\([^)]*\)")
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+def singular(word: str) -> str:
+    word = WORDS.get(word, word)
+    if word in SINGULAR or len(word) <= 3:
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith(("oes", "ches", "shes", "xes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+def match_form(name: str) -> str:
+    """The form raw names and aliases are compared in ("" when nothing is left)."""
+    text = NOTES_RE.sub(" ", str(name).lower())
+    text = ALTERNATIVES_RE.split(text)[0]
+    words = [singular(w) for w in WORD_RE.findall(text) if w not in DESCRIPTORS]
+    return " ".join(words)
+
+@functools.lru_cache(maxsize=None)
+def _aliases() -> dict:
+    # match form -> (ingredient_key, canonical name), built on first use
+    table = {}
+    for key, (name, aliases) in enumerate(CATALOG.items(), start=1):
+        for alias in [name, *aliases]:
+            form = match_form(alias)
+            if table.setdefault(form, (key, name))[1] != name:
+                raise ValueError(f"Catalog alias {alias!r} of {name!r} already belongs to {table[form][1]!r}")
+    return table
+
+# hashed key -> the match form it was issued for
+_hashed_forms = {}
+
+def ingredient_key(form: str) -> int:
+    """Stable 53-bit key of a match form outside the catalog (exact as a float64)."""
+    key = HASHED_KEY_BIT | int.from_bytes(hashlib.blake2b(form.encode(), digest_size=8).digest(), "big") >> 12
+    if _hashed_forms.setdefault(key, form) != form:
+        raise ValueError(f"ingredient_key collision between {form!r} and {_hashed_forms[key]!r}")
+    return key
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def canonical(name) -> tuple:
+    """(ingredient_key, canonical name) of a raw name; (None, "") when it is empty."""
+    if not isinstance(name, str) or not name.strip():
+        return None, ""
+    form = match_form(name)
+    if not form:
+        form = " ".join(name.lower().split())
+        return ingredient_key(form), form.title()
+    entry = _aliases().get(form)
+    if entry is None:
+        return ingredient_key(form), form.title()
+    # every alias of an entry shares the key of its canonical name
+    return entry
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def unit_factor(unit) -> tuple:
+    """(base unit, factor) of a raw unit; ("", 1.0) when there is none."""
+    text = " ".join(unit.replace(".", " ").split()) if isinstance(unit, str) else ""
+    if not text:
+        return "", 1.0
+    if text in CASED_UNITS:
+        return CASED_UNITS[text]
+    text = text.lower()
+    return UNITS.get(text, (text, 1.0))
+
+def to_base(qty: float, unit) -> tuple:
+    base, factor = unit_factor(unit)
+    return round(float(qty) * factor, 3), base
+
+def canonical_names(names: pd.Series) -> tuple:
+    """(ingredient_key Series (nullable Int64), canonical name Series) for a column of raw names."""
+    codes, uniques = pd.factorize(pd.Series(names, dtype=object).reset_index(drop=True), use_na_sentinel=True)
+    resolved = [canonical(u) for u in uniques]
+    keys = pd.array([k for k, _ in resolved] + [None], dtype="Int64")
+    display = np.array([n for _, n in resolved] + [""], dtype=object)
+    # code -1 (missing) picks the trailing (None, "")
+    return pd.Series(keys[codes]), pd.Series(display[codes], dtype=object)
+
+def base_quantities(qty: pd.Series, units: pd.Series) -> tuple:
+    """(quantity in base units, base unit) Series for quantity and raw unit columns."""
+    codes, uniques = pd.factorize(pd.Series(units, dtype=object).reset_index(drop=True), use_na_sentinel=True)
+    resolved = [unit_factor(u) for u in uniques] + [("", 1.0)]
+    factor = np.array([f for _, f in resolved])[codes]
+    base = np.array([b for b, _ in resolved], dtype=object)[codes]
+    return (pd.Series(np.round(np.asarray(qty, dtype=float) * factor, 3)),
+            pd.Series(base, dtype=object))
@@ -0,0 +1,36 @@
+# Project/etl/lazy.py
+"""
+Deferred imports for the heavy libraries (pandas, numpy, pyarrow,
+matplotlib, dateutil), so importing a pipeline module or running a script
+with --help does not pay for them.
+
+Usage:
+    from lazy import available, lazy
+    pd = lazy("pandas")          # imported on the first pd.<attribute>
+    pq = lazy("pyarrow.parquet") if available("pyarrow") else None
+
+Modules using it start with `from __future__ import annotations`, so type
+hints such as pd.DataFrame do not trigger the import either.
+available() checks an optional dependency is installed without importing
+it. benchmarks/bench_startup.py checks that importing each entry point
+stays free of these libraries.
+"""
+
+import importlib
+import importlib.util
+import types
+
+class LazyModule(types.ModuleType):
+    """Stand-in for a module that imports it on first attribute access."""
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name__)
+        # later lookups hit the copied attributes directly, not this hook
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+def lazy(name: str) -> types.ModuleType:
+    return LazyModule(name)
+
+def available(name: str) -> bool:
+    return importlib.util.find_spec(name) is not None
@@ -0,0 +1,294 @@
+# Project/etl/metrics.py
+"""
+Per-stage instrumentation: wall time, rows in/out, bytes read/written and
+peak memory of every pipeline stage, written to a JSON metrics file and a
+Prometheus text-format file.
+
+Usage:
+    import metrics
+    with metrics.run("transform", profile=args.profile):   # in main()
+        with metrics.stage("transform.recipes", rows_in=len(raw)) as m:
+            ...
+            m["rows_out"] = len(df)
+
+run() collects the stages finished until it exits (also on failure) and
+writes Project/metrics/<run>.json (every stage record, in completion order)
+and <run>.prom (per stage name: summed seconds, rows and bytes, max peak
+memory, call count; ready for node_exporter's textfile collector). A stage
+outside run() is measured but not written anywhere.
+
+Bytes are the process's rchar / wchar counters (/proc/self/io: every read
+and write call, page cache hits included). Peak memory is the RSS high-water
+mark, reset at every stage boundary (/proc/self/clear_refs), so a stage
+reports its own peak and an enclosing stage the max of its children's. Both
+are process-wide: stages running concurrently on threads (the export
+collections) include each other's. Without /proc the bytes are null and the
+peak is the process's lifetime peak. Work done in worker processes only
+counts when the worker returns its stage record to record() (the charts).
+
+With profile=True (--profile) the outermost stages on the main thread run
+under cProfile and tracemalloc; the slowest one's profile is kept and
+written to <run>.prof (pstats; e.g. `python -m pstats`, snakeviz) and
+<run>.profile.txt (top functions by cumulative time, traced peak memory and
+the top allocation sites still held when the stage ended). Profiling slows
+the run down, which is why it is opt-in.
+"""
+
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parents[1]
+METRICS_DIR = PROJECT_DIR / "metrics"
+PREFIX = "recipe_pipeline"
+# lines of the profile report
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+
+# (metric, help, how records with the same stage name combine)
+PROMETHEUS = [
+    ("seconds", "Wall time spent in the stage.", sum),
+    ("rows_in", "Rows (documents) the stage read.", sum),
+    ("rows_out", "Rows the stage produced.", sum),
+    ("read_bytes", "Bytes read by the process during the stage.", sum),
+    ("written_bytes", "Bytes written by the process during the stage.", sum),
+    ("peak_rss_bytes", "Peak resident memory of the process during the stage.", max),
+]
+
+_records = []
+# stages being measured on any thread; each stage boundary folds the peak into them
+_open = {}
+_lock = threading.Lock()
+_local = threading.local()
+_started = time.perf_counter()
+_profiler = None
+_can_reset = True
+
+def _after_fork():
+    # a worker process measures only its own stages, unprofiled
+    global _lock, _profiler
+    _lock = threading.Lock()
+    _open.clear()
+    _records.clear()
+    if _profiler is not None:
+        _profiler.stop()
+        _profiler = None
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+def _io():
+    """(rchar, wchar) of this process, or (None, None) without /proc."""
+    try:
+        with open("/proc/self/io", "rb") as f:
+            fields = dict(line.split(b":") for line in f)
+        return int(fields[b"rchar"]), int(fields[b"wchar"])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+def _peak_rss():
+    try:
+        with open("/proc/self/status", "rb") as f:
+            for line in f:
+                if line.startswith(b"VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+def _mark():
+    # caller holds _lock: fold the high-water mark so far into every open stage, then reset it
+    global _can_reset
+    peak = _peak_rss()
+    if peak is not None:
+        for rec in _open.values():
+            rec["peak_rss_bytes"] = max(rec["peak_rss_bytes"] or 0, peak)
+    if _can_reset:
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+        except OSError:
+            _can_reset = False
+
+def count(value):
+    """Rows of a frame / entries of a collection; 1 for a scalar, None for None."""
+    if value is None:
+        return None
+    if isinstance(value, str) or not hasattr(value, "__len__"):
+        return 1
+    return len(value)
+
+class _Profiler:
+    """cProfile and tracemalloc of the outermost stages; keeps the slowest one."""
+
+    def __init__(self):
+        self.slowest = None
+        self.active = None
+        tracemalloc.start()
+
+    def begin(self):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiler is active (e.g. the run itself is under cProfile)
+            return None
+        tracemalloc.reset_peak()
+        self.active = profile
+        return profile
+
+    def end(self, rec: dict, profile: cProfile.Profile):
+        profile.disable()
+        self.active = None
+        rec["traced_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        if self.slowest is None or rec["seconds"] > self.slowest[0]["seconds"]:
+            # the snapshot is cheap; grouping it (statistics) is left to write()
+            self.slowest = (rec, profile, tracemalloc.take_snapshot())
+
+    def write(self, stem: Path) -> list:
+        if self.slowest is None:
+            return []
+        rec, profile, snapshot = self.slowest
+        # filtering the stats is much cheaper than filter_traces() on every trace
+        allocations = [stat for stat in snapshot.statistics("lineno")
+                       if not stat.traceback[0].filename.startswith(("<frozen importlib", tracemalloc.__file__))]
+        allocations = allocations[:TOP_ALLOCATIONS]
+        out = io.StringIO()
+        out.write(f"Slowest stage: {rec['stage']} ({rec['seconds']:.3f}s, "
+                  f"traced peak {rec['traced_peak_bytes'] / 2**20:.1f} MB)\n\n")
+        pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        out.write(f"Top {len(allocations)} allocation sites still held at the end of the stage:\n")
+        for stat in allocations:
+            out.write(f"  {stat}\n")
+        profile.dump_stats(stem.with_suffix(".prof"))
+        stem.with_suffix(".profile.txt").write_text(out.getvalue())
+        return [stem.with_suffix(".prof"), stem.with_suffix(".profile.txt")]
+
+    def stop(self):
+        if self.active is not None:
+            self.active.disable()
+        tracemalloc.stop()
+
+@contextmanager
+def stage(name: str, rows_in: int = None):
+    """Measure the enclosed block; yields its record, where the block can set rows_in / rows_out."""
+    stack = _local.__dict__.setdefault("stack", [])
+    rec = {"stage": name, "start": round(time.perf_counter() - _started, 4), "seconds": None,
+           "rows_in": rows_in, "rows_out": None, "read_bytes": None, "written_bytes": None,
+           "peak_rss_bytes": None, "pid": os.getpid()}
+    profiler = _profiler if not stack and threading.current_thread() is threading.main_thread() else None
+    with _lock:
+        _mark()
+        _open[id(rec)] = rec
+    read, written = _io()
+    profile = profiler.begin() if profiler else None
+    stack.append(name)
+    start = time.perf_counter()
+    try:
+        yield rec
+    except BaseException as e:
+        rec["error"] = type(e).__name__
+        raise
+    finally:
+        rec["seconds"] = round(time.perf_counter() - start, 4)
+        stack.pop()
+        if profile is not None:
+            profiler.end(rec, profile)
+        if read is not None:
+            read_after, written_after = _io()
+            rec["read_bytes"], rec["written_bytes"] = read_after - read, written_after - written
+        with _lock:
+            _mark()
+            del _open[id(rec)]
+            _records.append(rec)
+
+def record(records):
+    """Add stage records measured in worker processes."""
+    with _lock:
+        _records.extend(records)
+
+def _label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def prometheus(name: str, records: list, seconds: float, finished: float) -> str:
+    """Prometheus text exposition of a run: one sample per stage name and metric."""
+    by_stage = {}
+    for rec in records:
+        by_stage.setdefault(rec["stage"], []).append(rec)
+    lines = []
+    for metric, help_text, combine in PROMETHEUS:
+        lines += [f"# HELP {PREFIX}_stage_{metric} {help_text}", f"# TYPE {PREFIX}_stage_{metric} gauge"]
+        for stage_name, recs in by_stage.items():
+            values = [r[metric] for r in recs if r.get(metric) is not None]
+            if values:
+                lines.append(f'{PREFIX}_stage_{metric}{{run="{_label(name)}",stage="{_label(stage_name)}"}} '
+                             f"{combine(values)}")
+    lines += [f"# HELP {PREFIX}_stage_calls Times the stage ran.", f"# TYPE {PREFIX}_stage_calls gauge"]
+    lines += [f'{PREFIX}_stage_calls{{run="{_label(name)}",stage="{_label(s)}"}} {len(recs)}'
+              for s, recs in by_stage.items()]
+    lines += [f"# HELP {PREFIX}_stage_errors Times the stage raised.", f"# TYPE {PREFIX}_stage_errors gauge"]
+    lines += [f'{PREFIX}_stage_errors{{run="{_label(name)}",stage="{_label(s)}"}} '
+              f'{sum("error" in r for r in recs)}' for s, recs in by_stage.items()]
+    lines += [f"# HELP {PREFIX}_run_seconds Wall time of the run.", f"# TYPE {PREFIX}_run_seconds gauge",
+              f'{PREFIX}_run_seconds{{run="{_label(name)}"}} {round(seconds, 4)}',
+              f"# HELP {PREFIX}_run_finished_timestamp_seconds When the run ended.",
+              f"# TYPE {PREFIX}_run_finished_timestamp_seconds gauge",
+              f'{PREFIX}_run_finished_timestamp_seconds{{run="{_label(name)}"}} {round(finished, 3)}']
+    return "\n".join(lines) + "\n"
+
+def _write_atomic(path: Path, text: str):
+    # scrapers may read the file at any moment
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+@contextmanager
+def run(name: str, profile: bool = False, out_dir: Path = METRICS_DIR):
+    """Collect the stages of one run and write <out_dir>/<name>.json and .prom when it ends."""
+    global _profiler, _started
+    with _lock:
+        _records.clear()
+    _started = time.perf_counter()
+    started_at = time.time()
+    _profiler = _Profiler() if profile else None
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        seconds = time.perf_counter() - _started
+        profiler, _profiler = _profiler, None
+        out_dir = Path(out_dir)
+        report = {"run": name, "started": started_at, "seconds": round(seconds, 4), "failed": failed,
+                  "pid": os.getpid(), "python": sys.version.split()[0], "profiled": None, "stages": _records}
+        try:
+            out_dir.mkdir(parents=True, exist_ok=True)
+            written = [out_dir / f"{name}.json", out_dir / f"{name}.prom"]
+            if profiler is not None and profiler.slowest is not None:
+                report["profiled"] = profiler.slowest[0]["stage"]
+                written += profiler.write(out_dir / name)
+            _write_atomic(written[0], json.dumps(report, indent=2, default=str))
+            _write_atomic(written[1], prometheus(name, _records, seconds, time.time()))
+            logging.info("Metrics: %s", ", ".join(str(p) for p in written))
+            if report["profiled"]:
+                logging.info("Profiled the slowest stage, %s", report["profiled"])
+        except OSError as e:
+            # metrics never fail the run
+            logging.warning("Could not write the metrics to %s: %s", out_dir, e)
+        finally:
+            if profiler is not None:
+                profiler.stop()
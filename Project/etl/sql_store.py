@@ -0,0 +1,108 @@
+# Project/etl/sql_store.py
+"""
+Bulk-load the pipeline tables into an embedded SQLite database
+(Project/output_csv/pipeline.db) for SQL analytics (analytics/sql_analytics.py).
+
+Usage: python sql_store.py [--db PATH]   (transform_etl.py --db does the same)
+
+Tables are read through table_store (newest Parquet/CSV copy) and created
+with the column types of table_store.SCHEMAS: INTEGER, REAL, or TEXT for
+text and category columns; missing values are NULL. Rows keep the stored
+order (rowid), which SQL queries use for first-appearance tie order.
+Indexes (INDEXES) cover the join keys, ingredient_key (the ingredient
+counts group on it) and (user_id, type) and (type, recipe_id) on
+interactions, which answer the per-user and per-type grouped insights from
+the index alone. The database is built in a temporary
+file and swapped in when complete.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import sqlite3
+from pathlib import Path
+
+import table_store as tables
+from lazy import lazy
+
+pd = lazy("pandas")
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+DB_PATH = tables.OUT_DIR / "pipeline.db"
+TABLES = ("recipe", "ingredients", "steps", "users", "interactions")
+SQL_TYPES = {"str": "TEXT", "category": "TEXT", "int": "INTEGER", "float": "REAL", "number": "REAL"}
+INDEXES = {
+    "recipe": [("recipe_id",)],
+    "ingredients": [("recipe_id",), ("ingredient_key",)],
+    "steps": [("recipe_id",)],
+    "users": [("user_id",)],
+    "interactions": [("recipe_id",), ("user_id", "type"), ("type", "recipe_id"), ("timestamp",)],
+}
+CHUNK_ROWS = 200_000
+
+def create_table(conn: sqlite3.Connection, name: str):
+    columns = ", ".join(f"{col} {SQL_TYPES[kind]}" for col, kind in tables.SCHEMAS[name].items())
+    conn.execute(f"CREATE TABLE {name} ({columns})")
+
+def _rows(df: pd.DataFrame):
+    # NaN / pd.NA -> NULL, numpy scalars -> Python values
+    return df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+
+def load_table(conn: sqlite3.Connection, name: str, out_dir: Path = tables.OUT_DIR,
+               chunk_rows: int = CHUNK_ROWS) -> int:
+    columns = list(tables.SCHEMAS[name])
+    create_table(conn, name)
+    insert = f"INSERT INTO {name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    rows = 0
+    for chunk in tables.iter_table(name, columns, chunk_rows=chunk_rows, out_dir=out_dir):
+        chunk = chunk.reindex(columns=columns)
+        conn.executemany(insert, _rows(chunk))
+        rows += len(chunk)
+    for cols in INDEXES.get(name, []):
+        conn.execute(f"CREATE INDEX idx_{name}_{'_'.join(cols)} ON {name} ({', '.join(cols)})")
+    return rows
+
+def load_database(db_path: Path = DB_PATH, out_dir: Path = tables.OUT_DIR, names=TABLES,
+                  chunk_rows: int = CHUNK_ROWS) -> dict:
+    """(Re)build the database from the stored tables; returns rows per table."""
+    db_path = Path(db_path)
+    tmp = db_path.with_name(db_path.name + ".tmp")
+    if tmp.exists():
+        tmp.unlink()
+    counts = {}
+    conn = sqlite3.connect(tmp)
+    try:
+        # a half-built file is thrown away anyway, so skip the journal
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        for name in names:
+            if tables.find_table(name, out_dir)[0] is None:
+                logging.warning("Table %s not found in %s; not loaded", name, out_dir)
+                continue
+            counts[name] = load_table(conn, name, out_dir, chunk_rows)
+            conn.commit()
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp, db_path)
+    logging.info("Loaded %s into %s", ", ".join(f"{n}={c}" for n, c in counts.items()), db_path)
+    return counts
+
+def connect(db_path: Path = DB_PATH) -> sqlite3.Connection:
+    db_path = Path(db_path)
+    if not db_path.exists():
+        raise FileNotFoundError(f"Database not found: {db_path} (run transform_etl.py --db or sql_store.py)")
+    return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Load the pipeline tables into an embedded SQLite database")
+    ap.add_argument("--db", type=Path, default=DB_PATH, help="database file (default: %(default)s)")
+    args = ap.parse_args(argv)
+    load_database(args.db)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+# Project/etl/stage_cache.py
+"""
+Content-addressed cache of pipeline stage runs (used by pipeline.py), so a
+cron tick skips the work whose inputs have not changed.
+
+Usage: python stage_cache.py [--evict] [--clear]   (lists the entries)
+
+A stage run is keyed on the SHA-256 of its input files, its code (the
+source of the modules it runs, plus library versions) and its options.
+An entry records the digest of every output file and the stage's JSON
+result. On a hit the outputs are reused: left alone when they still match,
+otherwise copied back from the object store (Project/.cache/objects/, one
+file per distinct output content) when restore is allowed.
+
+File digests are memoized on (size, mtime_ns), so an unchanged multi-GB
+table is not re-hashed every run. Entries unused for max_age_days are
+evicted, then the least recently used ones holding objects until the
+objects fit in max_bytes; objects no entry refers to are deleted.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from importlib import metadata
+from pathlib import Path
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+PROJECT_DIR = Path(__file__).resolve().parents[1]
+CACHE_DIR = PROJECT_DIR / ".cache"
+MAX_BYTES = 2 * 2**30
+MAX_AGE_DAYS = 30
+# libraries whose version is part of every key
+LIBRARIES = ("pandas", "numpy", "pyarrow", "matplotlib")
+BLOCK = 2**20
+
+def sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(BLOCK):
+            h.update(block)
+    return h.hexdigest()
+
+def _versions() -> dict:
+    versions = {}
+    for lib in LIBRARIES:
+        try:
+            versions[lib] = metadata.version(lib)
+        except metadata.PackageNotFoundError:
+            versions[lib] = None
+    return versions
+
+def _write_json(path: Path, data):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data, indent=1, sort_keys=True))
+    os.replace(tmp, path)
+
+def _read_json(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+class StageCache:
+    """Index of stage runs (index.json), file digest memo (digests.json) and output objects."""
+
+    def __init__(self, root: Path = CACHE_DIR, enabled: bool = True, max_bytes: int = MAX_BYTES,
+                 max_age_days: float = MAX_AGE_DAYS):
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        # enabled=False never reports a hit but still records runs (--no-cache)
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400
+        self.index = _read_json(self.root / "index.json")
+        self.digests = _read_json(self.root / "digests.json")
+        self.versions = _versions()
+
+    def _rel(self, path: Path) -> str:
+        path = Path(path).resolve()
+        try:
+            return str(path.relative_to(PROJECT_DIR))
+        except ValueError:
+            return str(path)
+
+    def _path(self, rel: str) -> Path:
+        return PROJECT_DIR / rel
+
+    def _object(self, sha: str) -> Path:
+        return self.objects / sha[:2] / sha
+
+    def digest(self, path: Path):
+        """SHA-256 of a file (None when missing), re-hashed only when its size or mtime changed."""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        rel = self._rel(path)
+        memo = self.digests.get(rel)
+        if memo and memo[0] == st.st_size and memo[1] == st.st_mtime_ns:
+            return memo[2]
+        sha = sha256_file(path)
+        self.digests[rel] = [st.st_size, st.st_mtime_ns, sha]
+        return sha
+
+    def key(self, stage: str, code, inputs, options: dict = None) -> str:
+        """Key of a stage run: its name, code files, input files and options."""
+        parts = {
+            "stage": stage,
+            "code": {self._rel(p): self.digest(p) for p in code},
+            "inputs": {self._rel(p): self.digest(p) for p in inputs},
+            "options": options or {},
+            "versions": self.versions,
+        }
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def lookup(self, key: str, restore: bool = True):
+        """The entry for key when its outputs are in place (or restored from the objects), else None."""
+        entry = self.index.get(key) if self.enabled else None
+        if entry is None:
+            return None
+        stale = {rel: sha for rel, sha in entry["outputs"].items() if self.digest(self._path(rel)) != sha}
+        if stale:
+            if not restore or not all(self._object(sha).exists() for sha in stale.values()):
+                return None
+            for rel, sha in stale.items():
+                path = self._path(rel)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_name(path.name + ".tmp")
+                shutil.copyfile(self._object(sha), tmp)
+                os.replace(tmp, path)
+            logging.info("Restored %d cached outputs of %s", len(stale), entry["stage"])
+        entry["used"] = time.time()
+        return entry
+
+    def store(self, key: str, stage: str, outputs, result=None, keep_objects: bool = True):
+        """Record a finished run; outputs that do not exist are left out.
+
+        keep_objects=False only records the digests (outputs can then be
+        reused in place but not restored).
+        """
+        recorded = {}
+        for path in outputs:
+            sha = self.digest(path)
+            if sha is None:
+                continue
+            recorded[self._rel(path)] = sha
+            obj = self._object(sha)
+            if keep_objects and not obj.exists():
+                obj.parent.mkdir(parents=True, exist_ok=True)
+                tmp = obj.with_name(obj.name + ".tmp")
+                shutil.copyfile(path, tmp)
+                os.replace(tmp, obj)
+        now = time.time()
+        self.index[key] = {"stage": stage, "outputs": recorded, "result": result, "created": now, "used": now}
+        return self.index[key]
+
+    def evict(self, now: float = None) -> int:
+        """Drop old and least recently used entries and unreferenced objects; returns entries dropped."""
+        now = time.time() if now is None else now
+        dropped = [k for k, e in self.index.items() if now - e["used"] > self.max_age]
+        for k in dropped:
+            del self.index[k]
+        sizes = {p.name: p.stat().st_size for p in self.objects.glob("*/*") if p.is_file()}
+
+        def referenced():
+            return {sha for e in self.index.values() for sha in e["outputs"].values() if sha in sizes}
+
+        # entries without stored objects cost nothing and are only dropped by age
+        lru = sorted((k for k, e in self.index.items() if any(sha in sizes for sha in e["outputs"].values())),
+                     key=lambda k: self.index[k]["used"])
+        while lru and sum(sizes[sha] for sha in referenced()) > self.max_bytes:
+            dropped.append(lru.pop(0))
+            del self.index[dropped[-1]]
+        keep = referenced()
+        for sha in set(sizes) - keep:
+            self._object(sha).unlink()
+        # digests of files that no longer exist
+        self.digests = {rel: d for rel, d in self.digests.items() if self._path(rel).exists()}
+        if dropped:
+            logging.info("Evicted %d cache entries", len(dropped))
+        return len(dropped)
+
+    def save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        _write_json(self.root / "index.json", self.index)
+        _write_json(self.root / "digests.json", self.digests)
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        self.index, self.digests = {}, {}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="List or prune the pipeline stage cache entries")
+    ap.add_argument("--evict", action="store_true", help="apply the eviction policy now")
+    ap.add_argument("--clear", action="store_true", help="delete the whole cache")
+    ap.add_argument("--max-mb", type=float, default=MAX_BYTES / 2**20)
+    ap.add_argument("--max-age-days", type=float, default=MAX_AGE_DAYS)
+    args = ap.parse_args(argv)
+
+    cache = StageCache(max_bytes=int(args.max_mb * 2**20), max_age_days=args.max_age_days)
+    if args.clear:
+        cache.clear()
+        logging.info("Cleared %s", cache.root)
+        return
+    if args.evict:
+        cache.evict()
+        cache.save()
+    for key, e in sorted(cache.index.items(), key=lambda kv: -kv[1]["used"]):
+        print(f"{key[:12]}  {e['stage']:28} {time.strftime('%Y-%m-%d %H:%M', time.localtime(e['used']))}"
+              f"  {len(e['outputs'])} outputs")
+
+if __name__ == "__main__":
+    main()
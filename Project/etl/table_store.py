@@ -0,0 +1,409 @@
+# Project/etl/table_store.py
+"""
+Typed storage for the pipeline tables (recipe, ingredients, steps, users,
+interactions) and the one loader validator.py, analytics.py and
+visualize.py read them through.
+
+Tables are written as Parquet with a fixed schema (low-cardinality text
+columns dictionary-encoded) and/or as the original CSVs. The CSVs keep
+their original layout (CSV_COLUMNS) for external readers; the columns added
+since are stored in Parquet only and recomputed from the CSV columns when a
+table is read back from CSV (CSV_DERIVED; raw_name cannot be, so a table
+read from CSV has none). Loading picks the newest of <table>.parquet / <table>.csv in
+Project/output_csv, projects to the requested columns and returns:
+ - typed frames (default): ints/floats per SCHEMAS, text as str, NaN
+   where the CSV cell is empty
+ - as_text=True: every value as the string the CSV would contain
+   ("" for missing), which is what validator.py checks
+
+from_frame() gives the same frames for a table still in memory (pipeline.py
+hands the transform output to the later stages that way).
+
+Parquet needs pyarrow; without it everything falls back to CSV.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from pathlib import Path
+
+from lazy import available, lazy
+
+np = lazy("numpy")
+pd = lazy("pandas")
+catalog = lazy("ingredients")
+
+if available("pyarrow"):
+    pa = lazy("pyarrow")
+    pq = lazy("pyarrow.parquet")
+else:  # optional: CSV-only mode
+    pa = pq = None
+
+PROJECT_DIR = Path(__file__).resolve().parents[1]
+OUT_DIR = PROJECT_DIR / "output_csv"
+
+# column -> kind: "str", "int", "float", "category" (dictionary-encoded),
+# "number" (float64 whose whole values read back as ints, e.g. rating "5")
+SCHEMAS = {
+    "recipe": {
+        "recipe_id": "str",
+        "name": "str",
+        "description": "str",
+        "servings": "int",
+        "prep_time_minutes": "int",
+        "cook_time_minutes": "int",
+        "difficulty": "category",
+        "cuisine": "category",
+        "created_at": "str",
+        # source text of the three counts when it is not a whole number (as qty_text)
+        "servings_text": "str",
+        "prep_time_minutes_text": "str",
+        "cook_time_minutes_text": "str",
+    },
+    "ingredients": {
+        "ingredient_id": "str",
+        "recipe_id": "str",
+        "ingredient_name": "str",
+        "qty_numeric": "float",
+        "unit": "category",
+        "qty_text": "str",
+        "ingredient_key": "int",
+        "raw_name": "str",
+        "qty_base": "float",
+        "base_unit": "category",
+    },
+    "steps": {
+        "step_id": "str",
+        "recipe_id": "str",
+        "step_order": "int",
+        "step_text": "str",
+    },
+    "users": {
+        "user_id": "str",
+        "name": "str",
+        "email": "str",
+        "joined_at": "str",
+    },
+    "interactions": {
+        "interaction_id": "str",
+        "user_id": "str",
+        "recipe_id": "str",
+        "type": "category",
+        "rating": "number",
+        "timestamp": "str",
+    },
+}
+
+# columns of the CSVs as external readers know them (other tables write every column)
+CSV_COLUMNS = {
+    "recipe": ["recipe_id", "name", "description", "servings", "prep_time_minutes", "cook_time_minutes",
+               "difficulty", "cuisine", "created_at"],
+    "ingredients": ["ingredient_id", "recipe_id", "ingredient_name", "qty_numeric", "unit", "qty_text"],
+}
+
+FORMATS = ("parquet", "csv")
+DEFAULT_FORMATS = ("parquet",) if pq is not None else ("csv",)
+
+def has_parquet() -> bool:
+    return pq is not None
+
+def arrow_schema(name: str):
+    types = {"str": pa.string(), "int": pa.int64(), "float": pa.float64(), "number": pa.float64(),
+             "category": pa.dictionary(pa.int32(), pa.string())}
+    return pa.schema([(col, types[kind]) for col, kind in SCHEMAS[name].items()])
+
+def table_path(name: str, fmt: str, out_dir: Path = OUT_DIR) -> Path:
+    return Path(out_dir) / f"{name}.{fmt}"
+
+def find_table(name: str, out_dir: Path = OUT_DIR):
+    """(path, fmt) of the newest stored copy of a table, or (None, None)."""
+    found = []
+    for fmt in FORMATS:
+        path = table_path(name, fmt, out_dir)
+        if path.exists() and (fmt == "csv" or pq is not None):
+            found.append((path.stat().st_mtime, path, fmt))
+    if not found:
+        return None, None
+    _, path, fmt = max(found)
+    return path, fmt
+
+def _is_missing(v) -> bool:
+    return v is None or v is pd.NA or (isinstance(v, float) and np.isnan(v))
+
+def _text(s: pd.Series) -> pd.Series:
+    if pd.api.types.is_float_dtype(s.dtype) or (
+            s.dtype == object and pd.api.types.infer_dtype(s, skipna=True) not in ("string", "integer", "empty")):
+        # factorize() would collapse 1 / 1.0 / True and 0.0 / -0.0: one value at a time
+        return s.map(lambda v: "" if _is_missing(v) else str(v)).astype(object)
+    # values of a single type (str, int, category): one str() per distinct value
+    codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    text = np.array([str(v) for v in uniques] + [""], dtype=object)
+    return pd.Series(text[codes], index=s.index, dtype=object)
+
+def _number(s: pd.Series) -> pd.Series:
+    # parse the CSV text of each value, so conform(df) == conform(read back CSV)
+    return pd.to_numeric(_text(s).replace("", np.nan), errors="coerce")
+
+def conform(df: pd.DataFrame, name: str) -> pd.DataFrame:
+    """Cast a frame to the table schema; values that do not fit become null."""
+    out = {}
+    for col, kind in SCHEMAS[name].items():
+        s = df[col] if col in df else pd.Series([""] * len(df), index=df.index, dtype=object)
+        if kind == "int":
+            num = _number(s)
+            num = num.where(num == num.round())
+            out[col] = num.astype("Int64")
+        elif kind in ("float", "number"):
+            out[col] = _number(s).astype("float64")
+        elif kind == "category":
+            out[col] = _text(s).replace("", np.nan).astype("category")
+        else:
+            # empty text is a missing value; to_text() turns it back into ""
+            out[col] = _text(s).replace("", np.nan)
+    return pd.DataFrame(out, index=df.index)
+
+def not_int_text(s: pd.Series) -> pd.Series:
+    """Text of the values conform() turns into null in an "int" column (12.5, "abc"); "" elsewhere."""
+    text = _text(s)
+    num = pd.to_numeric(text.replace("", np.nan), errors="coerce")
+    return text.where((text != "") & ~(num == num.round()).to_numpy(), "")
+
+def _float_text(v, whole_as_int=False):
+    if pd.isna(v):
+        return ""
+    if whole_as_int and float(v).is_integer():
+        return str(int(v))
+    return str(v)
+
+def to_text(df: pd.DataFrame, name: str = None) -> pd.DataFrame:
+    """Values as the strings to_csv writes for them ("" for missing)."""
+    kinds = SCHEMAS.get(name, {})
+    out = {}
+    for col in df.columns:
+        s = df[col]
+        if pd.api.types.is_float_dtype(s.dtype):
+            whole = kinds.get(col) == "number"
+            out[col] = s.astype(object).map(lambda v: _float_text(v, whole))
+        else:
+            out[col] = _text(s)
+    return pd.DataFrame(out, index=df.index)
+
+def _count_text(col: str):
+    return [col], lambda df: not_int_text(df[col])
+
+def _ingredient_key(df: pd.DataFrame) -> pd.Series:
+    # the key of a canonical name is the key of every raw name it stands for
+    return catalog.canonical_names(df["ingredient_name"])[0]
+
+def _base_quantities(df: pd.DataFrame) -> tuple:
+    return catalog.base_quantities(_number(df["qty_numeric"]), df["unit"])
+
+# Parquet-only columns, recomputed when a table is read back from its CSV:
+# column -> (CSV columns it is computed from, function of those columns)
+CSV_DERIVED = {
+    "recipe": {f"{col}_text": _count_text(col) for col in ("servings", "prep_time_minutes", "cook_time_minutes")},
+    "ingredients": {
+        "ingredient_key": (["ingredient_name"], _ingredient_key),
+        "qty_base": (["qty_numeric", "unit"], lambda df: _base_quantities(df)[0]),
+        "base_unit": (["qty_numeric", "unit"], lambda df: _base_quantities(df)[1]),
+    },
+}
+
+def _csv_columns(path: Path, name: str, columns):
+    """(columns to read from a CSV, columns of the frame it is read into)."""
+    available = list(_read_csv(path, name, nrows=0).columns)
+    derived = CSV_DERIVED.get(name, {})
+    if columns is None:
+        known = list(SCHEMAS.get(name, {}))
+        columns = available + [c for c in derived if c not in available]
+        columns = [c for c in known if c in columns] + [c for c in columns if c not in known]
+    out = [c for c in columns if c in available or c in derived]
+    read = [c for c in out if c in available]
+    for col in out:
+        if col not in available:
+            read += [c for c in derived[col][0] if c not in read]
+    return read, out
+
+def _derive(chunk: pd.DataFrame, name: str, columns) -> pd.DataFrame:
+    # chunk holds the CSV text; derived columns are added as the text the CSV would hold
+    for col in columns:
+        if col not in chunk:
+            values = CSV_DERIVED[name][col][1](chunk).set_axis(chunk.index)
+            chunk[col] = to_text(values.to_frame(col), name)[col]
+    return chunk[columns]
+
+def _decategorize(df: pd.DataFrame) -> pd.DataFrame:
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+    return df
+
+def _csv_frame(chunk: pd.DataFrame, name: str, as_text: bool, categorical: bool):
+    if as_text or name not in SCHEMAS:
+        return chunk
+    typed = conform(chunk, name)
+    keep = [c for c in chunk.columns if c in typed.columns]
+    typed = typed[keep]
+    return typed if categorical else _decategorize(typed)
+
+def _arrow_frame(table, name: str, as_text: bool, categorical: bool):
+    df = table.to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+    if as_text:
+        return to_text(df, name)
+    return df if categorical else _decategorize(df)
+
+def _read_csv(path: Path, name: str, **kwargs):
+    try:
+        return pd.read_csv(path, dtype=str, keep_default_na=False, na_values=[""], **kwargs)
+    except pd.errors.EmptyDataError:
+        # transform writes a bare newline for a table with no rows
+        empty = pd.DataFrame(columns=list(SCHEMAS.get(name, {})), dtype=str)
+        return iter([empty]) if "chunksize" in kwargs else empty
+
+def _projection(path: Path, name: str, columns):
+    if columns is None:
+        return None
+    available = pq.read_schema(path).names
+    return [c for c in columns if c in available]
+
+def load_table(name: str, columns=None, as_text: bool = False, categorical: bool = False,
+               out_dir: Path = OUT_DIR) -> pd.DataFrame:
+    """Load one table, optionally only some columns (missing ones are skipped)."""
+    path, fmt = find_table(name, out_dir)
+    if path is None:
+        raise FileNotFoundError(f"Required table not found: {table_path(name, 'csv', out_dir)}")
+    if fmt == "parquet":
+        cols = _projection(path, name, columns)
+        return _arrow_frame(pq.read_table(path, columns=cols), name, as_text, categorical)
+    read, cols = _csv_columns(path, name, columns)
+    chunk = _read_csv(path, name, usecols=read).fillna("")
+    return _csv_frame(_derive(chunk, name, cols), name, as_text, categorical)
+
+def from_frame(df: pd.DataFrame, name: str, columns=None, as_text: bool = False,
+               categorical: bool = False) -> pd.DataFrame:
+    """What load_table would return once df (a transform output) is stored, without the round trip."""
+    typed = conform(df, name)
+    if columns is not None:
+        typed = typed[[c for c in columns if c in typed.columns]]
+    if as_text:
+        return to_text(typed, name)
+    return typed if categorical else _decategorize(typed)
+
+def iter_table(name: str, columns=None, chunk_rows: int = 50_000, as_text: bool = False,
+               categorical: bool = False, out_dir: Path = OUT_DIR, start_row: int = 0, stop_row: int = None):
+    """Same as load_table but yields frames of at most chunk_rows rows.
+
+    Only rows start_row <= i < stop_row are read (Parquet row groups outside
+    the range are skipped).
+    """
+    path, fmt = find_table(name, out_dir)
+    if path is None:
+        return
+    left = None if stop_row is None else max(stop_row - start_row, 0)
+    if left == 0:
+        return
+    if fmt == "parquet":
+        cols = _projection(path, name, columns)
+        pf = pq.ParquetFile(path)
+        groups, skip, first = [], start_row, 0
+        for i in range(pf.num_row_groups):
+            n = pf.metadata.row_group(i).num_rows
+            if first + n > start_row and (stop_row is None or first < stop_row):
+                groups.append(i)
+            elif not groups:
+                skip -= n
+            first += n
+        if not groups:
+            return
+        for batch in pf.iter_batches(batch_size=chunk_rows, columns=cols, row_groups=groups):
+            if skip:
+                dropped = min(skip, batch.num_rows)
+                batch, skip = batch.slice(dropped), skip - dropped
+                if batch.num_rows == 0:
+                    continue
+            if left is not None:
+                batch = batch.slice(0, left)
+                left -= batch.num_rows
+            yield _arrow_frame(pa.Table.from_batches([batch]), name, as_text, categorical)
+            if left == 0:
+                return
+        return
+    read, cols = _csv_columns(path, name, columns)
+    skiprows = range(1, start_row + 1) if start_row else None
+    for chunk in _read_csv(path, name, usecols=read, chunksize=chunk_rows, skiprows=skiprows, nrows=left):
+        yield _csv_frame(_derive(chunk.fillna(""), name, cols), name, as_text, categorical)
+
+def count_rows(name: str, out_dir: Path = OUT_DIR) -> int:
+    """Rows in the stored table (Parquet: from the footer; CSV: one column is parsed)."""
+    path, fmt = find_table(name, out_dir)
+    if path is None:
+        return 0
+    if fmt == "parquet":
+        return pq.ParquetFile(path).metadata.num_rows
+    return sum(len(chunk) for chunk in _read_csv(path, name, usecols=[0], chunksize=1_000_000))
+
+def chunk_rows_for(name: str, max_memory_mb: float, columns=None, out_dir: Path = OUT_DIR,
+                   working_copies: int = 4) -> int:
+    """Rows per iter_table chunk so a chunk and its working copies fit in max_memory_mb.
+
+    Bytes per row are measured on the first rows of the stored table.
+    """
+    sample = next(iter_table(name, columns, chunk_rows=10_000, out_dir=out_dir), None)
+    if sample is None or sample.empty:
+        return 50_000
+    per_row = sample.memory_usage(deep=True, index=False).sum() / len(sample)
+    return max(1_000, int(max_memory_mb * 2**20 / (per_row * working_copies)))
+
+class TableWriter:
+    """Writes a table in chunks to every requested format; close() swaps the files in."""
+
+    def __init__(self, name: str, formats=DEFAULT_FORMATS, out_dir: Path = OUT_DIR):
+        formats = tuple(formats)
+        if "parquet" in formats and pq is None:
+            logging.warning("pyarrow not installed; writing %s as CSV only", name)
+            formats = tuple(f for f in formats if f != "parquet") or ("csv",)
+        self.name = name
+        self.formats = formats
+        self.paths = {fmt: table_path(name, fmt, out_dir) for fmt in formats}
+        self.tmp = {fmt: p.with_name(p.name + ".tmp") for fmt, p in self.paths.items()}
+        self.rows = 0
+        self._csv = open(self.tmp["csv"], "w", encoding="utf-8", newline="") if "csv" in formats else None
+        self._csv_columns = CSV_COLUMNS.get(name)
+        self._parquet = None
+        self._wrote_csv = False
+
+    def write(self, df: pd.DataFrame):
+        """df is the transform output (object columns, no NaN)."""
+        if self._csv is not None and len(df):
+            csv = df[[c for c in self._csv_columns if c in df]] if self._csv_columns else df
+            csv.to_csv(self._csv, index=False, header=not self._wrote_csv)
+            self._wrote_csv = True
+        if "parquet" in self.formats and len(df):
+            typed = conform(df, self.name)
+            table = pa.Table.from_pandas(typed, schema=arrow_schema(self.name), preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.tmp["parquet"], arrow_schema(self.name),
+                                                 compression="zstd")
+            self._parquet.write_table(table)
+        self.rows += len(df)
+
+    def close(self):
+        if self._csv is not None:
+            if not self._wrote_csv:
+                # same as pd.DataFrame().to_csv(): no rows, no header
+                self._csv.write("\n")
+            self._csv.close()
+        if "parquet" in self.formats:
+            if self._parquet is None:
+                pq.write_table(arrow_schema(self.name).empty_table(), self.tmp["parquet"])
+            else:
+                self._parquet.close()
+        for fmt, path in self.paths.items():
+            os.replace(self.tmp[fmt], path)
+        return self.rows
+
+def write_table(df: pd.DataFrame, name: str, formats=DEFAULT_FORMATS, out_dir: Path = OUT_DIR):
+    writer = TableWriter(name, formats, out_dir)
+    writer.write(df)
+    return writer.close()
@@ -1,44 +1,139 @@
 # Project/etl/transform_etl.py
 """
-Transform exported Firestore JSON (Project/data/*.json) into normalized CSVs:
- - Project/output_csv/recipe.csv
- - Project/output_csv/ingredients.csv
- - Project/output_csv/steps.csv
- - Project/output_csv/interactions.csv
+Transform exported Firestore JSON (Project/data/*.json, *.ndjson or
+*.ndjson.gz) into normalized tables (Parquet, and/or CSV with --format):
+ - Project/output_csv/recipe.parquet|csv
+ - Project/output_csv/ingredients.parquet|csv
+ - Project/output_csv/steps.parquet|csv
+ - Project/output_csv/users.parquet|csv
+ - Project/output_csv/interactions.parquet|csv
 
-Usage: python transform_etl.py
+plus Project/output_csv/changes/<table>.csv with only the rows inserted,
+updated or deleted since the previous run (column "change"), and
+changes/rewrites.json counting, per table, the runs that updated or
+deleted rows (so a consumer that skipped runs still sees it missed one).
+
+Usage: python transform_etl.py [--format parquet|csv|both] [--db] [--profile]
+
+--db also (re)loads the tables into the embedded SQLite database
+(Project/output_csv/pipeline.db, see sql_store.py) for sql_analytics.py.
+
+Each export file and each table write is measured (metrics.py); the
+metrics go to Project/metrics/transform.json and transform.prom.
+
+transform() runs the whole step and returns the recipe / ingredients /
+steps / users frames, which pipeline.py hands to the later stages.
+transform_source() transforms a single export file (SOURCES), so
+pipeline.py can skip the ones that did not change.
+
+Records are flattened once into DataFrames and every field is resolved per
+column (alias lists, quantity regexes, bulk ISO-8601 timestamp parsing).
+The per-record helpers (safe_get, normalize_ingredient, transform_interaction)
+are kept as the reference implementation the columnar path must match.
+
+Ingredient names and units are canonicalized through the catalog in
+ingredients.py: ingredient_name is the canonical name (raw_name keeps the
+exported one), ingredient_key its integer key, and qty_base / base_unit the
+quantity in ml, g or pcs where the unit is known.
+
+Surrogate IDs are content hashes, so unchanged rows keep their IDs:
+ - ING_ = (recipe_id, position, raw_name)
+ - STEP_ = (recipe_id, step_order, step_text)
+ - R_ / U_ / I_ (only when the document has no id) = the document's content
 """
 
+from __future__ import annotations
+
+import argparse
+import gzip
 import json
+import os
 import re
-import uuid
+from itertools import chain
 from pathlib import Path
 import logging
-from dateutil import parser as dateparser
-import pandas as pd
+
+import ingredients as catalog
+import metrics
+import sql_store
+import table_store as tables
+from lazy import lazy
+
+dateparser = lazy("dateutil.parser")
+np = lazy("numpy")
+pd = lazy("pandas")
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
 PROJECT_DIR = Path(__file__).resolve().parents[1]
 DATA_DIR = PROJECT_DIR / "data"
 OUT_DIR = PROJECT_DIR / "output_csv"
-OUT_DIR.mkdir(parents=True, exist_ok=True)
+CHANGES_DIR = OUT_DIR / "changes"
+REWRITES_JSON = CHANGES_DIR / "rewrites.json"
 
-RECIPES_FILE = DATA_DIR / "recipes.json"
-USERS_FILE = DATA_DIR / "users.json"
-INTERACTIONS_FILE = DATA_DIR / "user_interactions.json"
+# interactions are transformed and written in chunks of this many rows
+CHUNK_ROWS = 50_000
 
-def load_json(path: Path):
+# export file stem -> tables transformed from it
+SOURCES = {
+    "recipes": ["recipe", "ingredients", "steps"],
+    "users": ["users"],
+    "user_interactions": ["interactions"],
+}
+# primary key of each table (change detection)
+KEYS = {"recipe": "recipe_id", "ingredients": "ingredient_id", "steps": "step_id", "users": "user_id",
+        "interactions": "interaction_id"}
+
+# field aliases, in priority order
+RECIPE_ID_KEYS = ["recipe_id", "id", "_doc_id"]
+INGREDIENT_KEYS = ["ingredients", "ingredient_list", "ingredient"]
+STEP_KEYS = ["steps", "instructions", "method", "directions"]
+ING_NAME_KEYS = ["name", "ingredient_name", "item", "label"]
+ING_QTY_KEYS = ["qty", "quantity", "qty_numeric", "amount", "qty_text"]
+ING_UNIT_KEYS = ["unit", "units", "measure"]
+
+ING_SPLIT_RE = r"[;,]\s*"
+STEP_SPLIT_RE = r"[;\n]|(?<=[.!?])\s+"
+QTY_RE = r"([\d.]+)"
+ING_TEXT_RE = r"^(\d+(\.\d+)?)(?:\s+)([^\s]+)(?:\s+)(.+)$"
+
+# ISO-8601 strings handled without dateutil; anything else falls back to parse_iso
+ISO_FAST_RE = r"^(\d{4}-\d{2}-\d{2}T(?:[01]\d|2[0-3]):[0-5]\d:[0-5]\d)(?:\.(\d{1,6}))?(Z|[+-](?:[01]\d|2[0-3]):[0-5]\d)?$"
+
+def resolve_input(stem: str) -> Path:
+    # export_firestore.py may have written any of these; use the newest
+    candidates = [DATA_DIR / f"{stem}{ext}" for ext in (".json", ".ndjson", ".ndjson.gz")]
+    existing = [p for p in candidates if p.exists()]
+    if not existing:
+        return candidates[0]
+    return max(existing, key=lambda p: p.stat().st_mtime)
+
+def iter_json(path: Path):
+    """Yield records from a JSON array/object file or an (optionally gzipped) NDJSON file."""
     if not path.exists():
         logging.warning("Not found: %s (returning empty list)", path)
-        return []
+        return
+    if path.name.endswith((".ndjson", ".ndjson.gz")):
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for lineno, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except Exception as e:
+                    logging.error("Skipping bad line %d in %s: %s", lineno, path, e)
+        return
     with open(path, "r", encoding="utf-8") as f:
         try:
             data = json.load(f)
-            return data if isinstance(data, list) else [data]
         except Exception as e:
             logging.error("Failed to parse JSON %s: %s", path, e)
-            return []
+            return
+    yield from (data if isinstance(data, list) else [data])
+
+def load_json(path: Path):
+    return list(iter_json(path))
 
 def safe_get(d, keys, default=""):
     if not isinstance(d, dict):
@@ -57,7 +152,15 @@ def parse_iso(dt):
         return str(dt)
 
 def normalize_ingredient(item):
-    # return dict: name, qty_numeric (float), unit, qty_text
+    # return dict: name (canonical), raw_name, ingredient_key, qty_numeric (float), unit, qty_text,
+    # qty_base, base_unit
+    out = parse_ingredient(item)
+    out["raw_name"] = out["name"]
+    out["ingredient_key"], out["name"] = catalog.canonical(out["raw_name"])
+    out["qty_base"], out["base_unit"] = catalog.to_base(out["qty_numeric"], out["unit"])
+    return out
+
+def parse_ingredient(item):
     out = {"name": "", "qty_numeric": 0.0, "unit": "", "qty_text": ""}
     if isinstance(item, dict):
         out["name"] = safe_get(item, ["name", "ingredient_name", "item", "label"], "") or ""
@@ -92,79 +195,424 @@ def normalize_ingredient(item):
         return out
     return out
 
-# Load
-recipes_raw = load_json(RECIPES_FILE)
-users_raw = load_json(USERS_FILE)
-inter_raw = load_json(INTERACTIONS_FILE)
-logging.info("Loaded: %d recipes, %d users, %d interactions", len(recipes_raw), len(users_raw), len(inter_raw))
-
-# Transform recipes / ingredients / steps
-recipes_rows = []
-ingredients_rows = []
-steps_rows = []
-
-for r in recipes_raw:
-    rid = safe_get(r, ["recipe_id", "id", "_doc_id"], "") or ("R_" + uuid.uuid4().hex[:8])
-    name = safe_get(r, ["name", "title"], "")
-    recipes_rows.append({
-        "recipe_id": rid,
-        "name": name,
-        "description": safe_get(r, ["description", "desc"], ""),
-        "servings": safe_get(r, ["servings", "serves"], 0) or 0,
-        "prep_time_minutes": safe_get(r, ["prep_time_minutes", "prep_time", "prep_minutes"], 0) or 0,
-        "cook_time_minutes": safe_get(r, ["cook_time_minutes", "cook_time", "cook_minutes"], 0) or 0,
-        "difficulty": safe_get(r, ["difficulty", "level"], ""),
-        "cuisine": safe_get(r, ["cuisine", "category"], ""),
-        "created_at": parse_iso(safe_get(r, ["created_at", "createdAt"], ""))
-    })
-
-    raw_ing = safe_get(r, ["ingredients", "ingredient_list", "ingredient"], [])
-    if isinstance(raw_ing, str):
-        raw_ing = [x.strip() for x in re.split(r"[;,]\s*", raw_ing) if x.strip()]
-    for ing in raw_ing or []:
-        n = normalize_ingredient(ing)
-        ingredients_rows.append({
-            "ingredient_id": "ING_" + uuid.uuid4().hex[:8],
-            "recipe_id": rid,
-            "ingredient_name": n["name"],
-            "qty_numeric": n["qty_numeric"],
-            "unit": n["unit"],
-            "qty_text": n["qty_text"]
-        })
-
-    raw_steps = safe_get(r, ["steps", "instructions", "method", "directions"], [])
-    if isinstance(raw_steps, str):
-        raw_steps = [s.strip() for s in re.split(r"[;\n]|(?<=[.!?])\s+", raw_steps) if s.strip()]
-    for i, st in enumerate(raw_steps or [], start=1):
-        steps_rows.append({
-            "step_id": "STEP_" + uuid.uuid4().hex[:8],
-            "recipe_id": rid,
-            "step_order": i,
-            "step_text": str(st).strip()
-        })
-
-# Transform interactions
-inter_rows = []
-for it in inter_raw:
-    inter_rows.append({
-        "interaction_id": safe_get(it, ["interaction_id", "id", "_doc_id"], "I_" + uuid.uuid4().hex[:8]),
+def transform_interaction(it):
+    return {
+        "interaction_id": safe_get(it, ["interaction_id", "id", "_doc_id"], None)
+                          or document_ids("I_", [it])[0],
         "user_id": safe_get(it, ["user_id", "user", "uid"], ""),
         "recipe_id": safe_get(it, ["recipe_id", "recipe"], ""),
         "type": safe_get(it, ["type", "action", "interaction_type"], ""),
         "rating": safe_get(it, ["rating", "score"], "") if safe_get(it, ["type"], "") == "cook" else "",
         "timestamp": parse_iso(safe_get(it, ["timestamp", "time", "created_at"], ""))
+    }
+
+# --- columnar transform ---
+
+def flatten(records) -> pd.DataFrame:
+    # one object column per raw key; ints stay ints, missing keys become NaN
+    return pd.DataFrame([r if isinstance(r, dict) else {} for r in records], dtype=object)
+
+def coalesce(frame: pd.DataFrame, keys, default=""):
+    """Column-wise safe_get: first alias that is present and not None/"NaN"."""
+    out = pd.Series([default] * len(frame), index=frame.index, dtype=object)
+    for k in reversed(keys):
+        if k in frame:
+            col = frame[k]
+            out = col.where(col.notna() & (col != "NaN"), out)
+    return out
+
+def or_default(s: pd.Series, default):
+    # vectorized `value or default`
+    return s.where(s.map(bool, na_action=None).astype(bool), default)
+
+def to_float(s: pd.Series) -> pd.Series:
+    # float() semantics for regex-extracted numbers; unparseable -> 0.0
+    out = pd.to_numeric(s, errors="coerce")
+    odd = out.isna() & s.notna()
+    if odd.any():
+        def _float(v):
+            try:
+                return float(v)
+            except Exception:
+                return 0.0
+        out[odd] = s[odd].map(_float)
+    return out.fillna(0.0).astype(float)
+
+def parse_iso_series(values) -> pd.Series:
+    """Vectorized parse_iso: regex fast path for ISO-8601, dateutil for the rest."""
+    s = pd.Series(values, dtype=object).reset_index(drop=True)
+    out = pd.Series([""] * len(s), dtype=object)
+    present = s.map(bool).astype(bool)
+    is_str = s.map(lambda v: isinstance(v, str)).astype(bool)
+    fast = present & is_str
+    parts = s[fast].astype(str).str.extract(ISO_FAST_RE)
+    matched = parts[0].notna()
+    # reject impossible calendar values (month 13, second 60, ...)
+    valid = pd.to_datetime(parts.loc[matched, 0], format="%Y-%m-%dT%H:%M:%S", errors="coerce").notna()
+    ok = matched.copy()
+    ok[matched] = valid
+    parts = parts[ok]
+    frac = parts[1].fillna("").str.ljust(6, "0")
+    frac = ("." + frac).where(frac.str.strip("0") != "", "")
+    tz = parts[2].fillna("").replace({"Z": "+00:00", "-00:00": "+00:00"})
+    out[parts.index] = parts[0] + frac + tz
+
+    slow = present & ~out.index.isin(parts.index)
+    if slow.any():
+        uniques = {v: parse_iso(v) for v in pd.unique(s[slow & is_str])}
+        out[slow & is_str] = s[slow & is_str].map(uniques)
+        out[slow & ~is_str] = s[slow & ~is_str].map(parse_iso)
+    return out
+
+def hash_rows(frame: pd.DataFrame) -> np.ndarray:
+    # 64-bit SipHash of each row's string form (fixed key, stable across runs)
+    if frame.shape[1] == 0:
+        return np.zeros(len(frame), dtype=np.uint64)
+    return pd.util.hash_pandas_object(frame.astype(str), index=False).to_numpy()
+
+def content_ids(prefix: str, frame: pd.DataFrame):
+    return [f"{prefix}{h:016x}" for h in hash_rows(frame)]
+
+def document_ids(prefix: str, docs) -> list:
+    # each document hashed on its own (sorted keys), whatever else is in the batch
+    return content_ids(prefix, pd.DataFrame({"doc": [json.dumps(d, sort_keys=True, default=str) for d in docs]}))
+
+def to_frame(columns: dict) -> pd.DataFrame:
+    # same dtype inference + NaN handling as pd.DataFrame(list_of_row_dicts)
+    n = len(next(iter(columns.values())))
+    if n == 0:
+        return pd.DataFrame()
+    data = {}
+    for name, col in columns.items():
+        arr = np.empty(n, dtype=object)
+        arr[:] = list(col) if not isinstance(col, (pd.Series, np.ndarray)) else np.asarray(col, dtype=object)
+        data[name] = arr
+    return pd.DataFrame(data).infer_objects().fillna("").astype(object)
+
+def as_items(value, split_re):
+    # what `for x in (value or [])` would iterate over in the row-wise code
+    if isinstance(value, str):
+        return [x.strip() for x in re.split(split_re, value) if x.strip()]
+    if isinstance(value, (list, dict)):
+        return list(value)
+    return []
+
+def explode_items(recipe_ids: pd.Series, raw: pd.Series, split_re):
+    items = raw.map(lambda v: as_items(v, split_re))
+    lens = items.map(len).to_numpy(dtype=np.int64)
+    rid = np.repeat(recipe_ids.to_numpy(dtype=object), lens)
+    flat = pd.Series(list(chain.from_iterable(items)), dtype=object)
+    # 1-based position within each recipe
+    starts = np.repeat(np.cumsum(lens) - lens, lens)
+    order = np.arange(len(flat)) - starts + 1
+    return rid, flat, order
+
+def normalize_ingredients(items: pd.Series) -> dict:
+    """Vectorized normalize_ingredient over a Series of raw ingredient items."""
+    n = len(items)
+    name = pd.Series([""] * n, dtype=object)
+    qty_numeric = pd.Series(np.zeros(n), dtype=float)
+    unit = pd.Series([""] * n, dtype=object)
+    qty_text = pd.Series([""] * n, dtype=object)
+
+    kind = items.map(type)
+    is_dict = (kind == dict).to_numpy()
+    is_str = (kind == str).to_numpy()
+
+    if is_dict.any():
+        idx = np.flatnonzero(is_dict)
+        sub = flatten(items[is_dict].tolist())
+        name[idx] = or_default(coalesce(sub, ING_NAME_KEYS, ""), "").to_numpy()
+        unit[idx] = or_default(coalesce(sub, ING_UNIT_KEYS, ""), "").to_numpy()
+        qty = coalesce(sub, ING_QTY_KEYS, "")
+        qkind = qty.map(type)
+        num = qkind.isin([int, float, bool]).to_numpy()
+        txt = (qkind == str).to_numpy()
+        qty_numeric[idx[num]] = qty[num].astype(float).to_numpy()
+        if txt.any():
+            q = qty[txt].astype(str)
+            found = q.str.extract(QTY_RE)[0]
+            qty_numeric[idx[txt]] = to_float(found).where(found.notna(), 0.0).to_numpy()
+            qty_text[idx[txt]] = q.to_numpy()
+
+    if is_str.any():
+        idx = np.flatnonzero(is_str)
+        text = items[is_str].astype(str).str.strip()
+        m = text.str.extract(ING_TEXT_RE)
+        hit = m[0].notna().to_numpy()
+        qty_text[idx] = text.to_numpy()
+        name[idx] = text.to_numpy()
+        if hit.any():
+            qty_numeric[idx[hit]] = to_float(m.loc[hit, 0]).to_numpy()
+            unit[idx[hit]] = m.loc[hit, 2].to_numpy()
+            name[idx[hit]] = m.loc[hit, 3].to_numpy()
+
+    key, canonical_name = catalog.canonical_names(name)
+    qty_base, base_unit = catalog.base_quantities(qty_numeric, unit)
+    return {"name": canonical_name, "raw_name": name, "ingredient_key": key, "qty_numeric": qty_numeric,
+            "unit": unit, "qty_text": qty_text, "qty_base": qty_base, "base_unit": base_unit}
+
+def transform_recipes(records):
+    """Recipes, ingredients and steps tables from raw recipe documents."""
+    frame = flatten(records)
+    rid = coalesce(frame, RECIPE_ID_KEYS, "")
+    missing = ~rid.map(bool).astype(bool)
+    if missing.any():
+        rid[missing] = document_ids("R_", [r for r, m in zip(records, missing) if m])
+
+    servings = or_default(coalesce(frame, ["servings", "serves"], 0), 0)
+    prep = or_default(coalesce(frame, ["prep_time_minutes", "prep_time", "prep_minutes"], 0), 0)
+    cook = or_default(coalesce(frame, ["cook_time_minutes", "cook_time", "cook_minutes"], 0), 0)
+    df_recipes = to_frame({
+        "recipe_id": rid,
+        "name": coalesce(frame, ["name", "title"]),
+        "description": coalesce(frame, ["description", "desc"]),
+        "servings": servings,
+        "prep_time_minutes": prep,
+        "cook_time_minutes": cook,
+        "difficulty": coalesce(frame, ["difficulty", "level"]),
+        "cuisine": coalesce(frame, ["cuisine", "category"]),
+        "created_at": parse_iso_series(coalesce(frame, ["created_at", "createdAt"])),
+        # values the int columns cannot hold (12.5, "abc") are kept as text
+        "servings_text": tables.not_int_text(servings),
+        "prep_time_minutes_text": tables.not_int_text(prep),
+        "cook_time_minutes_text": tables.not_int_text(cook),
+    })
+
+    ing_rid, ing_items, ing_pos = explode_items(rid, coalesce(frame, INGREDIENT_KEYS, None), ING_SPLIT_RE)
+    n = normalize_ingredients(ing_items)
+    df_ingredients = to_frame({
+        "ingredient_id": content_ids("ING_", pd.DataFrame(
+            {"recipe_id": ing_rid, "position": ing_pos, "name": n["raw_name"].to_numpy()})),
+        "recipe_id": ing_rid,
+        "ingredient_name": n["name"],
+        "qty_numeric": n["qty_numeric"],
+        "unit": n["unit"],
+        "qty_text": n["qty_text"],
+        "ingredient_key": n["ingredient_key"],
+        "raw_name": n["raw_name"],
+        "qty_base": n["qty_base"],
+        "base_unit": n["base_unit"],
+    })
+
+    step_rid, step_items, step_order = explode_items(rid, coalesce(frame, STEP_KEYS, None), STEP_SPLIT_RE)
+    step_text = step_items.map(str).str.strip()
+    df_steps = to_frame({
+        "step_id": content_ids("STEP_", pd.DataFrame(
+            {"recipe_id": step_rid, "step_order": step_order, "text": step_text.to_numpy()})),
+        "recipe_id": step_rid,
+        "step_order": step_order,
+        "step_text": step_text,
+    })
+    return df_recipes, df_ingredients, df_steps
+
+def transform_interactions(records) -> pd.DataFrame:
+    """interactions table for one batch of raw interaction documents."""
+    frame = flatten(records)
+    iid = coalesce(frame, ["interaction_id", "id", "_doc_id"], None)
+    missing = iid.isna()
+    if missing.any():
+        iid[missing] = document_ids("I_", [records[i] for i in np.flatnonzero(missing.to_numpy())])
+    is_cook = (coalesce(frame, ["type"]) == "cook").to_numpy()
+    return to_frame({
+        "interaction_id": iid,
+        "user_id": coalesce(frame, ["user_id", "user", "uid"]),
+        "recipe_id": coalesce(frame, ["recipe_id", "recipe"]),
+        "type": coalesce(frame, ["type", "action", "interaction_type"]),
+        "rating": coalesce(frame, ["rating", "score"]).where(is_cook, ""),
+        "timestamp": parse_iso_series(coalesce(frame, ["timestamp", "time", "created_at"])),
+    })
+
+def transform_users(records) -> pd.DataFrame:
+    """users table from raw user documents."""
+    frame = flatten(records)
+    uid = coalesce(frame, ["user_id", "id", "uid", "_doc_id"], "")
+    missing = ~uid.map(bool).astype(bool)
+    if missing.any():
+        uid[missing] = document_ids("U_", [r for r, m in zip(records, missing) if m])
+    return to_frame({
+        "user_id": uid,
+        "name": coalesce(frame, ["name", "display_name"]),
+        "email": coalesce(frame, ["email"]),
+        "joined_at": parse_iso_series(coalesce(frame, ["joined_at", "created_at", "createdAt"])),
     })
 
-# DataFrames & save (no NaN)
-df_recipes = pd.DataFrame(recipes_rows).fillna("").astype(object)
-df_ingredients = pd.DataFrame(ingredients_rows).fillna("").astype(object)
-df_steps = pd.DataFrame(steps_rows).fillna("").astype(object)
-df_interactions = pd.DataFrame(inter_rows).fillna("").astype(object)
+# --- change detection ---
+
+class ChangeWriter:
+    """Streams the inserted / updated / deleted rows of one table to changes/<table>.csv.
+
+    Rows are compared in their schema-conformed text form, so the previous
+    run may have been stored as Parquet or CSV.
+    """
+
+    def __init__(self, table: str, key: str, chunk_rows: int = CHUNK_ROWS):
+        self.table = table
+        self.key = key
+        self.chunk_rows = chunk_rows
+        self.counts = {"insert": 0, "update": 0, "delete": 0}
+        # previous run's row hashes, keyed by id (ids + 8 bytes/row, not the rows)
+        hashes = []
+        for chunk in self._old_chunks():
+            hashes.append(pd.Series(hash_rows(chunk), index=chunk[key].to_numpy()))
+        old = pd.concat(hashes) if hashes else pd.Series([], dtype=np.uint64)
+        self.old = old[~old.index.duplicated(keep="last")]
+        self.seen = np.zeros(len(self.old), dtype=bool)
+        CHANGES_DIR.mkdir(parents=True, exist_ok=True)
+        self.path = CHANGES_DIR / f"{table}.csv"
+        self._f = open(self.path, "w", encoding="utf-8", newline="")
+        self._header = True
+        self._columns = None
+
+    def _old_chunks(self):
+        for chunk in tables.iter_table(self.table, chunk_rows=self.chunk_rows, out_dir=OUT_DIR):
+            if self.key not in chunk:
+                logging.warning("Stored %s has no %s column; treating every row as new", self.table, self.key)
+                return
+            yield tables.to_text(chunk, self.table)
+
+    def _emit(self, rows: pd.DataFrame, change: str):
+        if rows.empty:
+            return
+        rows.assign(change=change).to_csv(self._f, index=False, header=self._header)
+        self._header = False
+        self.counts[change] += len(rows)
+
+    def add(self, df: pd.DataFrame):
+        # compare one chunk of the new table against the previous run
+        if df.empty:
+            return
+        self._columns = list(df.columns)
+        text = tables.to_text(tables.conform(df, self.table), self.table)
+        pos = self.old.index.get_indexer(text[self.key].to_numpy()) if len(self.old) else np.full(len(df), -1)
+        known = pos >= 0
+        changed = np.zeros(len(df), dtype=bool)
+        changed[known] = hash_rows(text[known]) != self.old.to_numpy()[pos[known]]
+        self.seen[pos[known]] = True
+        self._emit(df[~known], "insert")
+        self._emit(df[changed], "update")
+
+    def close(self):
+        # rows of the previous run that were not seen again were deleted
+        if (~self.seen).any():
+            gone = set(self.old.index[~self.seen])
+            for chunk in self._old_chunks():
+                self._emit(chunk[chunk[self.key].isin(gone)], "delete")
+        if self._header:
+            pd.DataFrame(columns=(self._columns or []) + ["change"]).to_csv(self._f, index=False)
+        self._f.close()
+        if self.counts["update"] or self.counts["delete"]:
+            count_rewrite(self.table)
+        logging.info("Changes %s: %d inserted, %d updated, %d deleted → %s", self.table,
+                     self.counts["insert"], self.counts["update"], self.counts["delete"], self.path)
+        return self.counts
+
+def count_rewrite(table: str):
+    """Add one to the runs that updated or deleted rows of table (changes/rewrites.json)."""
+    try:
+        with open(REWRITES_JSON, encoding="utf-8") as f:
+            counts = json.load(f)
+    except FileNotFoundError:
+        counts = {}
+    counts[table] = counts.get(table, 0) + 1
+    tmp = REWRITES_JSON.with_name(REWRITES_JSON.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(counts, f, indent=2)
+    os.replace(tmp, REWRITES_JSON)
+
+def write_table(df: pd.DataFrame, name: str, key: str, formats=tables.DEFAULT_FORMATS):
+    with metrics.stage(f"transform.{name}.write", rows_in=len(df)) as m:
+        # diff first: the previous output stays in place until the writer swaps files
+        changes = ChangeWriter(name, key)
+        changes.add(df)
+        changes.close()
+        tables.write_table(df, name, formats, out_dir=OUT_DIR)
+        m["rows_out"] = len(df)
+
+def write_interactions(records, formats=tables.DEFAULT_FORMATS, chunk_rows: int = CHUNK_ROWS):
+    # constant memory: transform + append one chunk at a time; the previous
+    # output stays in place until the end so deleted rows can be read from it
+    changes = ChangeWriter("interactions", "interaction_id", chunk_rows)
+    writer = tables.TableWriter("interactions", formats, out_dir=OUT_DIR)
+    chunk = []
+    for it in records:
+        chunk.append(it)
+        if len(chunk) >= chunk_rows:
+            df = transform_interactions(chunk)
+            writer.write(df)
+            changes.add(df)
+            chunk = []
+    if chunk:
+        df = transform_interactions(chunk)
+        writer.write(df)
+        changes.add(df)
+    changes.close()
+    return writer.close()
+
+def clear_changes(table: str):
+    """Empty changes/<table>.csv (header only) for a table that was not re-transformed."""
+    path = CHANGES_DIR / f"{table}.csv"
+    try:
+        with open(path, encoding="utf-8") as f:
+            header, more = f.readline(), f.readline()
+    except FileNotFoundError:
+        header, more = ",".join(list(tables.SCHEMAS[table]) + ["change"]) + "\n", True
+    if more:
+        CHANGES_DIR.mkdir(parents=True, exist_ok=True)
+        path.write_text(header, encoding="utf-8")
+
+def transform_source(source: str, formats=tables.DEFAULT_FORMATS) -> dict:
+    """Transform one export file (a SOURCES key) and write its tables.
+
+    Returns {table: frame} for recipes and users; interactions are only
+    streamed to disk, so their source returns {}.
+    """
+    # resolved per call: the export may have run since this module was imported
+    path = resolve_input(source)
+    with metrics.stage(f"transform.{source}") as m:
+        if source == "user_interactions":
+            n = write_interactions(iter_json(path), formats)
+            m["rows_in"] = m["rows_out"] = n
+            logging.info("Wrote %s interactions (%d rows) to %s", "/".join(formats), n, OUT_DIR)
+            return {}
+        with metrics.stage(f"transform.{source}.parse") as parse:
+            raw = load_json(path)
+            if source == "recipes":
+                frames = dict(zip(SOURCES[source], transform_recipes(raw)))
+            else:
+                frames = {"users": transform_users(raw)}
+            parse["rows_in"], parse["rows_out"] = len(raw), sum(len(df) for df in frames.values())
+        # save (no NaN)
+        for name, df in frames.items():
+            write_table(df, name, KEYS[name], formats)
+        m["rows_in"], m["rows_out"] = parse["rows_in"], parse["rows_out"]
+        logging.info("Wrote %s %s to %s (%d %s)", "/".join(formats), ", ".join(frames), OUT_DIR, len(raw), source)
+    return frames
+
+def transform(formats=tables.DEFAULT_FORMATS, db: bool = False) -> dict:
+    """Transform the newest export and write the tables.
+
+    Returns the recipe / ingredients / steps / users frames for later stages
+    to use in memory; interactions are only streamed to disk.
+    """
+    # recipes and users are small and loaded whole; interactions are streamed
+    frames = {}
+    for source in SOURCES:
+        frames.update(transform_source(source, formats))
+    if db:
+        sql_store.load_database()
+    return frames
 
-df_recipes.to_csv(OUT_DIR / "recipe.csv", index=False)
-df_ingredients.to_csv(OUT_DIR / "ingredients.csv", index=False)
-df_steps.to_csv(OUT_DIR / "steps.csv", index=False)
-df_interactions.to_csv(OUT_DIR / "interactions.csv", index=False)
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Transform exported Firestore JSON into the pipeline tables")
+    ap.add_argument("--format", choices=["parquet", "csv", "both"], default=tables.DEFAULT_FORMATS[0],
+                    help="output format; csv is the compatibility output (default: %(default)s)")
+    ap.add_argument("--db", action="store_true", help="also load the tables into the SQLite database")
+    ap.add_argument("--profile", action="store_true",
+                    help="also write a cProfile / tracemalloc profile (Project/metrics/transform.prof)")
+    args = ap.parse_args(argv)
+    with metrics.run("transform", profile=args.profile), metrics.stage("transform"):
+        transform(("parquet", "csv") if args.format == "both" else (args.format,), db=args.db)
 
-logging.info("Wrote CSVs to %s (recipes=%d, ingredients=%d, steps=%d, interactions=%d)",
-             OUT_DIR, len(df_recipes), len(df_ingredients), len(df_steps), len(df_interactions))
+if __name__ == "__main__":
+    main()
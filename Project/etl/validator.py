@@ -1,142 +1,381 @@
 # Project/etl/validator.py
 """
-Validate CSV outputs in Project/output_csv/
-Usage: python validator.py
+Validate the transform outputs in Project/output_csv/ (Parquet or CSV)
+Usage: python validator.py [--samples-per-rule 100] [--full-report] [--profile]
+
+Each rule is a boolean mask over whole columns; error lists are only built
+for the rows that fail at least one rule. Cross-table rules (unknown
+recipe_id / user_id, duplicate primary keys, step_order duplicates or gaps
+within a recipe) use hash lookups against the referenced table's key index
+or one sort per table, never per-row lookups.
+
+The default report, validation_report.ndjson, holds one summary line per
+table (row counts, failures per rule) followed by the first N invalid rows
+for each rule. --full-report writes the old validation_report.json with
+every valid and invalid row instead. Both are streamed to disk.
+
+validate_tables() is the same run as a function; pipeline.py passes it the
+transform output still in memory. Each table's rules are measured
+(metrics.py, rows in = rows checked, rows out = invalid rows); the metrics
+go to Project/metrics/validate.json and validate.prom.
 """
 
-import pandas as pd
+import argparse
 import json
+import os
 from pathlib import Path
 import logging
 
+import metrics
+import table_store
+from lazy import lazy
+
+pd = lazy("pandas")
+np = lazy("numpy")
+
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
 PROJECT_DIR = Path(__file__).resolve().parents[1]
 OUT_DIR = PROJECT_DIR / "output_csv"
+REPORT_NDJSON = OUT_DIR / "validation_report.ndjson"
+REPORT_JSON = OUT_DIR / "validation_report.json"
+SAMPLES_PER_RULE = 100
+CHUNK_ROWS = 50_000
 
-if not OUT_DIR.exists():
-    logging.error("Output CSV directory not found: %s", OUT_DIR)
-    raise SystemExit(1)
-
-def read_csv_no_nan(path):
-    df = pd.read_csv(path, dtype=str, keep_default_na=False, na_values=[""])
+def read_table_no_nan(name, columns=None, frames=None):
+    # rules check the stored text, so load every value as its CSV string;
+    # a table in `frames` (transform output still in memory) is not re-read
+    if frames and name in frames:
+        df = table_store.from_frame(frames[name], name, columns, as_text=True)
+    else:
+        df = table_store.load_table(name, columns, as_text=True, out_dir=OUT_DIR)
     return df.fillna("").replace({"NaN": ""})
 
-recipes = read_csv_no_nan(OUT_DIR / "recipe.csv")
-ingredients = read_csv_no_nan(OUT_DIR / "ingredients.csv")
-steps = read_csv_no_nan(OUT_DIR / "steps.csv")
-interactions = read_csv_no_nan(OUT_DIR / "interactions.csv")
-
-report = {"recipes": {"valid": [], "invalid": []},
-          "ingredients": {"valid": [], "invalid": []},
-          "steps": {"valid": [], "invalid": []},
-          "interactions": {"valid": [], "invalid": []}}
+def load_keys(frames=None):
+    """Primary-key index of each referenced table, for the foreign-key rules."""
+    keys = {}
+    for table, col in REFERENCED.items():
+        try:
+            keys[table] = pd.Index(read_table_no_nan(table, [col], frames)[col].unique())
+        except FileNotFoundError:
+            logging.warning("No %s table in %s; skipping %s references", table, OUT_DIR, col)
+    return keys
 
+# --- per-value checks (applied once per distinct value of a column) ---
 def is_nonneg_number(s):
     try:
         return float(s) >= 0
     except:
         return False
 
-# --- validations (same rules as before) ---
-def validate_recipes():
-    for _, r in recipes.iterrows():
-        errors = []
-        if r.get("recipe_id", "") == "":
-            errors.append("Missing recipe_id")
-        if r.get("name", "") == "":
-            errors.append("Missing name")
-        diff = r.get("difficulty", "")
-        if diff == "":
-            errors.append("Missing difficulty")
-        if diff and diff not in ["Easy", "Medium", "Hard"]:
-            errors.append("Invalid difficulty")
-        for col in ["servings", "prep_time_minutes", "cook_time_minutes"]:
-            if not is_nonneg_number(r.get(col, "")):
-                errors.append(f"Invalid {col}")
-        if errors:
-            report["recipes"]["invalid"].append({**r.to_dict(), "errors": errors})
-        else:
-            report["recipes"]["valid"].append(r.to_dict())
-
-def validate_ingredients():
-    for _, r in ingredients.iterrows():
-        errors = []
-        if r.get("ingredient_id", "") == "":
-            errors.append("Missing ingredient_id")
-        if r.get("recipe_id", "") == "":
-            errors.append("Missing recipe_id")
-        if r.get("ingredient_name", "") == "":
-            errors.append("Missing ingredient_name")
-        qty = r.get("qty_numeric", "")
-        if qty != "":
-            try:
-                if float(qty) < 0:
-                    errors.append("qty_numeric negative")
-            except:
-                errors.append("qty_numeric not numeric")
-        if errors:
-            report["ingredients"]["invalid"].append({**r.to_dict(), "errors": errors})
+def qty_error(s):
+    try:
+        return "qty_numeric negative" if float(s) < 0 else None
+    except:
+        return "qty_numeric not numeric"
+
+def step_order_value(s):
+    # valid orders as int (clamped to int64), anything the step_order rules reject -> None
+    try:
+        v = int(s)
+        return min(v, 2**62) if v >= 1 else None
+    except:
+        return None
+
+def step_order_error(s):
+    try:
+        return "step_order must be >=1" if int(s) < 1 else None
+    except:
+        return "step_order not integer"
+
+def cook_rating_error(s):
+    try:
+        val = float(s)
+        return None if 1 <= val <= 5 else "rating must be 1-5"
+    except:
+        return "cook rating not numeric"
+
+class Columns:
+    """Column access for rules; a missing column reads as `default` on every row.
+
+    `keys` maps a referenced table to its primary-key index (see load_keys).
+    """
+
+    def __init__(self, df, keys=None):
+        self.df = df
+        self.keys = keys or {}
+        self._checked = {}
+
+    def text(self, col, default=""):
+        if col in self.df.columns:
+            return self.df[col]
+        return pd.Series(default, index=self.df.index, dtype=object)
+
+    def check(self, col, fn, default=""):
+        # fn runs on the distinct values only, then is broadcast back by code
+        key = (col, fn, default)
+        if key not in self._checked:
+            codes, uniques = pd.factorize(self.text(col, default))
+            results = np.array([fn(u) for u in uniques] + [None], dtype=object)
+            self._checked[key] = results[codes]
+        return self._checked[key]
+
+# --- rules: (error message, columns -> failing-row mask), in report order ---
+def missing(col):
+    return (f"Missing {col}", lambda c: c.text(col) == "")
+
+def not_in(col, allowed, message):
+    return (message, lambda c: (c.text(col) != "") & ~c.text(col).isin(allowed))
+
+def nonneg_number(col, raw=None):
+    # raw: column with the source text of values `col` could not store (null there)
+    def mask(c):
+        ok = c.check(col, is_nonneg_number).astype(bool)
+        if raw is not None:
+            ok |= (c.text(col) == "").to_numpy() & c.check(raw, is_nonneg_number).astype(bool)
+        return ~ok
+    return (f"Invalid {col}", mask)
+
+def failing(col, fn, message, default="", when=None):
+    def mask(c):
+        m = c.check(col, fn, default) == message
+        return m & when(c) if when is not None else m
+    return (message, mask)
+
+def duplicate(col):
+    # every occurrence of a key after the first
+    return (f"Duplicate {col}", lambda c: (c.text(col) != "") & c.text(col).duplicated())
+
+def unknown(col, table):
+    # hash lookup against the referenced table's keys; no-op when it was not loaded
+    def mask(c):
+        if table not in c.keys:
+            return np.zeros(len(c.df), dtype=bool)
+        values = c.text(col)
+        return (values != "") & ~values.isin(c.keys[table])
+    return (f"Unknown {col}", mask)
+
+def step_sequence(c):
+    """(duplicate, gap) masks for the valid step_orders of each recipe."""
+    if "step_sequence" not in c._checked:
+        n = len(c.df)
+        order = c.check("step_order", step_order_value, "0")
+        rid = pd.factorize(c.text("recipe_id"))[0]
+        idx = np.flatnonzero(pd.notna(order) & (c.text("recipe_id") != "").to_numpy())
+        o, r = order[idx].astype(np.int64), rid[idx]
+        # stable sort by (recipe, order): the first occurrence of a duplicate stays unflagged
+        s = np.lexsort((o, r))
+        idx, o, r = idx[s], o[s], r[s]
+        first = np.r_[True, r[1:] != r[:-1]] if len(r) else np.array([], dtype=bool)
+        prev = np.r_[0, o[:-1]] if len(o) else o
+        prev[first] = 0
+        dup, gap = np.zeros(n, dtype=bool), np.zeros(n, dtype=bool)
+        dup[idx[~first & (o == prev)]] = True
+        gap[idx[o - prev > 1]] = True
+        c._checked["step_sequence"] = (dup, gap)
+    return c._checked["step_sequence"]
+
+def is_cook(c):
+    return (c.text("type") == "cook").to_numpy()
+
+def has_qty(c):
+    return (c.text("qty_numeric") != "").to_numpy()
+
+# table -> primary key other tables point at
+REFERENCED = {"recipe": "recipe_id", "users": "user_id"}
+
+RULES = {
+    "recipes": ("recipe", [
+        missing("recipe_id"),
+        duplicate("recipe_id"),
+        missing("name"),
+        missing("difficulty"),
+        not_in("difficulty", ["Easy", "Medium", "Hard"], "Invalid difficulty"),
+        nonneg_number("servings", "servings_text"),
+        nonneg_number("prep_time_minutes", "prep_time_minutes_text"),
+        nonneg_number("cook_time_minutes", "cook_time_minutes_text"),
+    ]),
+    "ingredients": ("ingredients", [
+        missing("ingredient_id"),
+        duplicate("ingredient_id"),
+        missing("recipe_id"),
+        unknown("recipe_id", "recipe"),
+        missing("ingredient_name"),
+        failing("qty_numeric", qty_error, "qty_numeric negative", when=has_qty),
+        failing("qty_numeric", qty_error, "qty_numeric not numeric", when=has_qty),
+    ]),
+    "steps": ("steps", [
+        missing("step_id"),
+        duplicate("step_id"),
+        missing("recipe_id"),
+        unknown("recipe_id", "recipe"),
+        missing("step_text"),
+        failing("step_order", step_order_error, "step_order must be >=1", default="0"),
+        failing("step_order", step_order_error, "step_order not integer", default="0"),
+        ("Duplicate step_order in recipe", lambda c: step_sequence(c)[0]),
+        ("Gap before step_order in recipe", lambda c: step_sequence(c)[1]),
+    ]),
+    "interactions": ("interactions", [
+        missing("interaction_id"),
+        duplicate("interaction_id"),
+        missing("user_id"),
+        unknown("user_id", "users"),
+        missing("recipe_id"),
+        unknown("recipe_id", "recipe"),
+        missing("type"),
+        not_in("type", ["view", "like", "cook"], "Invalid type"),
+        failing("rating", cook_rating_error, "rating must be 1-5", when=is_cook),
+        failing("rating", cook_rating_error, "cook rating not numeric", when=is_cook),
+        ("non-cook interaction should not have rating",
+         lambda c: ~is_cook(c) & (c.text("rating") != "").to_numpy()),
+    ]),
+    "users": ("users", [
+        missing("user_id"),
+        duplicate("user_id"),
+        missing("name"),
+        missing("email"),
+        ("Invalid email", lambda c: (c.text("email") != "") & ~c.text("email").str.contains("@", regex=False)),
+    ]),
+}
+
+def rule_masks(df, rules, keys=None):
+    """(rows x rules) boolean matrix, True where a row fails a rule."""
+    cols = Columns(df, keys)
+    masks = np.zeros((len(df), len(rules)), dtype=bool)
+    for j, (_, rule) in enumerate(rules):
+        masks[:, j] = np.asarray(rule(cols), dtype=bool)
+    return masks
+
+def error_lists(masks, rules):
+    """Failing-row mask and, for those rows only, their error lists in rule order."""
+    failed = masks.any(axis=1)
+    # rows failing the same set of rules share one error pattern
+    bits = masks[failed] @ (1 << np.arange(len(rules), dtype=np.int64))
+    patterns, codes = np.unique(bits, return_inverse=True)
+    messages = [[rules[j][0] for j in range(len(rules)) if p >> j & 1] for p in patterns]
+    return failed, [messages[k] for k in codes.ravel()]
+
+def find_errors(df, rules):
+    return error_lists(rule_masks(df, rules), rules)
+
+def sample_rows(masks, samples_per_rule):
+    """Positions of the first `samples_per_rule` failing rows of each rule (all if < 0)."""
+    if samples_per_rule < 0:
+        return np.flatnonzero(masks.any(axis=1))
+    picks = [np.flatnonzero(masks[:, j])[:samples_per_rule] for j in range(masks.shape[1])]
+    return np.unique(np.concatenate(picks)) if picks else np.array([], dtype=np.intp)
+
+def iter_records(df, errors=None, chunk_rows=CHUNK_ROWS):
+    # plain Python strings are much cheaper to box per cell than Arrow ones
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows].astype(object).to_dict("records")
+        if errors is None:
+            yield from chunk
         else:
-            report["ingredients"]["valid"].append(r.to_dict())
-
-def validate_steps():
-    for _, r in steps.iterrows():
-        errors = []
-        if r.get("step_id", "") == "":
-            errors.append("Missing step_id")
-        if r.get("recipe_id", "") == "":
-            errors.append("Missing recipe_id")
-        if r.get("step_text", "") == "":
-            errors.append("Missing step_text")
+            for r, e in zip(chunk, errors[start:start + chunk_rows]):
+                yield {**r, "errors": list(e)}
+
+def validate(df, rules):
+    failed, errors = find_errors(df, rules)
+    return {"valid": list(iter_records(df[~failed])),
+            "invalid": list(iter_records(df[failed], errors))}
+
+def iter_tables(frames=None):
+    # one table in memory at a time (plus the key indexes): (section, rules, frame, rule masks)
+    with metrics.stage("validate.keys") as m:
+        keys = load_keys(frames)
+        m["rows_out"] = sum(len(index) for index in keys.values())
+    for section, (table, rules) in RULES.items():
         try:
-            if int(r.get("step_order", "0")) < 1:
-                errors.append("step_order must be >=1")
-        except:
-            errors.append("step_order not integer")
-        if errors:
-            report["steps"]["invalid"].append({**r.to_dict(), "errors": errors})
-        else:
-            report["steps"]["valid"].append(r.to_dict())
-
-def validate_interactions():
-    for _, r in interactions.iterrows():
-        errors = []
-        if r.get("interaction_id", "") == "":
-            errors.append("Missing interaction_id")
-        if r.get("user_id", "") == "":
-            errors.append("Missing user_id")
-        if r.get("recipe_id", "") == "":
-            errors.append("Missing recipe_id")
-        t = r.get("type", "")
-        if t == "":
-            errors.append("Missing type")
-        if t and t not in ["view", "like", "cook"]:
-            errors.append("Invalid type")
-        rating = r.get("rating", "")
-        if t == "cook":
-            try:
-                val = float(rating)
-                if not (1 <= val <= 5):
-                    errors.append("rating must be 1-5")
-            except:
-                errors.append("cook rating not numeric")
-        else:
-            if rating not in ["", None]:
-                errors.append("non-cook interaction should not have rating")
-        if errors:
-            report["interactions"]["invalid"].append({**r.to_dict(), "errors": errors})
+            with metrics.stage(f"validate.{section}") as m:
+                df = read_table_no_nan(table, frames=frames)
+                masks = rule_masks(df, rules, keys)
+                m["rows_in"], m["rows_out"] = len(df), int(masks.any(axis=1).sum())
+        except FileNotFoundError:
+            logging.warning("No %s table in %s; skipping", table, OUT_DIR)
+            continue
+        yield section, rules, df, masks
+
+def summary(section, rules, masks):
+    counts = masks.sum(axis=0)
+    invalid = int(masks.any(axis=1).sum())
+    logging.info("%s: %d rows, %d invalid", section, len(masks), invalid)
+    return {"table": section, "rows": len(masks), "valid": len(masks) - invalid,
+            "invalid": invalid,
+            "rules": {message: int(n) for (message, _), n in zip(rules, counts)}}
+
+def write_compact_report(f, tables, samples_per_rule):
+    """NDJSON: per table a summary line, then one line per sampled invalid row."""
+    summaries = []
+    for section, rules, df, masks in tables:
+        rows = sample_rows(masks, samples_per_rule)
+        summaries.append(summary(section, rules, masks))
+        f.write(json.dumps({**summaries[-1], "samples": len(rows)}, ensure_ascii=False) + "\n")
+        _, errors = error_lists(masks[rows], rules)
+        records = iter_records(df.iloc[rows], errors)
+        for pos, rec in zip(rows, records):
+            err = rec.pop("errors")
+            f.write(json.dumps({"table": section, "row": int(pos), "errors": err, "record": rec},
+                               ensure_ascii=False) + "\n")
+    return summaries
+
+def write_full_report(f, tables):
+    """Every valid and invalid row, laid out exactly as json.dump(report, indent=2)."""
+    summaries = []
+    f.write("{")
+    for i, (section, rules, df, masks) in enumerate(tables):
+        summaries.append(summary(section, rules, masks))
+        failed, errors = error_lists(masks, rules)
+        f.write(("," if i else "") + "\n  " + json.dumps(section) + ": {")
+        parts = (("valid", iter_records(df[~failed])), ("invalid", iter_records(df[failed], errors)))
+        for j, (key, records) in enumerate(parts):
+            f.write(("," if j else "") + f'\n    "{key}": [')
+            n = 0
+            for rec in records:
+                text = json.dumps(rec, indent=2, ensure_ascii=False).replace("\n", "\n      ")
+                f.write(("," if n else "") + "\n      " + text)
+                n += 1
+            f.write("\n    ]" if n else "]")
+        f.write("\n  }")
+    f.write("\n}")
+    return summaries
+
+def validate_tables(frames=None, samples_per_rule=SAMPLES_PER_RULE, full_report=False, write_report=True):
+    """Validate every table and return the per-table summaries.
+
+    `frames` maps table names to transform outputs still in memory; the
+    other tables are read from OUT_DIR. With write_report=False only the
+    summaries are logged and no report file is written.
+    """
+    if not write_report:
+        return [summary(section, rules, masks) for section, rules, _, masks in iter_tables(frames)]
+    out_report = REPORT_JSON if full_report else REPORT_NDJSON
+    tmp_path = out_report.with_name(out_report.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        if full_report:
+            summaries = write_full_report(f, iter_tables(frames))
         else:
-            report["interactions"]["valid"].append(r.to_dict())
+            summaries = write_compact_report(f, iter_tables(frames), samples_per_rule)
+    os.replace(tmp_path, out_report)
+    logging.info("Validation complete. Report saved: %s", out_report)
+    return summaries
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Validate the pipeline tables in Project/output_csv")
+    ap.add_argument("--samples-per-rule", type=int, default=SAMPLES_PER_RULE,
+                    help="invalid rows kept per failing rule in the compact report (-1: all)")
+    ap.add_argument("--full-report", action="store_true",
+                    help="write every valid and invalid row to validation_report.json instead")
+    ap.add_argument("--profile", action="store_true",
+                    help="also write a cProfile / tracemalloc profile (Project/metrics/validate.prof)")
+    args = ap.parse_args(argv)
 
-# Run
-validate_recipes()
-validate_ingredients()
-validate_steps()
-validate_interactions()
+    if not OUT_DIR.exists():
+        logging.error("Output CSV directory not found: %s", OUT_DIR)
+        raise SystemExit(1)
 
-OUT_REPORT = OUT_DIR / "validation_report.json"
-with open(OUT_REPORT, "w", encoding="utf-8") as f:
-    json.dump(report, f, indent=2, ensure_ascii=False)
+    with metrics.run("validate", profile=args.profile), metrics.stage("validate"):
+        validate_tables(samples_per_rule=args.samples_per_rule, full_report=args.full_report)
 
-logging.info("Validation complete. Report saved: %s", OUT_REPORT)
+if __name__ == "__main__":
+    main()
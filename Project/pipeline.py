@@ -0,0 +1,313 @@
+# Project/pipeline.py
+"""
+Run the pipeline stages in one process: export -> transform -> validate ->
+analytics -> visualize.
+
+Usage: python pipeline.py [--from STAGE] [--to STAGE] [--write ARTIFACT ...]
+                          [--fake DIR] [--full] [--export-format json|ndjson] [--gzip]
+                          [--format parquet|csv|both] [--full-analytics] [--workers N] ...
+
+Each stage is a function of the run context that returns its output:
+ - export (export_firestore.export_all) refreshes the snapshots in
+   Project/data/; they are the incremental export state, so transform
+   still reads them from there
+ - transform (transform_etl.transform) writes the tables, which the change
+   feed and the incremental analytics state are computed against, and
+   returns the recipe / ingredients / steps / users frames
+ - validate, analytics and visualize take those frames as they are instead
+   of re-reading the tables; interactions are streamed from disk as before
+
+A range starting after transform (--from validate) reads the tables from
+Project/output_csv. Stage modules are imported when their stage runs, so
+--from transform never loads firebase_admin.
+
+Only the requested artifacts are written (--write, default: the artifacts
+of the stages in the range except db): validation
+(output_csv/validation_report.ndjson), report
+(analytics/analytics_report.json), charts (analytics/visuals/*.png) and db
+(output_csv/pipeline.db). Validation and analytics still run without their
+artifact (summaries are logged, the analytics state is refreshed);
+visualize is skipped without charts. The seconds each stage took are
+logged at the end.
+
+Steps whose inputs, code and options match a previous run are skipped
+(stage_cache.py, cache in Project/.cache/): transform per export file, so
+unchanged recipes / users are not re-transformed when only interactions
+changed (their change sets are emptied), then the db load, validate,
+analytics and visualize keyed on the table files. Reports and charts are
+restored from the cache when they were overwritten since; tables are only
+reused in place. --no-cache reruns everything, --cache-max-mb and
+--cache-max-age-days set the eviction policy.
+
+Every stage and its steps are measured (etl/metrics.py): time, rows,
+bytes and peak memory go to Project/metrics/pipeline.json and
+pipeline.prom (--metrics-dir). --profile also keeps a cProfile /
+tracemalloc profile of the slowest stage.
+"""
+
+import argparse
+import logging
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent
+# the stage modules import their helpers as top-level modules
+sys.path[:0] = [str(PROJECT_DIR / "etl"), str(PROJECT_DIR / "analytics")]
+
+import metrics  # noqa: E402
+import table_store  # noqa: E402
+from stage_cache import MAX_AGE_DAYS, MAX_BYTES, StageCache  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+REPORT = PROJECT_DIR / "analytics" / "analytics_report.json"
+
+# stage -> artifact it writes when requested
+ARTIFACTS = {"validate": "validation", "analytics": "report", "visualize": "charts", "transform": "db"}
+
+TABLES = ("recipe", "ingredients", "steps", "users", "interactions")
+
+# source files behind each cached step, relative to Project/ (part of its cache key): the
+# step's script and every project module it imports, including etl/ingredients.py (the
+# catalog behind ingredient_name / ingredient_key, which table_store recomputes from CSVs)
+CODE = {
+    "transform": ["etl/transform_etl.py", "etl/ingredients.py", "etl/table_store.py", "etl/sql_store.py",
+                  "etl/metrics.py", "etl/lazy.py"],
+    "db": ["etl/sql_store.py", "etl/table_store.py", "etl/ingredients.py", "etl/lazy.py"],
+    "validate": ["etl/validator.py", "etl/table_store.py", "etl/ingredients.py", "etl/metrics.py", "etl/lazy.py"],
+    "analytics": ["analytics/analytics.py", "analytics/aggregates.py", "analytics/analytics_state.py",
+                  "analytics/rollups.py", "analytics/sketches.py", "etl/ingredients.py", "etl/table_store.py",
+                  "etl/metrics.py", "etl/lazy.py"],
+    "visualize": ["analytics/visualize.py", "analytics/aggregates.py", "etl/ingredients.py", "etl/table_store.py",
+                  "etl/metrics.py", "etl/lazy.py"],
+}
+
+@dataclass
+class Context:
+    """What the stages share: the options and the outputs of the stages run so far."""
+
+    args: argparse.Namespace
+    write: set
+    cache: StageCache
+    # table name -> transform output still in memory
+    frames: dict = field(default_factory=dict)
+    insights: dict = None
+    seconds: dict = field(default_factory=dict)
+    # steps answered from the cache
+    reused: list = field(default_factory=list)
+
+def cached(ctx: Context, step: str, inputs, outputs, options: dict, fn, restore: bool = True,
+           force: bool = False):
+    """fn(), or the result of the cached run of `step` with the same inputs, code and options.
+
+    Returns (result, hit). restore=False only reuses outputs still in
+    place (no copies are kept); force runs fn() anyway and records it.
+    """
+    code = [PROJECT_DIR / p for p in CODE[step.split(":")[0]]]
+    key = ctx.cache.key(step, code, inputs, options)
+    entry = None if force else ctx.cache.lookup(key, restore)
+    if entry is not None:
+        logging.info("%s: inputs unchanged, reusing the cached run %s", step, key[:12])
+        ctx.reused.append(step)
+        return entry["result"], True
+    result = fn()
+    ctx.cache.store(key, step, outputs, result if isinstance(result, (dict, list)) else None,
+                    keep_objects=restore)
+    return result, False
+
+def table_files(names=TABLES) -> list:
+    return [table_store.find_table(name)[0] or table_store.table_path(name, "csv") for name in names]
+
+def export(ctx: Context) -> list:
+    import export_firestore
+
+    a = ctx.args
+    export_firestore.connect(a.fake)
+    return export_firestore.export_all(full=a.full, fmt=a.export_format, compress=a.gzip,
+                                       workers=a.export_workers, partitions=a.partitions)
+
+def transform(ctx: Context) -> dict:
+    # one cached step per export file: unchanged recipes / users are not re-transformed
+    import transform_etl
+
+    formats = ctx.args.formats
+    changed = False
+    for source, names in transform_etl.SOURCES.items():
+        outputs = [table_store.table_path(name, fmt) for name in names for fmt in formats]
+
+        def run_source(source=source):
+            ctx.frames.update(transform_etl.transform_source(source, formats))
+
+        _, hit = cached(ctx, f"transform:{source}", [transform_etl.resolve_input(source)], outputs,
+                        {"formats": formats}, run_source, restore=False)
+        if hit:
+            # nothing changed since the previous run
+            for name in names:
+                transform_etl.clear_changes(name)
+        changed |= not hit
+    if "db" in ctx.write:
+        import sql_store
+
+        cached(ctx, "db", table_files(), [sql_store.DB_PATH], {}, sql_store.load_database,
+               restore=False, force=changed)
+    return ctx.frames
+
+def validate(ctx: Context) -> list:
+    import validator
+
+    a = ctx.args
+    write = "validation" in ctx.write
+    report = validator.REPORT_JSON if a.full_report else validator.REPORT_NDJSON
+    summaries, _ = cached(
+        ctx, "validate", table_files(), [report] if write else [],
+        {"samples_per_rule": a.samples_per_rule, "full_report": a.full_report, "write": write},
+        lambda: validator.validate_tables(ctx.frames, samples_per_rule=a.samples_per_rule,
+                                          full_report=a.full_report, write_report=write))
+    return summaries
+
+def analytics(ctx: Context) -> dict:
+    import analytics as analytics_stage
+
+    a = ctx.args
+
+    def run_analytics():
+        recipes, ingredients, steps = analytics_stage.load_inputs(ctx.frames)
+        insights = analytics_stage.run(recipes, ingredients, steps, full=a.full_analytics, verify=a.verify,
+                                       sketch=a.sketch, chunk_rows=a.chunk_rows, workers=a.workers,
+                                       window_days=a.window_days)
+        if "report" in ctx.write:
+            analytics_stage.save_report(insights, a.report)
+        return insights
+
+    # the state folds only new interactions, so unchanged tables mean an unchanged report
+    ctx.insights, _ = cached(
+        ctx, "analytics", table_files(("recipe", "ingredients", "steps", "interactions")),
+        [a.report] if "report" in ctx.write else [],
+        {"sketch": a.sketch, "window_days": a.window_days, "workers": a.workers,
+         "report": str(a.report) if "report" in ctx.write else None},
+        run_analytics, force=a.full_analytics or a.verify)
+    return ctx.insights
+
+def visualize(ctx: Context) -> dict:
+    if "charts" not in ctx.write:
+        logging.info("Charts not requested; skipping visualize")
+        return {}
+    import visualize as visualize_stage
+
+    def draw():
+        recipes, ingredients, steps = visualize_stage.load_inputs(ctx.frames)
+        return visualize_stage.draw(recipes, ingredients, steps, chunk_rows=ctx.args.chunk_rows,
+                                    workers=ctx.args.chart_workers, changed_only=ctx.args.changed_only)
+
+    outputs = [visualize_stage.VISUALS / name for name in visualize_stage.RENDERERS] + [visualize_stage.HASHES]
+    seconds, _ = cached(ctx, "visualize", table_files(("recipe", "ingredients", "steps", "interactions")),
+                        outputs, {}, draw)
+    return seconds
+
+STAGES = {
+    "export": export,
+    "transform": transform,
+    "validate": validate,
+    "analytics": analytics,
+    "visualize": visualize,
+}
+
+def stage_range(first: str, last: str) -> list:
+    names = list(STAGES)
+    if names.index(first) > names.index(last):
+        raise ValueError(f"--from {first} comes after --to {last}")
+    return names[names.index(first):names.index(last) + 1]
+
+def run(ctx: Context, stages: list) -> Context:
+    for name in stages:
+        logging.info("=== %s ===", name)
+        with metrics.stage(name) as m:
+            STAGES[name](ctx)
+        ctx.seconds[name] = m["seconds"]
+    return ctx
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Run the pipeline stages in one process")
+    ap.add_argument("--from", dest="first", choices=list(STAGES), default="export",
+                    help="first stage to run (default: %(default)s)")
+    ap.add_argument("--to", dest="last", choices=list(STAGES), default="visualize",
+                    help="last stage to run (default: %(default)s)")
+    ap.add_argument("--write", nargs="*", choices=sorted(set(ARTIFACTS.values())),
+                    help="artifacts to write (default: those of the stages run, except db)")
+    # export
+    ap.add_argument("--fake", type=Path, metavar="DIR",
+                    help="export from an in-process fake client seeded from DIR (offline runs)")
+    ap.add_argument("--full", action="store_true", help="ignore the export watermarks and rescan every collection")
+    ap.add_argument("--export-format", choices=["json", "ndjson"], default="json")
+    ap.add_argument("--gzip", action="store_true", help="gzip-compress NDJSON exports")
+    ap.add_argument("--export-workers", type=int, default=4)
+    ap.add_argument("--partitions", type=int, default=1)
+    # transform
+    ap.add_argument("--format", choices=["parquet", "csv", "both"], default=None,
+                    help="table format (default: parquet when pyarrow is installed)")
+    # validate
+    ap.add_argument("--samples-per-rule", type=int, default=100)
+    ap.add_argument("--full-report", action="store_true", help="write validation_report.json with every row")
+    # analytics
+    ap.add_argument("--report", type=Path, default=REPORT, help="analytics report path (default: %(default)s)")
+    ap.add_argument("--full-analytics", action="store_true",
+                    help="rebuild the analytics state from every interaction")
+    ap.add_argument("--verify", action="store_true", help="check the report against a full recompute")
+    ap.add_argument("--sketch", action="store_true", help="top-K / distinct counts from sketches")
+    ap.add_argument("--window-days", type=int, metavar="N")
+    ap.add_argument("--chunk-rows", type=int, default=1_000_000,
+                    help="interactions are aggregated this many rows at a time (default: %(default)s)")
+    ap.add_argument("--workers", type=int, default=1, help="processes folding new interactions")
+    # visualize
+    ap.add_argument("--chart-workers", type=int, default=1, help="processes rendering charts")
+    ap.add_argument("--changed-only", action="store_true", help="render only charts whose data changed")
+    # stage cache
+    ap.add_argument("--no-cache", action="store_true",
+                    help="rerun every stage even when its inputs are unchanged (runs are still recorded)")
+    ap.add_argument("--cache-max-mb", type=float, default=MAX_BYTES / 2**20,
+                    help="evict least recently used entries beyond this many MB of outputs (default: %(default)s)")
+    ap.add_argument("--cache-max-age-days", type=float, default=MAX_AGE_DAYS,
+                    help="evict entries unused for this many days (default: %(default)s)")
+    # metrics
+    ap.add_argument("--metrics-dir", type=Path, default=metrics.METRICS_DIR,
+                    help="where pipeline.json / pipeline.prom are written (default: %(default)s)")
+    ap.add_argument("--profile", action="store_true",
+                    help="cProfile / tracemalloc the stages and keep the slowest one's profile")
+    args = ap.parse_args(argv)
+    if args.gzip and args.export_format != "ndjson":
+        ap.error("--gzip requires --export-format ndjson")
+    try:
+        stages = stage_range(args.first, args.last)
+    except ValueError as e:
+        ap.error(str(e))
+    if args.format is None:
+        args.format = table_store.DEFAULT_FORMATS[0]
+    formats = ("parquet", "csv") if args.format == "both" else (args.format,)
+    # what TableWriter really writes without pyarrow
+    args.formats = tuple(f for f in formats if f != "parquet" or table_store.has_parquet()) or ("csv",)
+
+    if args.write is None:
+        write = {ARTIFACTS[s] for s in stages if s in ARTIFACTS and s != "transform"}
+    else:
+        write = set(args.write)
+
+    cache = StageCache(enabled=not args.no_cache, max_bytes=int(args.cache_max_mb * 2**20),
+                       max_age_days=args.cache_max_age_days)
+    ctx = Context(args, write, cache)
+    start = time.perf_counter()
+    try:
+        with metrics.run("pipeline", profile=args.profile, out_dir=args.metrics_dir):
+            run(ctx, stages)
+    finally:
+        # keep the runs that finished, even when a later stage failed
+        cache.evict()
+        cache.save()
+    logging.info("Pipeline done in %.2fs (%s)", time.perf_counter() - start,
+                 ", ".join(f"{name} {s:.2f}s" for name, s in ctx.seconds.items()))
+    if ctx.reused:
+        logging.info("Reused from the cache: %s", ", ".join(ctx.reused))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+# Project/tests/conftest.py
+import sys
+from pathlib import Path
+
+# the pipeline modules import each other by bare name, as the scripts run from etl/
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "etl"))
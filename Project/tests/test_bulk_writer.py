@@ -0,0 +1,156 @@
+# Project/tests/test_bulk_writer.py
+"""
+bulk_writer.BulkWriter against fake_firestore.FakeClient: retried aborts,
+errors that are not retried, batch size bounds and the rate limit.
+"""
+
+import time
+
+import pytest
+
+from bulk_writer import MAX_BATCH, BulkWriter, RateLimiter
+from fake_firestore import FakeClient, FakeWriteBatch
+
+class PermissionDenied(Exception):
+    """Same name as google.api_core.exceptions.PermissionDenied; not in RETRYABLE."""
+
+class RecordingBatch(FakeWriteBatch):
+    def commit(self):
+        self._client.batch_sizes.append(len(self))
+        return super().commit()
+
+class DenyingBatch(FakeWriteBatch):
+    def commit(self):
+        self._client.commits += 1
+        raise PermissionDenied("Missing or insufficient permissions.")
+
+class Client(FakeClient):
+    """FakeClient recording the size of every commit, or failing every commit with batch_class=DenyingBatch."""
+
+    def __init__(self, batch_class=RecordingBatch, **kw):
+        super().__init__(**kw)
+        self.batch_class = batch_class
+        self.batch_sizes = []
+        self.commits = 0
+
+    def batch(self):
+        return self.batch_class(self)
+
+def docs(n: int) -> dict:
+    return {f"I{i:05d}": {"user_id": f"U{i % 50:03d}", "type": "view"} for i in range(n)}
+
+def write_all(client, documents, **kw):
+    kw = {"backoff": 0.001, "max_backoff": 0.01, **kw}
+    with BulkWriter(client, **kw) as writer:
+        for doc_id, d in documents.items():
+            writer.set(client.collection("UserInteractions").document(doc_id), d)
+    return writer.stats()
+
+def test_aborted_commits_are_retried_until_every_document_lands():
+    client = Client(abort_rate=0.3)
+    documents = docs(2000)
+
+    stats = write_all(client, documents, batch_size=100, max_in_flight=4, max_retries=50)
+
+    assert client.dump()["UserInteractions"] == documents
+    assert stats["retries"] > 0
+    assert stats["retries"] == client.aborted_count
+    assert (stats["writes"], stats["batches"]) == (2000, 20)
+
+def test_retries_give_up_after_max_retries():
+    client = Client(abort_rate=1.0)
+
+    with pytest.raises(Exception) as raised:
+        write_all(client, docs(10), max_retries=3)
+
+    assert type(raised.value).__name__ == "Aborted"
+    assert client.aborted_count == 4
+    assert "UserInteractions" not in client.dump()
+
+def test_non_retryable_error_is_raised_from_set():
+    client = Client(DenyingBatch)
+    writer = BulkWriter(client, batch_size=10, max_in_flight=1)
+    ref = client.collection("UserInteractions").document
+
+    for doc_id, d in list(docs(10).items()):
+        writer.set(ref(doc_id), d)
+    # the next flush waits for the in-flight batch and sees it failed
+    with pytest.raises(PermissionDenied):
+        for doc_id, d in list(docs(20).items())[10:]:
+            writer.set(ref(doc_id), d)
+    writer.pool.shutdown(wait=True)
+
+    assert client.commits == 1
+    assert writer.stats()["retries"] == 0
+
+def test_non_retryable_error_is_raised_from_close():
+    client = Client(DenyingBatch)
+    writer = BulkWriter(client, batch_size=10)
+    for doc_id, d in docs(5).items():
+        writer.set(client.collection("UserInteractions").document(doc_id), d)
+
+    with pytest.raises(PermissionDenied):
+        writer.close()
+
+    assert client.commits == 1
+    assert writer.stats()["retries"] == 0
+
+def test_context_manager_raises_the_failed_batch():
+    with pytest.raises(PermissionDenied):
+        write_all(Client(DenyingBatch), docs(5))
+
+@pytest.mark.parametrize("batch_size", [0, -1, MAX_BATCH + 1])
+def test_batch_size_out_of_bounds(batch_size):
+    with pytest.raises(ValueError):
+        BulkWriter(Client(), batch_size=batch_size)
+
+@pytest.mark.parametrize("batch_size", [1, 7, MAX_BATCH])
+def test_batches_never_exceed_batch_size(batch_size):
+    client = Client()
+    documents = docs(1203)
+
+    stats = write_all(client, documents, batch_size=batch_size)
+
+    assert client.dump()["UserInteractions"] == documents
+    assert max(client.batch_sizes) == batch_size
+    assert sum(client.batch_sizes) == len(documents)
+    assert stats["batches"] == len(client.batch_sizes) == -(-len(documents) // batch_size)
+
+def test_deletes_share_batches_with_sets():
+    client = Client()
+    collection = client.collection("UserInteractions")
+    documents = docs(30)
+
+    with BulkWriter(client, batch_size=8) as writer:
+        for doc_id, d in documents.items():
+            writer.set(collection.document(doc_id), d)
+        for doc_id in list(documents)[:10]:
+            writer.delete(collection.document(doc_id))
+
+    assert client.dump()["UserInteractions"] == dict(list(documents.items())[10:])
+    assert max(client.batch_sizes) == 8 and sum(client.batch_sizes) == 40
+
+def test_rate_limit_without_ramp():
+    client = Client()
+    rate = 200
+    # the bucket starts full (one second of writes); the other 100 writes wait their turn
+    started = time.monotonic()
+    stats = write_all(client, docs(300), batch_size=50, max_in_flight=8, ops_per_second=rate, ramp=False)
+    seconds = time.monotonic() - started
+
+    assert stats["writes"] == 300
+    assert seconds >= (300 - rate) / rate * 0.9
+
+def test_ramp_false_keeps_the_base_rate():
+    flat, ramped = RateLimiter(500, ramp=False), RateLimiter(500)
+    later = flat.start + 3 * RateLimiter.RAMP_SECONDS
+
+    assert flat.rate(later) == 500
+    assert ramped.rate(ramped.start + 3 * RateLimiter.RAMP_SECONDS) == 500 * RateLimiter.RAMP_FACTOR ** 3
+
+def test_unlimited_rate_does_not_wait():
+    limiter = RateLimiter(None)
+    started = time.monotonic()
+    for _ in range(1000):
+        limiter.acquire(MAX_BATCH)
+    assert time.monotonic() - started < 0.5
@@ -0,0 +1,198 @@
+# Project/tests/test_export_firestore.py
+"""
+export_firestore.py against fake_firestore.FakeClient: partitioned exports
+match single-cursor ones, incremental reruns fetch nothing new, and NDJSON
+appends (resumed or not) keep one line per document.
+"""
+
+import gzip
+import json
+
+import pytest
+
+import export_firestore as ex
+from fake_firestore import FakeClient
+
+def stamp(i: int) -> str:
+    return f"2025-11-01T{i // 3600:02d}:{i // 60 % 60:02d}:{i % 60:02d}Z"
+
+def seed(n: int = 60) -> dict:
+    return {
+        "Recipes": {f"R{i:03d}": {"name": f"Recipe {i}", "created_at": stamp(i)} for i in range(n)},
+        "Users": {f"U{i:03d}": {"name": f"User {i}", "joined_at": stamp(i)} for i in range(n // 3)},
+        # ids in the opposite order of the timestamps, so the watermark order is not the key order
+        "UserInteractions": {f"I{n * 2 - i:04d}": {"type": "view", "user_id": f"U{i % 7:03d}",
+                                                   "timestamp": stamp(i)} for i in range(n * 2)},
+    }
+
+@pytest.fixture
+def exporter(tmp_path, monkeypatch):
+    """Point the exporter at tmp_path with small pages; returns a function switching its data dir."""
+    monkeypatch.setattr(ex, "PAGE_SIZE", 7)
+    monkeypatch.setattr(ex, "CHECKPOINT_PAGES", 2)
+
+    def use(name: str, client: FakeClient):
+        data_dir = tmp_path / name
+        data_dir.mkdir(exist_ok=True)
+        monkeypatch.setattr(ex, "DATA_DIR", data_dir)
+        monkeypatch.setattr(ex, "STATE_FILE", data_dir / "export_state.json")
+        monkeypatch.setattr(ex, "PARTS_DIR", data_dir / ".parts")
+        monkeypatch.setattr(ex, "db", client)
+        return data_dir
+    return use
+
+def read_export(path):
+    if path.name.endswith(".json"):
+        return json.loads(path.read_text(encoding="utf-8"))
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def stored(client: FakeClient, collection: str) -> dict:
+    return {doc_id: {**d, "_doc_id": doc_id} for doc_id, d in client.dump()[collection].items()}
+
+def export_file(data_dir, file_name, fmt, compress=False):
+    return data_dir / ex.export_path(file_name, fmt, compress).name
+
+@pytest.mark.parametrize("fmt,compress", [("json", False), ("ndjson", False), ("ndjson", True)])
+def test_partitioned_export_matches_single_cursor(exporter, fmt, compress):
+    single_dir = exporter("single", FakeClient(seed()))
+    ex.export_all(fmt=fmt, compress=compress, workers=1, partitions=1)
+    single_state = json.loads(ex.STATE_FILE.read_text())
+
+    parts_dir = exporter("parts", FakeClient(seed()))
+    stats = ex.export_all(fmt=fmt, compress=compress, workers=4, partitions=4)
+    parts_state = json.loads(ex.STATE_FILE.read_text())
+
+    assert {(s["collection"], s["partition"]) for s in stats} == {
+        (name, k) for name, _ in ex.COLLECTIONS for k in range(4)}
+    for name, file_name in ex.COLLECTIONS:
+        single = read_export(export_file(single_dir, file_name, fmt, compress))
+        parts = read_export(export_file(parts_dir, file_name, fmt, compress))
+        assert parts == single
+        assert len(parts) == len(seed()[name])
+    for name, _ in ex.COLLECTIONS:
+        # same watermark; the offsets of gzip files depend on their member layout
+        drop = ("offset", "clean") if compress else ()
+        assert ({k: v for k, v in parts_state[name].items() if k not in drop}
+                == {k: v for k, v in single_state[name].items() if k not in drop})
+    assert not list((parts_dir / ".parts").iterdir())
+
+@pytest.mark.parametrize("fmt,compress", [("json", False), ("ndjson", False), ("ndjson", True)])
+def test_incremental_rerun_fetches_nothing(exporter, fmt, compress):
+    client = FakeClient(seed())
+    data_dir = exporter("data", client)
+    ex.export_all(fmt=fmt, compress=compress, partitions=3)
+    files = {name: export_file(data_dir, f, fmt, compress).read_bytes() for name, f in ex.COLLECTIONS}
+    reads = client.read_count
+
+    ex.export_all(fmt=fmt, compress=compress, partitions=3)
+
+    assert client.read_count == reads
+    assert {name: export_file(data_dir, f, fmt, compress).read_bytes()
+            for name, f in ex.COLLECTIONS} == files
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_ndjson_append_keeps_one_line_per_document(exporter, compress):
+    client = FakeClient(seed())
+    data_dir = exporter("data", client)
+    ex.export_all(fmt="ndjson", compress=compress)
+    path = export_file(data_dir, "user_interactions.json", "ndjson", compress)
+    order = [d["_doc_id"] for d in read_export(path)]
+
+    docs = client.collection("UserInteractions")
+    # updates move a document past the watermark; repeated ones only keep the last version
+    docs.document("I0100").set({"type": "like", "user_id": "U001", "timestamp": stamp(500)})
+    docs.document("I0050").set({"type": "cook", "user_id": "U002", "timestamp": stamp(501)})
+    docs.document("I0100").set({"type": "cook", "user_id": "U001", "timestamp": stamp(502)})
+    for i in range(10):
+        docs.document(f"N{i:03d}").set({"type": "view", "user_id": "U003", "timestamp": stamp(600 + i)})
+    ex.export_all(fmt="ndjson", compress=compress)
+
+    exported = read_export(path)
+    assert [d["_doc_id"] for d in exported] == order + [f"N{i:03d}" for i in range(10)]
+    assert {d["_doc_id"]: d for d in exported} == stored(client, "UserInteractions")
+    assert {d["_doc_id"]: d["type"] for d in exported if d["_doc_id"] in ("I0100", "I0050")} == {
+        "I0100": "cook", "I0050": "cook"}
+    mark = json.loads(ex.STATE_FILE.read_text())["UserInteractions"]
+    assert mark["offset"] == mark["clean"] == path.stat().st_size
+    assert (mark["value"], mark["doc_id"]) == (stamp(609), "N009")
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_ndjson_append_resumes_after_interruption(exporter, monkeypatch, compress):
+    client = FakeClient(seed())
+    data_dir = exporter("data", client)
+    ex.export_all(fmt="ndjson", compress=compress)
+    path = export_file(data_dir, "user_interactions.json", "ndjson", compress)
+
+    docs = client.collection("UserInteractions")
+    docs.document("I0010").set({"type": "like", "user_id": "U004", "timestamp": stamp(700)})
+    for i in range(40):
+        docs.document(f"N{i:03d}").set({"type": "view", "user_id": "U005", "timestamp": stamp(701 + i)})
+
+    fetch_pages = ex.fetch_pages
+
+    def interrupted(*args):
+        # dies fetching the sixth page: checkpointed after pages two and four, page five written after
+        for k, page in enumerate(fetch_pages(*args)):
+            if k == 5:
+                raise KeyboardInterrupt
+            yield page
+    monkeypatch.setattr(ex, "fetch_pages", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        ex.export_collection("UserInteractions", "user_interactions.json", fmt="ndjson", compress=compress)
+    monkeypatch.setattr(ex, "fetch_pages", fetch_pages)
+    reads = client.read_count
+
+    ex.export_all(fmt="ndjson", compress=compress)
+
+    exported = read_export(path)
+    assert len(exported) == len({d["_doc_id"] for d in exported})
+    assert {d["_doc_id"]: d for d in exported} == stored(client, "UserInteractions")
+    # resumed from the last checkpoint: the 41 changed documents less four checkpointed pages
+    assert client.read_count - reads == 41 - 4 * ex.PAGE_SIZE
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_ndjson_interrupted_compaction_is_finished(exporter, monkeypatch, compress):
+    client = FakeClient(seed())
+    data_dir = exporter("data", client)
+    ex.export_all(fmt="ndjson", compress=compress)
+    path = export_file(data_dir, "user_interactions.json", "ndjson", compress)
+    client.collection("UserInteractions").document("I0020").set(
+        {"type": "cook", "user_id": "U006", "timestamp": stamp(800)})
+
+    replace = ex.os.replace
+
+    def crash_on_swap(src, dst):
+        if str(src).endswith(".compact"):
+            raise KeyboardInterrupt
+        replace(src, dst)
+    monkeypatch.setattr(ex.os, "replace", crash_on_swap)
+    with pytest.raises(KeyboardInterrupt):
+        ex.export_collection("UserInteractions", "user_interactions.json", fmt="ndjson", compress=compress)
+    monkeypatch.setattr(ex.os, "replace", replace)
+    assert json.loads(ex.STATE_FILE.read_text())["UserInteractions"]["compacting"]
+
+    ex.export_all(fmt="ndjson", compress=compress)
+
+    exported = read_export(path)
+    assert len(exported) == len(seed()["UserInteractions"])
+    assert {d["_doc_id"]: d for d in exported} == stored(client, "UserInteractions")
+    assert "compacting" not in json.loads(ex.STATE_FILE.read_text())["UserInteractions"]
+
+def test_legacy_ndjson_duplicates_are_compacted(exporter):
+    # files appended to before the "clean" offset was kept may already hold repeated documents
+    client = FakeClient(seed())
+    data_dir = exporter("data", client)
+    ex.export_all(fmt="ndjson")
+    path = export_file(data_dir, "user_interactions.json", "ndjson")
+    first = path.read_text(encoding="utf-8").splitlines(keepends=True)
+    path.write_text("".join(first + first[:3]), encoding="utf-8")
+    state = json.loads(ex.STATE_FILE.read_text())
+    state["UserInteractions"].pop("clean")
+    state["UserInteractions"]["offset"] = path.stat().st_size
+    ex.STATE_FILE.write_text(json.dumps(state))
+
+    ex.export_all(fmt="ndjson")
+
+    assert path.read_text(encoding="utf-8").splitlines(keepends=True) == first
@@ -1,20 +1,49 @@
 """
 this file inserts Veg Pulav + 19 synthetic recipes,
 5 users, and 50 interactions with consistent schema and field names.
+
+Usage: python insert_data.py [--interactions N] [--batch-size 500] [--in-flight 8]
+                             [--rate OPS] [--emulator HOST:PORT | --fake [--fake-latency MS]]
+
+Documents are written through Project/etl/bulk_writer.py: batches of up to
+500 writes, --in-flight batches committed concurrently, at most --rate
+writes/sec (ramping 50% every 5 minutes; 0 = unlimited), retried with
+backoff on contention errors. Throughput is logged at the end.
+--emulator writes to a local Firestore emulator, --fake to the in-memory
+fake client (offline runs; --fake-latency simulates the commit round-trip).
 """
 
-import firebase_admin
-from firebase_admin import credentials, firestore
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
 from datetime import datetime, timezone
 import random
 import uuid
 
+# the bulk writer and fake client live next to the ETL scripts
+sys.path.insert(0, str(Path(__file__).resolve().parent / "Project" / "etl"))
+from bulk_writer import BulkWriter  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
 # ---------------------------
 # Initialize Firebase Admin
 # ---------------------------
-cred = credentials.Certificate("serviceAccountKey.json")
-firebase_admin.initialize_app(cred)
-db = firestore.client()
+def init_db(args):
+    if args.fake:
+        from fake_firestore import FakeClient
+        return FakeClient(latency=args.fake_latency / 1000)
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+    if args.emulator:
+        # the emulator needs no credentials; the client picks the host up from the environment
+        os.environ["FIRESTORE_EMULATOR_HOST"] = args.emulator
+        return firestore.Client(project=args.project)
+    cred = credentials.Certificate("serviceAccountKey.json")
+    firebase_admin.initialize_app(cred)
+    return firestore.client()
 
 # Helper for ISO timestamp (UTC with Z)
 def now_iso():
@@ -60,9 +89,6 @@ veg_pulav = {
     "created_at": now_iso()
 }
 
-# Upload Veg Pulav
-db.collection("Recipes").document(veg_pulav["recipe_id"]).set(veg_pulav)
-print("Uploaded Veg Pulav (R001)")
 
 # ---------------------------
 # 2) Generate 19 synthetic recipes (R002..R020)
@@ -137,54 +163,51 @@ sample_recipe_templates = [
 ]
 
 # We'll reuse templates and vary prep/cook times & difficulty
-for idx in range(2, 21):  # 2..20 => 19 recipes
-    tidx = random.randrange(len(sample_recipe_templates))
-    t = sample_recipe_templates[tidx]
-    recipe_id = f"R{idx:03}"
-    # create ingredient list: base ingredients + 1-2 random extra
-    ingredients = []
-    for name, qty, unit in t["base_ingredients"]:
-        # keep numeric qty where possible
-        ingredients.append({"name": name, "qty": qty if isinstance(qty, (int, float)) else qty, "unit": unit})
-    # optional extras
-    extras = [
-        ("Salt", 1, "tsp"),
-        ("Pepper", 0.5, "tsp"),
-        ("Coriander", 1, "tbsp"),
-        ("Olive Oil", 1, "tbsp"),
-        ("Green Chili", 1, "pcs")
-    ]
-    extra_count = random.choice([0, 1, 2])
-    for e in random.sample(extras, extra_count):
-        ingredients.append({"name": e[0], "qty": e[1], "unit": e[2]})
-
-    prep = random.randint(5, 30)
-    cook = random.randint(5, 45)
-    diff = random.choice(["Easy", "Medium", "Hard"])
-    steps = [
-        f"Prepare ingredients for {t['name']}.",
-        "Combine and cook base ingredients as required.",
-        "Season and simmer until done.",
-        "Serve hot."
-    ]
-
-    recipe = {
-        "recipe_id": recipe_id,
-        "name": t["name"] + (f" {idx}" if idx % 3 == 0 else ""),  # slight variation
-        "description": t["description"],
-        "servings": random.randint(1, 6),
-        "prep_time_minutes": prep,
-        "cook_time_minutes": cook,
-        "difficulty": diff,
-        "ingredients": ingredients,
-        "steps": steps,
-        "cuisine": t["cuisine"],
-        "created_at": now_iso()
-    }
+def synthetic_recipes():
+    for idx in range(2, 21):  # 2..20 => 19 recipes
+        tidx = random.randrange(len(sample_recipe_templates))
+        t = sample_recipe_templates[tidx]
+        recipe_id = f"R{idx:03}"
+        # create ingredient list: base ingredients + 1-2 random extra
+        ingredients = []
+        for name, qty, unit in t["base_ingredients"]:
+            # keep numeric qty where possible
+            ingredients.append({"name": name, "qty": qty if isinstance(qty, (int, float)) else qty, "unit": unit})
+        # optional extras
+        extras = [
+            ("Salt", 1, "tsp"),
+            ("Pepper", 0.5, "tsp"),
+            ("Coriander", 1, "tbsp"),
+            ("Olive Oil", 1, "tbsp"),
+            ("Green Chili", 1, "pcs")
+        ]
+        extra_count = random.choice([0, 1, 2])
+        for e in random.sample(extras, extra_count):
+            ingredients.append({"name": e[0], "qty": e[1], "unit": e[2]})
 
-    db.collection("Recipes").document(recipe_id).set(recipe)
+        prep = random.randint(5, 30)
+        cook = random.randint(5, 45)
+        diff = random.choice(["Easy", "Medium", "Hard"])
+        steps = [
+            f"Prepare ingredients for {t['name']}.",
+            "Combine and cook base ingredients as required.",
+            "Season and simmer until done.",
+            "Serve hot."
+        ]
 
-print("Uploaded 19 synthetic recipes (R002..R020)")
+        yield {
+            "recipe_id": recipe_id,
+            "name": t["name"] + (f" {idx}" if idx % 3 == 0 else ""),  # slight variation
+            "description": t["description"],
+            "servings": random.randint(1, 6),
+            "prep_time_minutes": prep,
+            "cook_time_minutes": cook,
+            "difficulty": diff,
+            "ingredients": ingredients,
+            "steps": steps,
+            "cuisine": t["cuisine"],
+            "created_at": now_iso()
+        }
 
 # ---------------------------
 # 3) Create Users (5)
@@ -197,40 +220,72 @@ users = [
     {"user_id": "U005", "name": "Priya", "email": "priya@example.com", "joined_at": now_iso()}
 ]
 
-for u in users:
-    db.collection("Users").document(u["user_id"]).set(u)
-
-print("Uploaded 5 users (U001..U005)")
-
 # ---------------------------
-# 4) Generate 50 Interactions
+# 4) Generate Interactions (50 by default)
 # ---------------------------
 interaction_types = ["view", "like", "cook"]
-interactions_to_create = 50
-created_interactions = []
 
 recipe_ids = [f"R{n:03}" for n in range(1, 21)]  # R001..R020
 user_ids = [u["user_id"] for u in users]
 
-for i in range(1, interactions_to_create + 1):
-    iid = f"I{i:04}"  # I0001...
-    chosen_user = random.choice(user_ids)
-    chosen_recipe = random.choice(recipe_ids)
-    itype = random.choices(interaction_types, weights=[0.6, 0.25, 0.15])[0]  # more views than likes/cooks
-    interaction = {
-        "interaction_id": iid,
-        "user_id": chosen_user,
-        "recipe_id": chosen_recipe,
-        "type": itype,
-        "timestamp": now_iso()
-    }
-    if itype == "cook":
-        interaction["rating"] = random.randint(1, 5)
-    created_interactions.append(interaction)
-    db.collection("UserInteractions").document(iid).set(interaction)
+def generate_interactions(count):
+    # streamed, so millions of interactions never sit in memory
+    for i in range(1, count + 1):
+        iid = f"I{i:04}"  # I0001...
+        chosen_user = random.choice(user_ids)
+        chosen_recipe = random.choice(recipe_ids)
+        itype = random.choices(interaction_types, weights=[0.6, 0.25, 0.15])[0]  # more views than likes/cooks
+        interaction = {
+            "interaction_id": iid,
+            "user_id": chosen_user,
+            "recipe_id": chosen_recipe,
+            "type": itype,
+            "timestamp": now_iso()
+        }
+        if itype == "cook":
+            interaction["rating"] = random.randint(1, 5)
+        yield interaction
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Seed Firestore with recipes, users and interactions")
+    ap.add_argument("--interactions", type=int, default=50, help="interactions to create (default: %(default)s)")
+    ap.add_argument("--batch-size", type=int, default=500, help="writes per batch commit, at most 500")
+    ap.add_argument("--in-flight", type=int, default=8, help="batches committed concurrently (default: %(default)s)")
+    ap.add_argument("--rate", type=float, default=500,
+                    help="starting writes/sec, ramped 50%% every 5 minutes; 0 = unlimited (default: %(default)s)")
+    target = ap.add_mutually_exclusive_group()
+    target.add_argument("--emulator", metavar="HOST:PORT", help="write to a Firestore emulator")
+    target.add_argument("--fake", action="store_true", help="write to the in-memory fake client (offline)")
+    ap.add_argument("--project", default="demo-recipe-pipeline", help="project id used with --emulator")
+    ap.add_argument("--fake-latency", type=float, default=0.0, metavar="MS",
+                    help="simulated round-trip per commit with --fake")
+    args = ap.parse_args(argv)
+
+    db = init_db(args)
+    writer = BulkWriter(db, batch_size=args.batch_size, max_in_flight=args.in_flight,
+                        ops_per_second=args.rate or None)
+    with writer:
+        # Upload Veg Pulav
+        writer.set(db.collection("Recipes").document(veg_pulav["recipe_id"]), veg_pulav)
+        print("Queued Veg Pulav (R001)")
+
+        for recipe in synthetic_recipes():
+            writer.set(db.collection("Recipes").document(recipe["recipe_id"]), recipe)
+        print("Queued 19 synthetic recipes (R002..R020)")
 
-print(f"Uploaded {interactions_to_create} interactions (I0001..I{interactions_to_create:04})")
+        for u in users:
+            writer.set(db.collection("Users").document(u["user_id"]), u)
+        print("Queued 5 users (U001..U005)")
 
-print("\n Recipes, Users, UserInteractions inserted with consistent schema.")
+        interactions = db.collection("UserInteractions")
+        for interaction in generate_interactions(args.interactions):
+            writer.set(interactions.document(interaction["interaction_id"]), interaction)
+        print(f"Queued {args.interactions} interactions (I0001..I{args.interactions:04})")
 
+    stats = writer.stats()
+    logging.info("Wrote %d documents in %d batches (%d retries) in %.2fs: %.0f writes/sec",
+                 stats["writes"], stats["batches"], stats["retries"], stats["seconds"], stats["writes_per_sec"])
+    print("\n Recipes, Users, UserInteractions inserted with consistent schema.")
 
+if __name__ == "__main__":
+    main()